@@ -0,0 +1,227 @@
+"""
+Times the main read paths of shetranio against the sample data, scaled copies of it and synthetic files
+
+    python benchmarks/run.py --output results.json
+    python benchmarks/run.py --output new.json --compare results.json
+
+Results are saved as JSON with the environment they were recorded in so that runs on the same machine can be
+compared. Benchmarks that need gdal or netCDF4 are recorded as skipped when those are not installed.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+import numpy as np
+import h5py
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+
+from shetranio import Model
+from shetranio.hdf import Hdf
+from shetranio.dem import Dem
+from shetranio import synthetic
+
+sample_data = os.path.join(root, 'tests', 'sample_data')
+
+
+def path(s):
+    return os.path.join(sample_data, s)
+
+
+library = path('Wansbeck_at_Mitford_Library_File.xml')
+wansbeck = path('output_Wansbeck_at_Mitford_shegraph.h5')
+dem = path('Wansbeck_at_Mitford_Dem.txt')
+
+
+def scale(source, destination, factor):
+    """Copies a shegraph file with its time axis repeated factor times"""
+    with h5py.File(source, 'r') as f, h5py.File(destination, 'w') as g:
+        for group in ['CATCHMENT_MAPS', 'CATCHMENT_SPREADSHEETS', 'CONSTANTS']:
+            f.copy(group, g)
+        variables = g.create_group('VARIABLES')
+        for name, variable in f['VARIABLES'].items():
+            group = variables.create_group(name)
+            times = variable['time'][:]
+            step = times[-1] - times[0] + (times[1] - times[0] if len(times) > 1 else 1)
+            scaled_times = np.concatenate([times + i * step for i in range(factor)])
+            values = variable['value']
+            chunks = values.chunks[:-1] + (min(64, values.shape[-1] * factor),)
+            scaled = group.create_dataset('value', shape=values.shape[:-1] + (values.shape[-1] * factor,),
+                                          dtype=values.dtype, chunks=chunks, compression='gzip')
+            data = values[:]
+            for i in range(factor):
+                scaled[..., i * values.shape[-1]:(i + 1) * values.shape[-1]] = data
+            group.create_dataset('time', data=scaled_times, chunks=True, compression='gzip')
+            for key, value in values.attrs.items():
+                scaled.attrs[key] = value
+            for key, value in variable['time'].attrs.items():
+                if key in ['units']:
+                    group['time'].attrs[key] = value
+    return destination
+
+
+def measure(function, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+variable_classes = ['OverlandFlow', 'SurfaceDepth', 'LandVariable', 'LayeredLandVariable']
+
+
+def get_cases(directory, factors, sizes, select=None):
+    """
+    Pairs of benchmark name and function, functions raising ImportError are skipped. Only benchmarks with names
+    containing select are returned and files are only generated and opened for those benchmarks.
+    """
+    def selected(*names):
+        return not select or any(select in name for name in names)
+
+    cases = []
+    if selected('Model'):
+        cases.append(('Model', lambda: Model(library)))
+    if selected('Dem.get_index'):
+        cases.append(('Dem.get_index', lambda d=Dem(dem): [d.get_index(x, y) for x in range(391000, 418000, 1000)
+                                                           for y in range(579000, 598000, 1000)]))
+
+    def generate(rows, cols, links, timesteps, file_path):
+        synthetic.write_shegraph(file_path, rows, cols, links, timesteps=timesteps)
+        return file_path
+
+    files = [('wansbeck', lambda: wansbeck), ('76008', lambda: path('76008.h5'))]
+    for factor in factors:
+        label = '76008x{}'.format(factor)
+        files.append((label, lambda f=factor, p=os.path.join(directory, label + '.h5'):
+                      scale(path('76008.h5'), p, f)))
+    for rows, cols, links, timesteps in sizes:
+        label = 'synthetic{}x{}x{}x{}'.format(rows, cols, links, timesteps)
+        files.append((label, lambda size=(rows, cols, links, timesteps), p=os.path.join(directory, label + '.h5'):
+                      generate(*size, p)))
+
+    for label, get_path in files:
+        names = ['Hdf.__init__[{}]'.format(label)] + ['{}[{}].{}'.format(name, label, method)
+                                                      for name in variable_classes
+                                                      for method in ['get_element', 'get_time']]
+        if not selected(*names):
+            continue
+        file_path = get_path()
+        hdf = Hdf(file_path)
+        cases.append(('Hdf.__init__[{}]'.format(label), lambda p=file_path: Hdf(p)))
+        for variable in [hdf.overland_flow, hdf.surface_depth, hdf.ph_depth, hdf.soil_moisture]:
+            if variable is None:
+                continue
+            name = '{}[{}]'.format(type(variable).__name__, label)
+            element = hdf.river_elements[0] if variable.is_river else hdf.land_elements[0]
+            cases.append((name + '.get_element', lambda v=variable, e=element: v.get_element(e)))
+            cases.append((name + '.get_time', lambda v=variable: v.get_time(v.size - 1)))
+
+    if selected('Hdf.to_geom[wansbeck]'):
+        cases.append(('Hdf.to_geom[wansbeck]', lambda hdf=Hdf(wansbeck): hdf.to_geom(dem)))
+
+    def gear_extract():
+        from shetranio.setup import gear
+        gear.extract(path('ceh_gear_rain.nc'), 'rainfall_amount', path('mask.txt'),
+                     datetime(2015, 1, 1), datetime(2015, 1, 10),
+                     os.path.join(directory, 'Rain.txt'), os.path.join(directory, 'RainTimeSeries.csv'))
+
+    if selected('gear.extract'):
+        cases.append(('gear.extract', gear_extract))
+    return [(name, function) for name, function in cases if selected(name)]
+
+
+def get_environment():
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=root, stderr=subprocess.DEVNULL)
+        commit = commit.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'date': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'numpy': np.__version__,
+        'h5py': h5py.__version__,
+        'hdf5': h5py.version.hdf5_version,
+    }
+
+
+def run(repeats=5, factors=(10,), sizes=((50, 50, 500, 1000),), select=None):
+    directory = tempfile.mkdtemp()
+    results = []
+    try:
+        for name, function in get_cases(directory, factors, sizes, select):
+            try:
+                function()
+            except ImportError as e:
+                results.append({'name': name, 'skipped': str(e)})
+                print('{:<60} skipped ({})'.format(name, e))
+                continue
+            times = measure(function, repeats)
+            results.append({'name': name, 'repeats': repeats, 'min': min(times), 'median': float(np.median(times)),
+                            'mean': float(np.mean(times))})
+            print('{:<60} {:>10.4f} s'.format(name, min(times)))
+    finally:
+        shutil.rmtree(directory)
+    return {'environment': get_environment(), 'results': results}
+
+
+def compare(current, previous, threshold=1.2):
+    """
+    Prints the ratio of each minimum time to the previous run and returns the names of benchmarks that are
+    slower than previous by more than threshold
+    """
+    previous = {result['name']: result for result in previous['results'] if 'min' in result}
+    regressions = []
+    for result in current['results']:
+        if 'min' not in result or result['name'] not in previous:
+            continue
+        ratio = result['min'] / previous[result['name']]['min']
+        flag = ' slower' if ratio > threshold else ''
+        print('{:<60} {:>6.2f}x{}'.format(result['name'], ratio, flag))
+        if ratio > threshold:
+            regressions.append(result['name'])
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', help='file to save results to')
+    parser.add_argument('--compare', help='results file from a previous run to compare against')
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--scale', type=int, nargs='*', default=[10],
+                        help='factors to repeat the time axis of 76008.h5 by')
+    parser.add_argument('--synthetic', nargs='*', default=['50x50x500x1000'],
+                        help='sizes of synthetic shegraph files to generate as ROWSxCOLSxLINKSxTIMESTEPS')
+    parser.add_argument('--select', help='only run benchmarks with names containing this')
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='ratio to the compared run above which a benchmark counts as a regression')
+    args = parser.parse_args()
+
+    sizes = [tuple(int(n) for n in size.split('x')) for size in args.synthetic]
+    results = run(args.repeats, args.scale, sizes, args.select)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Coalescer:
+    """
+    Runs blocking reads on an executor from asyncio, sharing one read between all callers that ask for the same
+    thing while it is in progress
+
+    A caller that is cancelled stops waiting without affecting the others. The read itself is cancelled when every
+    caller waiting for it has been cancelled, if it has not already started.
+    """
+    def __init__(self, workers=4):
+        self.workers = workers
+        self.executor = None
+        self.pending = {}
+
+    def get_executor(self) -> ThreadPoolExecutor:
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix='shetranio')
+        return self.executor
+
+    async def run(self, key, function, *args, **kwargs):
+        """
+        Calls function on the executor or waits for the call already running for key. Callers share the result
+        and should not modify it.
+        """
+        loop = asyncio.get_running_loop()
+        key = (id(loop),) + key
+        entry = self.pending.get(key)
+        if entry is None:
+            future = loop.run_in_executor(self.get_executor(), functools.partial(function, *args, **kwargs))
+            entry = self.pending[key] = [future, 0]
+            future.add_done_callback(lambda _: self.pending.pop(key, None) if self.pending.get(key) is entry
+                                     else None)
+        future = entry[0]
+        entry[1] += 1
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if entry[1] == 1 and not future.done():
+                future.cancel()
+                if self.pending.get(key) is entry:
+                    del self.pending[key]
+            raise
+        finally:
+            entry[1] -= 1
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+
+def get_key(*args, **kwargs):
+    """A hashable key for a call, using the identity of arguments that cannot be hashed"""
+    def hashable(value):
+        try:
+            hash(value)
+            return value
+        except TypeError:
+            return id(value)
+    return tuple(hashable(arg) for arg in args) + tuple((k, hashable(v)) for k, v in sorted(kwargs.items()))
+
+
+class AsyncVariable:
+    """Asyncio counterparts of the read methods of a variable, run on the executor of the Hdf it belongs to"""
+
+    async def aget_element(self, element_number, *args, **kwargs):
+        """Awaitable get_element, concurrent calls for the same element share one read"""
+        return await self.hdf.coalescer.run(get_key(self.name, 'get_element', element_number, *args, **kwargs),
+                                            self.get_element, element_number, *args, **kwargs)
+
+    async def aget_time(self, time_index=None, *args, **kwargs):
+        """Awaitable get_time, concurrent calls for the same timestep share one read"""
+        if time_index is not None:
+            time_index = self.get_time_index(time_index)
+        return await self.hdf.coalescer.run(get_key(self.name, 'get_time', time_index, *args, **kwargs),
+                                            self.get_time, time_index, *args, **kwargs)
@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+
+rates = ['net_rain', 'potential_evapotranspiration', 'transpiration', 'surface_evaporation',
+         'evaporation_from_interception', 'vertical_flows']
+
+losses = ['transpiration', 'surface_evaporation', 'evaporation_from_interception', 'outlet_discharge',
+          'canopy_storage_change']
+
+seconds = {'hour': 3600, 's': 1, 'second': 1, 'day': 86400}
+
+
+def get_depth_factor(units):
+    """Factor converting values in units (e.g. mm/hour or m/s) to metres per hour, or metres for storage"""
+    depth, _, per = units.partition('/')
+    factor = {'mm': 0.001, 'm': 1.0}[depth]
+    if per:
+        factor *= 3600 / seconds[per]
+    return factor
+
+
+def get_times(variable):
+    """Hours since the start of the simulation of each written timestep of a variable"""
+    return variable.time_values[:variable.size].astype(float)
+
+
+def get_intervals(times):
+    """Hours since the previous timestep, each value is taken to apply to the interval before it"""
+    return np.diff(times, prepend=times[:1])
+
+
+def get_index(hdf, times, start=None):
+    if start is None and hdf.model is not None:
+        start = hdf.model.start_date
+    if start is None:
+        return pd.to_timedelta(times, unit='h')
+    return pd.Timestamp(start) + pd.to_timedelta(times, unit='h')
+
+
+def stream_totals(variable, area, factor=1.0):
+    """
+    Sums of a land or catchment-wide variable weighted by area and multiplied by factor for each timestep, reading
+    it block by block and leaving out missing values
+    """
+    totals = np.zeros(variable.size)
+    for block_start, block in variable.iter_blocks():
+        block = block.astype(float)
+        block[variable.is_missing(block)] = 0
+        if not variable.is_spatial:
+            block = block * area.sum()
+        else:
+            block = block * area[:, None]
+        totals[block_start:block_start + block.shape[1]] = block.sum(axis=0)
+    return totals * factor
+
+
+def water_balance(hdf, freq='D', outlet=None, start=None) -> pd.DataFrame:
+    """
+    Catchment total water balance in m3 per period, see Hdf.water_balance
+    """
+    area = hdf.grid_dxy[:, :, 0][hdf.land_rows, hdf.land_cols] * hdf.grid_dxy[:, :, 1][hdf.land_rows, hdf.land_cols]
+
+    columns = {}
+
+    for name in rates:
+        variable = getattr(hdf, name)
+        if variable is None:
+            continue
+        times = get_times(variable)
+        totals = stream_totals(variable, area, get_depth_factor(variable.units) * get_intervals(times))
+        columns[name] = pd.Series(totals, index=get_index(hdf, times, start)).resample(freq).sum()
+
+    if hdf.overland_flow is not None:
+        variable = hdf.overland_flow
+        if outlet is None:
+            outlet = int(np.argmax(variable.get_time(-1))) + 1
+        index = hdf.get_element_index(outlet)
+        flow = np.zeros(variable.size)
+        for block_start, values in variable.iter_values():
+            flow[block_start:block_start + values.shape[-1]] = np.abs(values[index]).max(axis=0)
+        times = get_times(variable)
+        columns['outlet_discharge'] = pd.Series(flow * get_intervals(times) * 3600,
+                                                index=get_index(hdf, times, start)).resample(freq).sum()
+
+    if hdf.canopy_storage is not None:
+        times = get_times(hdf.canopy_storage)
+        totals = stream_totals(hdf.canopy_storage, area, get_depth_factor(hdf.canopy_storage.units))
+        storage = pd.Series(totals, index=get_index(hdf, times, start))
+        end_of_period = storage.resample(freq).last().ffill()
+        columns['canopy_storage_change'] = end_of_period.diff().fillna(end_of_period.iloc[:1] - storage.iloc[0])
+
+    if hdf.mass_balance_error is not None:
+        times = get_times(hdf.mass_balance_error)
+        error = pd.Series(stream_totals(hdf.mass_balance_error, area) / area.sum(),
+                          index=get_index(hdf, times, start))
+        columns['mass_balance_error'] = error.resample(freq).mean()
+
+    balance = pd.DataFrame(columns)
+    if 'net_rain' in balance:
+        balance['residual'] = balance['net_rain'].fillna(0)
+        for name in losses:
+            if name in balance:
+                balance['residual'] -= balance[name].fillna(0)
+    return balance
@@ -0,0 +1,110 @@
+"""
+Export of the to_geom variables for web map clients as binary frames that can be fetched one at a time
+
+Writes three files to a folder:
+
+    geometry.json  the features of to_geom with their number and dem properties but no values
+    values.bin     for each variable and timestep, a little-endian float32 value for each feature in order
+    index.json     the to_geom metadata of each variable with the byte offset of each of its frames in values.bin
+
+Values that are missing, or features that have no value for a variable, are NaN. A client can request a single
+frame with an HTTP range request for bytes offset to offset + frame_bytes - 1.
+"""
+import os
+import json
+import numpy as np
+from .dem import Dem
+
+dtype = np.dtype('<f4')
+
+
+def get_feature_index(hdf, variable):
+    """Positions of the features with values for a variable and the rows of those values in element blocks"""
+    numbers = hdf.element_numbers
+    if variable.is_river:
+        positions = np.flatnonzero(numbers - 1 < variable.values.shape[0])
+        rows = numbers[positions] - 1
+    else:
+        positions = np.flatnonzero(np.isin(numbers, hdf.land_elements))
+        rows = np.searchsorted(hdf.land_elements, numbers[positions])
+    return positions, rows
+
+
+def get_geometry(hdf, dem, srs='EPSG:27700'):
+    """The features of to_geom with only their number and dem properties"""
+    from .hdf import Geometries
+
+    dem_values = {}
+    for n, value in zip(hdf.sv4_numbering.flatten()[::-1], hdf.sv4_elevation.flatten()[::-1]):
+        dem_values[n] = value
+    geoms = Geometries(hdf, dem, srs)
+    return {
+        'type': 'FeatureCollection',
+        'features': [{
+            'type': 'Feature',
+            'geometry': geoms.__next__(),
+            'properties': {'number': int(n), 'dem': {'value': float(dem_values[n])}}
+        } for n in hdf.element_numbers]
+    }
+
+
+def write_values(hdf, f, variables=None):
+    """
+    Writes the frames of each to_geom variable to an open binary file, reading each variable block by block
+
+    :param variables: names of the to_geom variables to include, by default all of them
+    :return: metadata of each variable with its frame offsets, as stored in index.json
+    """
+    from .hdf import geom_variables
+
+    features = len(hdf.element_numbers)
+    frame_bytes = features * dtype.itemsize
+    index = []
+    for name, long_name, attribute, start, options in geom_variables:
+        variable = getattr(hdf, attribute)
+        if variable is None or (variables is not None and name not in variables):
+            continue
+        positions, rows = get_feature_index(hdf, variable)
+        offset = f.tell()
+        lower, upper = None, None
+        for _, block, lower, upper in hdf.iter_geom_blocks(variable, start, **options):
+            frames = np.full((block.shape[1], features), np.nan, dtype=dtype)
+            frames[:, positions] = variable.mask_missing(block[rows]).T
+            f.write(frames.tobytes())
+        index.append({
+            'name': name,
+            'longName': long_name,
+            'max': upper,
+            'min': lower,
+            'times': variable.times[start:].tolist(),
+            'offsets': [offset + i * frame_bytes for i in range(variable.size - start)],
+        })
+    return index
+
+
+def write(hdf, directory, dem, srs='EPSG:27700', variables=None):
+    """
+    Writes the geometry, frames and index of a shegraph file to a folder, see the module description
+
+    :param hdf: Hdf to export
+    :param directory: folder to write geometry.json, values.bin and index.json to
+    :param dem: Dem of the model or the path of its file
+    :param srs: coordinate system of the DEM, formatted like EPSG:27700
+    :param variables: names of the to_geom variables to include, by default all of them
+    :return: the index
+    """
+    os.makedirs(directory, exist_ok=True)
+    dem = dem if isinstance(dem, Dem) else Dem(dem)
+    with open(os.path.join(directory, 'geometry.json'), 'w') as f:
+        json.dump(get_geometry(hdf, dem, srs), f)
+    with open(os.path.join(directory, 'values.bin'), 'wb') as f:
+        variable_index = write_values(hdf, f, variables)
+    index = {
+        'features': len(hdf.element_numbers),
+        'dtype': dtype.str,
+        'frame_bytes': len(hdf.element_numbers) * dtype.itemsize,
+        'variables': variable_index,
+    }
+    with open(os.path.join(directory, 'index.json'), 'w') as f:
+        json.dump(index, f, default=str)
+    return index
@@ -0,0 +1,78 @@
+import threading
+import h5py
+
+
+class FileHandles:
+    """
+    A read-only handle on a shegraph file for each thread that uses it, opened the first time the thread reads
+
+    h5py datasets keep state such as their selection and, for files that are still being written, their current
+    size. Giving each thread its own handle keeps that state private to the thread so that threads reading
+    different variables and elements do not interfere with each other.
+    """
+    def __init__(self, path, swmr=False, **kwargs):
+        self.path = path
+        self.swmr = swmr
+        self.kwargs = kwargs
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.files = []
+        self.generation = 0
+
+    @property
+    def file(self) -> h5py.File:
+        if not hasattr(self.local, 'file'):
+            if self.swmr:
+                f = h5py.File(self.path, 'r', libver='latest', swmr=True, **self.kwargs)
+            else:
+                f = h5py.File(self.path, 'r', **self.kwargs)
+            with self.lock:
+                self.files.append(f)
+            self.local.file = f
+            self.local.datasets = {}
+        return self.local.file
+
+    def get_dataset(self, name) -> h5py.Dataset:
+        f = self.file
+        if name not in self.local.datasets:
+            self.local.datasets[name] = [f[name], self.generation]
+        dataset = self.local.datasets[name]
+        if dataset[1] != self.generation:
+            dataset[0].refresh()
+            dataset[1] = self.generation
+        return dataset[0]
+
+    def refresh(self):
+        """Marks the datasets of every thread to be refreshed before their next read"""
+        with self.lock:
+            self.generation += 1
+
+    def close(self):
+        with self.lock:
+            for f in self.files:
+                f.close()
+            self.files = []
+        self.local = threading.local()
+
+
+class ThreadLocalDataset:
+    """Reads a dataset through the handle of the current thread, otherwise behaving like the h5py dataset"""
+    def __init__(self, handles: FileHandles, name):
+        self.handles = handles
+        self.name = name
+
+    @property
+    def dataset(self) -> h5py.Dataset:
+        return self.handles.get_dataset(self.name)
+
+    def __getitem__(self, item):
+        return self.dataset[item]
+
+    def __getattr__(self, name):
+        return getattr(self.dataset, name)
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def refresh(self):
+        self.handles.refresh()
@@ -0,0 +1,265 @@
+import os
+import threading
+from collections import OrderedDict
+import h5py
+import numpy as np
+import pandas as pd
+from .stats import instrumented
+from .aio import AsyncVariable
+from .events import EventStatistics
+from . import grid
+
+
+def get_sidecar_path(hdf_path):
+    """Path of the file derived variables of a shegraph file are materialised to"""
+    return os.path.splitext(hdf_path)[0] + '.derived.h5'
+
+
+def get_identity(path):
+    """Size and modification time of a file, used to check that materialised values are still current"""
+    stat = os.stat(path)
+    return np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+
+def get_sidecar(hdf):
+    """The sidecar file of hdf opened for reading, opened once and kept on hdf until close_sidecar"""
+    with hdf.sidecar_lock:
+        if hdf.sidecar is None:
+            path = get_sidecar_path(hdf.path)
+            if hdf.swmr or not os.path.exists(path):
+                return None
+            hdf.sidecar = h5py.File(path, 'r')
+        return hdf.sidecar
+
+
+def close_sidecar(hdf):
+    """Closes the sidecar file of hdf, after which its derived variables compute their values until reopened"""
+    with hdf.sidecar_lock:
+        for variable in hdf.derived.values():
+            variable.materialised = None
+        if hdf.sidecar is not None:
+            hdf.sidecar.close()
+            hdf.sidecar = None
+
+
+class DerivedVariable(AsyncVariable, EventStatistics):
+    """
+    A variable computed from other variables of the same file, with the get_element, get_time and iter_blocks
+    methods of Variable
+
+    Values are computed lazily for blocks of timesteps as they are needed and the most recently used blocks are
+    kept. Missing values of the inputs, see Variable.is_missing, are passed to the function as NaN. Values can also be materialised to
+    a sidecar file next to the shegraph file, which is then read instead of computing them again.
+    """
+    def __init__(self, hdf, name, function, inputs, long_name=None, units=None, cache_blocks=16):
+        """
+        :param hdf: Hdf the inputs belong to
+        :param name: short name of the variable
+        :param function: called with an element by time array for each input, returning an element by time array
+        :param inputs: Variables of hdf, either all river or all land variables
+        :param long_name: description of the variable, by default the name
+        :param units: units of the values, by default those of the first input
+        :param cache_blocks: number of computed blocks of timesteps to keep in memory
+        """
+        if len(set(variable.is_river for variable in inputs)) != 1:
+            raise ValueError('Inputs of {} must be all river or all land variables'.format(name))
+        self.hdf = hdf
+        self.name = name
+        self.function = function
+        self.inputs = inputs
+        self.units = inputs[0].units if units is None else units
+        self.long_name = '{} ({})'.format(long_name or name, self.units)
+        self.is_river = inputs[0].is_river
+        self.is_spatial = True
+        self.cache_blocks = cache_blocks
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.size = self.get_size()
+        self.times = inputs[0].times[:self.size]
+        self.block_length = min(variable.get_block_length() for variable in inputs)
+        self.materialised = self.open_materialised()
+
+    def get_size(self):
+        return min(variable.size for variable in self.inputs)
+
+    @property
+    def time_values(self):
+        return self.inputs[0].time_values
+
+    @property
+    def elements(self):
+        return self.hdf.river_elements if self.is_river else self.hdf.land_elements
+
+    def get_window(self, start=None, end=None):
+        """
+        First timestep index and index after the last of a time window, see Variable.get_window. Negative indices
+        count back from the last timestep of this variable, which can be shorter than its inputs.
+        """
+        def resolve(value, default, side):
+            if value is None:
+                return default
+            if isinstance(value, (int, np.integer)):
+                return max(value + self.size, 0) if value < 0 else value
+            return self.inputs[0].get_position(value, side=side)
+
+        window = start, end
+        start = min(resolve(start, 0, 'left'), self.size)
+        end = min(resolve(end, self.size, 'right'), self.size)
+        if start > end:
+            raise ValueError('The start of the window {} to {} of {} is after its end'.format(*window, self.name))
+        return start, end
+
+    def get_time_index(self, time_index):
+        if not isinstance(time_index, (int, np.integer)):
+            time_index = self.inputs[0].get_time_index(time_index)
+        if time_index < 0:
+            time_index += self.size
+        if not 0 <= time_index < self.size:
+            raise IndexError('Time index is out of range, {} has {} timesteps'.format(self.name, self.size))
+        return time_index
+
+    def get_element_index(self, element_number):
+        index = np.searchsorted(self.elements, element_number)
+        if index >= len(self.elements) or self.elements[index] != element_number:
+            raise ValueError('{} is not an element of {}'.format(element_number, self.name))
+        return index
+
+    def is_missing(self, values) -> np.ndarray:
+        """Where values are missing, computed values mark them with NaN"""
+        return np.isnan(values)
+
+    def mask_missing(self, values) -> np.ndarray:
+        return np.array(values, dtype=float)
+
+    def compute(self, start, end):
+        blocks = []
+        for variable in self.inputs:
+            blocks.append(variable.mask_missing(variable.to_elements(variable.values[..., start:end])))
+        return np.asarray(self.function(*blocks), dtype=float)
+
+    def get_block(self, block_start):
+        """Values of the block of timesteps starting at block_start, from the cache where possible"""
+        with self.lock:
+            if block_start in self.cache:
+                self.cache.move_to_end(block_start)
+                return self.cache[block_start]
+        block = self.compute(block_start, min(block_start + self.block_length, self.size))
+        with self.lock:
+            self.cache[block_start] = block
+            if len(self.cache) > self.cache_blocks:
+                self.cache.popitem(last=False)
+        return block
+
+    def iter_blocks(self, start=0, end=None):
+        """Yields the first timestep index and an element by time array of consecutive blocks of timesteps"""
+        end = self.size if end is None else min(end, self.size)
+        if self.materialised is not None:
+            for block_start in range(start, end, self.block_length):
+                yield block_start, self.materialised[:, block_start:min(block_start + self.block_length, end)]
+            return
+        first = start // self.block_length * self.block_length
+        for block_start in range(first, end, self.block_length):
+            block = self.get_block(block_start)
+            yield max(block_start, start), block[:, max(start - block_start, 0):end - block_start]
+
+    @instrumented
+    def get_element(self, element_number, start=None, end=None):
+        index = self.get_element_index(element_number)
+        start, end = self.get_window(start, end)
+        if self.materialised is not None:
+            values = self.materialised[index, start:end]
+        else:
+            values = np.concatenate([block[index] for _, block in self.iter_blocks(start, end)]) \
+                if end > start else np.empty(0)
+        return pd.Series(values, index=self.times[start:end])
+
+    @instrumented
+    def get_elements(self, element_numbers, start=None, end=None) -> pd.DataFrame:
+        """Values of several elements in a time window as columns of a DataFrame, see Variable.get_elements"""
+        rows = [self.get_element_index(n) for n in element_numbers]
+        start, end = self.get_window(start, end)
+        values = np.empty((end - start, len(rows)))
+        for block_start, block in self.iter_blocks(start, end):
+            values[block_start - start:block_start - start + block.shape[1]] = block[rows].T
+        return pd.DataFrame(values, index=self.times[start:end], columns=list(element_numbers))
+
+    @instrumented
+    def get_time(self, time_index=None, start=None, end=None):
+        """
+        Values of every element at a timestep, or an element by time array of a time window if time_index is None
+
+        :param time_index: index, date or time since the start of the timestep, see get_time_index
+        :param start: first timestep index, date or time since the start of the window, see get_window
+        :param end: index after the last timestep, or the last date or time since the start of the window
+        """
+        if time_index is None:
+            start, end = self.get_window(start, end)
+            blocks = [block for _, block in self.iter_blocks(start, end)]
+            return np.concatenate(blocks, axis=1) if blocks else np.empty((len(self.elements), 0))
+        time_index = self.get_time_index(time_index)
+        if self.materialised is not None:
+            return self.materialised[:, time_index]
+        block_start = time_index // self.block_length * self.block_length
+        return self.get_block(block_start)[:, time_index - block_start]
+
+    @instrumented
+    def to_grid(self, time_index):
+        """Values on a map, see Variable.to_grid"""
+        return grid.to_grid(self, time_index)
+
+    def open_materialised(self):
+        """The sidecar dataset of this variable if it was materialised from the current version of the file"""
+        f = get_sidecar(self.hdf)
+        if f is None or self.name not in f or \
+                not np.array_equal(f[self.name].attrs['source'], get_identity(self.hdf.path)) \
+                or f[self.name].shape[1] != self.size:
+            return None
+        return f[self.name]
+
+    def materialise(self):
+        """Writes every value to the sidecar file so that they are read rather than computed from then on"""
+        if self.materialised is not None:
+            return self.materialised
+        path = get_sidecar_path(self.hdf.path)
+        close_sidecar(self.hdf)
+        with h5py.File(path, 'a') as f:
+            if self.name in f:
+                del f[self.name]
+            dataset = f.create_dataset(self.name, shape=(len(self.elements), self.size), dtype='f4',
+                                       chunks=(len(self.elements), max(1, min(self.block_length, self.size, 256))))
+            for block_start, block in self.iter_blocks():
+                dataset[:, block_start:block_start + block.shape[1]] = block
+            dataset.attrs['source'] = get_identity(self.hdf.path)
+            dataset.attrs['units'] = self.units
+        for variable in self.hdf.derived.values():
+            variable.materialised = variable.open_materialised()
+        self.materialised = self.open_materialised()
+        return self.materialised
+
+    def refresh(self):
+        """Drops cached values when the inputs have new timesteps, returning the number of new ones"""
+        size = self.size
+        self.size = self.get_size()
+        if self.size != size:
+            with self.lock:
+                self.cache.clear()
+            self.times = self.inputs[0].times[:self.size]
+            self.materialised = None
+        return self.size - size
+
+
+def water_table_elevation(hdf):
+    elevation = hdf.surface_elevation.square[hdf.land_rows, hdf.land_cols][:, None]
+    return DerivedVariable(hdf, 'water_table_elevation', lambda ph_depth: elevation - ph_depth, [hdf.ph_depth],
+                           'Water Table Elevation')
+
+
+def total_evaporation(hdf):
+    return DerivedVariable(hdf, 'total_evaporation', lambda *evaporation: sum(evaporation),
+                           [hdf.transpiration, hdf.surface_evaporation, hdf.evaporation_from_interception],
+                           'Total Evaporation')
+
+
+def discharge(hdf):
+    return DerivedVariable(hdf, 'discharge', lambda overland_flow: overland_flow, [hdf.overland_flow],
+                           'Discharge')
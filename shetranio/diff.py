@@ -0,0 +1,138 @@
+import warnings
+import h5py
+import numpy as np
+import pandas as pd
+
+
+def check_numbering(hdf, other):
+    """Raises ValueError unless two files share the same grid and element numbering"""
+    if hdf.sv4_numbering.shape != other.sv4_numbering.shape or \
+            not np.array_equal(hdf.sv4_numbering, other.sv4_numbering) or \
+            not np.array_equal(hdf.number.square, other.number.square):
+        raise ValueError('{} and {} do not have the same element numbering'.format(hdf.path, other.path))
+
+
+def get_variables(hdf, other, names=None):
+    """Pairs of variables with the same name in both files, e.g. names=['ph_depth', 'ovr_flow']"""
+    other_variables = {variable.name: variable for variable in other.variables}
+    variables = {variable.name: variable for variable in hdf.variables}
+    pairs = [(variable, other_variables[name]) for name, variable in variables.items()
+             if name in other_variables and (names is None or name in names)]
+    if names is not None:
+        missing = set(names) - set(variable.name for variable, _ in pairs)
+        if missing:
+            raise KeyError('{} are not variables of both files'.format(', '.join(sorted(missing))))
+    return pairs
+
+
+def copy_structure(hdf, f):
+    """Copies the maps, spreadsheets and constants of a shegraph file to a new file"""
+    for group in ['CATCHMENT_MAPS', 'CATCHMENT_SPREADSHEETS', 'CONSTANTS']:
+        hdf.file.copy(group, f)
+    return f.create_group('VARIABLES')
+
+
+def get_fill_value(dtype):
+    """Value marking missing values written by shetranio: NaN for floats, the smallest value for integers"""
+    dtype = np.dtype(dtype)
+    return np.nan if dtype.kind == 'f' else np.iinfo(dtype).min
+
+
+def create_like(group, variable, start, end, fillvalue=None):
+    """
+    Creates an empty compressed copy of a variable with the timesteps from start to end in a VARIABLES group
+
+    :param fillvalue: value of values that are not written, also stored in the fill_value attribute
+    """
+    size = end - start
+    source = variable.variable
+    destination = group.create_group(source.name.split('/')[-1])
+    shape = variable.values.shape[:-1] + (size,)
+    chunks = variable.values.chunks or shape[:-1] + (1,)
+    chunks = chunks[:-1] + (max(1, min(chunks[-1], size)),)
+    values = destination.create_dataset('value', shape=shape, maxshape=shape[:-1] + (None,),
+                                        dtype=variable.values.dtype, chunks=chunks, compression='gzip', shuffle=True,
+                                        fillvalue=fillvalue)
+    for key, value in variable.values.attrs.items():
+        values.attrs[key] = value
+    if fillvalue is not None:
+        values.attrs['fill_value'] = fillvalue
+    time = destination.create_dataset('time', data=variable.time_values[start:end],
+                                      compression='gzip' if size else None)
+    for key, value in variable.time_values.attrs.items():
+        time.attrs[key] = value
+    return values
+
+
+def diff(hdf, other, variables=None, reducer=np.nanmean, path=None, **kwargs) -> dict:
+    """
+    Differences of other less hdf, see Hdf.diff
+    """
+    check_numbering(hdf, other)
+    pairs = get_variables(hdf, other, variables)
+
+    f = h5py.File(path, 'w') if path is not None else None
+    group = copy_structure(hdf, f) if f is not None else None
+
+    results = {}
+    try:
+        for variable, other_variable in pairs:
+            size = min(variable.size, other_variable.size)
+            options = kwargs if len(variable.values.shape) == 4 else {}
+            fill = get_fill_value(variable.values.dtype)
+            values = create_like(group, variable, 0, size, fill) if group is not None else None
+
+            series = np.empty(size)
+            totals = None
+            for block_start, a in variable.iter_values(0, size):
+                block_end = block_start + a.shape[-1]
+                b = other_variable.values[..., block_start:block_end]
+                if values is not None:
+                    missing = variable.is_missing(a) | other_variable.is_missing(b)
+                    values[..., block_start:block_end] = np.where(missing, fill, b - a)
+
+                a = variable.mask_missing(variable.to_elements(a, **options))
+                b = other_variable.mask_missing(other_variable.to_elements(b, **options))
+                difference = b - a
+                with warnings.catch_warnings():
+                    warnings.simplefilter('ignore', RuntimeWarning)
+                    series[block_start:block_end] = reducer(difference, axis=0)
+
+                valid = ~np.isnan(difference)
+                block_totals = np.stack([np.where(valid, a, 0).sum(axis=1), np.where(valid, b, 0).sum(axis=1),
+                                         valid.sum(axis=1),
+                                         np.where(valid, difference, -np.inf).max(axis=1),
+                                         np.where(valid, difference, np.inf).min(axis=1)])
+                if totals is None:
+                    totals = block_totals
+                else:
+                    totals[:3] += block_totals[:3]
+                    totals[3] = np.maximum(totals[3], block_totals[3])
+                    totals[4] = np.minimum(totals[4], block_totals[4])
+
+            if variable.is_river or not variable.is_spatial:
+                elements = np.arange(1, variable.values.shape[0] + 1)
+            else:
+                elements = hdf.land_elements
+            if totals is None:
+                totals = np.zeros((5, len(elements)))
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean = totals[0] / totals[2]
+                other_mean = totals[1] / totals[2]
+                summary = pd.DataFrame({
+                    'mean': mean,
+                    'other_mean': other_mean,
+                    'mean_difference': other_mean - mean,
+                    'max_difference': np.where(totals[2] > 0, totals[3], np.nan),
+                    'min_difference': np.where(totals[2] > 0, totals[4], np.nan),
+                    'percent_change': 100 * (other_mean - mean) / np.abs(mean),
+                }, index=pd.Index(elements, name='element'))
+
+            results[variable.name] = {
+                'series': pd.Series(series, index=variable.times[:size], name=variable.name),
+                'elements': summary,
+            }
+    finally:
+        if f is not None:
+            f.close()
+    return results
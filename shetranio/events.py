@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+
+
+def get_elements(variable, rows):
+    """Element numbers of the rows of element by time blocks of a variable"""
+    if variable.is_river or not variable.is_spatial:
+        return np.arange(1, rows + 1)
+    return variable.hdf.land_elements
+
+
+def get_event_statistics(variable, thresholds=(), **kwargs) -> pd.DataFrame:
+    """
+    Largest and smallest value of each element, when they first occurred and the number of hours above each
+    threshold, from one pass over the variable block by block, see Variable.get_event_statistics
+    """
+    times = variable.time_values[:variable.size].astype(float)
+    hours = np.diff(times, prepend=times[:1])
+    thresholds = np.asarray(thresholds, dtype=float)
+
+    maximum = minimum = time_of_maximum = time_of_minimum = above = None
+    for block_start, block in variable.iter_blocks(0, variable.size, **kwargs):
+        block = variable.mask_missing(block)
+        if maximum is None:
+            rows = block.shape[0]
+            maximum, minimum = np.full(rows, -np.inf), np.full(rows, np.inf)
+            time_of_maximum, time_of_minimum = np.full(rows, -1), np.full(rows, -1)
+            above = np.zeros((rows, len(thresholds)))
+        valid = ~np.isnan(block)
+        block_maximum = np.where(valid, block, -np.inf)
+        block_minimum = np.where(valid, block, np.inf)
+        index_of_maximum = block_maximum.argmax(axis=1)
+        index_of_minimum = block_minimum.argmin(axis=1)
+        block_maximum = block_maximum[np.arange(len(block)), index_of_maximum]
+        block_minimum = block_minimum[np.arange(len(block)), index_of_minimum]
+        larger = block_maximum > maximum
+        smaller = block_minimum < minimum
+        maximum[larger] = block_maximum[larger]
+        minimum[smaller] = block_minimum[smaller]
+        time_of_maximum[larger] = block_start + index_of_maximum[larger]
+        time_of_minimum[smaller] = block_start + index_of_minimum[smaller]
+        block_hours = hours[block_start:block_start + block.shape[1]]
+        with np.errstate(invalid='ignore'):
+            above += ((block[:, :, None] > thresholds) * block_hours[None, :, None]).sum(axis=1)
+
+    if maximum is None:
+        return pd.DataFrame(columns=['max', 'time_of_max', 'min', 'time_of_min'])
+
+    def to_times(indices):
+        return [variable.times[i] if i >= 0 else None for i in indices]
+
+    statistics = pd.DataFrame({
+        'max': np.where(np.isfinite(maximum), maximum, np.nan),
+        'time_of_max': to_times(time_of_maximum),
+        'min': np.where(np.isfinite(minimum), minimum, np.nan),
+        'time_of_min': to_times(time_of_minimum),
+    }, index=pd.Index(get_elements(variable, len(maximum)), name='element'))
+    for i, threshold in enumerate(thresholds):
+        statistics['hours_above_{:g}'.format(threshold)] = above[:, i]
+    return statistics
+
+
+class EventStatistics:
+    """Adds get_event_statistics to a variable, caching results for as long as the file is unchanged"""
+
+    def get_event_statistics(self, thresholds=(), **kwargs) -> pd.DataFrame:
+        """
+        Peak and minimum value of each element, e.g. peak surface_depth or overland_flow and minimum ph_depth, the
+        time each first occurred and the number of hours each element was above each threshold. Values of -1 are
+        treated as missing and each value is taken to apply to the interval since the previous timestep.
+
+        Results are computed in one pass over the variable and cached until the file changes.
+
+        :param thresholds: values to count the hours above
+        :param kwargs: passed to iter_blocks, e.g. level for layered variables
+        :return: DataFrame indexed by element number with max, time_of_max, min, time_of_min and an hours_above
+            column for each threshold
+        """
+        from .derived import get_identity
+
+        if not hasattr(self, 'event_statistics'):
+            self.event_statistics = {}
+        key = (tuple(float(t) for t in np.atleast_1d(thresholds)), tuple(sorted(kwargs.items())), self.size)
+        identity = tuple(get_identity(self.hdf.path))
+        if key not in self.event_statistics or self.event_statistics[key][0] != identity:
+            self.event_statistics[key] = (identity, get_event_statistics(self, key[0], **kwargs))
+        return self.event_statistics[key][1].copy()
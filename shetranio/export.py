@@ -0,0 +1,146 @@
+"""
+Export of spatial variables as georeferenced map frames for animations
+
+Maps cover the SHETRAN grid, which includes a row and column of cells around the DEM on each side, and are
+georeferenced from the DEM of the model.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from .dem import Dem
+from .grid import iter_grids
+
+
+def get_geotransform(hdf, dem, shape):
+    """GDAL geotransform of a grid of shape covering the SHETRAN grid of hdf"""
+    dem = dem if isinstance(dem, Dem) else Dem(dem)
+    rows, cols = hdf.number.square.shape
+    cell_size = dem.cell_size * cols / shape[1]
+    x_min = dem.x_lower_left - dem.cell_size
+    y_max = dem.y_lower_left - dem.cell_size + rows * dem.cell_size
+    return x_min, cell_size, 0.0, y_max, 0.0, -cell_size
+
+
+def get_variable(hdf, name):
+    """A variable or derived variable of hdf by its short name, e.g. 'ph_depth'"""
+    for variable in hdf.variables:
+        if variable.name == name:
+            return variable
+    if name in hdf.derived:
+        return hdf.derived[name]
+    raise KeyError('{} is not a variable of {}'.format(name, hdf.path))
+
+
+def get_range(variable, start, end, **kwargs):
+    """Smallest and largest values of a variable between two timesteps, read block by block"""
+    lower, upper = np.inf, -np.inf
+    for _, grids in iter_grids(variable, start, end, **kwargs):
+        if np.isfinite(grids).any():
+            lower, upper = min(lower, np.nanmin(grids)), max(upper, np.nanmax(grids))
+    return float(lower), float(upper)
+
+
+def write_geotiff(variable, path, dem, start=0, end=None, srs='EPSG:27700', **kwargs):
+    """
+    Writes the maps of a variable between two timesteps as the bands of a GeoTIFF, reading block by block
+
+    :param variable: a spatial Variable or DerivedVariable
+    :param path: path of the GeoTIFF file to create
+    :param dem: Dem of the model, e.g. Model.dem, or the path of its file
+    :param start: index of the first timestep
+    :param end: index after the last timestep, by default the latest
+    :param srs: coordinate system of the DEM, formatted like EPSG:27700
+    :param kwargs: passed to to_grid, e.g. level for layered variables
+    """
+    end = variable.size if end is None else min(end, variable.size)
+    if end <= start:
+        raise ValueError('There are no timesteps of {} from {} to {} to write'.format(variable.name, start, end))
+
+    from osgeo import gdal, osr
+
+    authority, code = srs.split(':')
+    assert authority == 'EPSG', 'Only EPSG coordinate systems are currently supported'
+
+    shape = variable.to_grid(start, **kwargs).shape
+    ds = gdal.GetDriverByName('GTiff').Create(path, shape[1], shape[0], end - start, gdal.GDT_Float32,
+                                              ['COMPRESS=DEFLATE', 'TILED=YES'])
+    ds.SetGeoTransform(get_geotransform(variable.hdf, dem, shape))
+    reference = osr.SpatialReference()
+    reference.ImportFromEPSG(int(code))
+    ds.SetProjection(reference.ExportToWkt())
+    for block_start, grids in iter_grids(variable, start, end, **kwargs):
+        for i in range(grids.shape[2]):
+            band = ds.GetRasterBand(block_start - start + i + 1)
+            band.SetNoDataValue(float('nan'))
+            band.SetDescription(str(variable.times[block_start + i]))
+            band.WriteArray(grids[:, :, i].astype(np.float32))
+    ds.FlushCache()
+    ds = None
+    return path
+
+
+def write_world_file(path, geotransform):
+    """Writes the world file that georeferences an image, e.g. frame.pgw for frame.png"""
+    x_min, cell_size, _, y_max, _, _ = geotransform
+    with open(os.path.splitext(path)[0] + '.pgw', 'w') as f:
+        f.write('\n'.join(str(v) for v in [cell_size, 0.0, 0.0, -cell_size, x_min + cell_size / 2,
+                                           y_max - cell_size / 2]) + '\n')
+
+
+def render(hdf_path, name, directory, start, end, vmin, vmax, cmap, geotransform, memory_budget, kwargs):
+    """Writes the frames of a variable between two timesteps as PNG images, run in each worker process"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from .hdf import Hdf
+
+    hdf = Hdf(hdf_path, memory_budget=memory_budget)
+    variable = get_variable(hdf, name)
+    paths = []
+    for block_start, grids in iter_grids(variable, start, end, **kwargs):
+        for i in range(grids.shape[2]):
+            path = os.path.join(directory, '{}_{:06d}.png'.format(name, block_start + i))
+            plt.imsave(path, np.ma.masked_invalid(grids[:, :, i]), vmin=vmin, vmax=vmax, cmap=cmap)
+            write_world_file(path, geotransform)
+            paths.append(path)
+    hdf.close()
+    return paths
+
+
+def write_pngs(variable, directory, dem, start=0, end=None, vmin=None, vmax=None, cmap='viridis', workers=None,
+               frames_per_task=100, **kwargs):
+    """
+    Renders the maps of a variable between two timesteps as PNG frames, each with a world file, across a pool of
+    processes that each read their own timesteps block by block
+
+    Each process reads the file from disk within the memory budget of the Hdf, or 256 MB if it has none. Derived
+    variables registered with Hdf.register cannot be rendered in other processes, built in ones can.
+
+    :param variable: a spatial Variable or DerivedVariable
+    :param directory: folder to write <name>_<timestep>.png and .pgw files to
+    :param dem: Dem of the model, e.g. Model.dem, or the path of its file
+    :param start: index of the first timestep
+    :param end: index after the last timestep, by default the latest
+    :param vmin: value at the bottom of the colour map, by default the smallest value in the frames
+    :param vmax: value at the top of the colour map, by default the largest value in the frames
+    :param cmap: name of a matplotlib colour map
+    :param workers: number of processes, by default the number of processors
+    :param frames_per_task: number of consecutive frames rendered by each task
+    :param kwargs: passed to to_grid, e.g. level for layered variables
+    :return: paths of the frames in order
+    """
+    os.makedirs(directory, exist_ok=True)
+    end = variable.size if end is None else min(end, variable.size)
+    if vmin is None or vmax is None:
+        lower, upper = get_range(variable, start, end, **kwargs)
+        vmin = lower if vmin is None else vmin
+        vmax = upper if vmax is None else vmax
+    geotransform = get_geotransform(variable.hdf, dem, variable.to_grid(start, **kwargs).shape)
+    memory_budget = variable.hdf.memory_budget or 256 * 2 ** 20
+
+    with ProcessPoolExecutor(workers) as executor:
+        tasks = [executor.submit(render, variable.hdf.path, variable.name, directory, task_start,
+                                 min(task_start + frames_per_task, end), vmin, vmax, cmap, geotransform,
+                                 memory_budget, kwargs)
+                 for task_start in range(start, end, frames_per_task)]
+        return [path for task in tasks for path in task.result()]
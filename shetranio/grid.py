@@ -0,0 +1,71 @@
+import numpy as np
+
+
+class GridIndex:
+    """
+    Positions on a map grid of the values of an element ordered array, so that a vector or element by time array
+    can be scattered onto the grid with one assignment
+    """
+    def __init__(self, shape, positions, elements):
+        """
+        :param shape: shape of the grid
+        :param positions: flat positions on the grid that belong to an element
+        :param elements: index of the element of each position in element ordered arrays
+        """
+        self.shape = shape
+        self.positions = positions
+        self.elements = elements
+
+    def scatter(self, values) -> np.ndarray:
+        """
+        Places element ordered values on the grid, NaN where there is no element
+
+        :param values: vector with a value for each element, or element by time array
+        :return: grid, or grid by time array
+        """
+        values = np.asarray(values)
+        grid = np.full((int(np.prod(self.shape)),) + values.shape[1:], np.nan)
+        grid[self.positions] = values[self.elements]
+        return grid.reshape(self.shape + values.shape[1:])
+
+
+def get_land_index(hdf) -> GridIndex:
+    """Index of land elements on the number.square grid, in the order of land_elements"""
+    shape = hdf.number.square.shape
+    positions = np.ravel_multi_index((hdf.land_rows, hdf.land_cols), shape)
+    return GridIndex(shape, positions, np.arange(len(positions)))
+
+
+def get_river_index(hdf, links) -> GridIndex:
+    """Index of the first links river links on the fine sv4_numbering grid, as drawn by Geometries"""
+    numbering = hdf.sv4_numbering.ravel()
+    positions = np.flatnonzero((numbering >= 1) & (numbering <= links))
+    return GridIndex(hdf.sv4_numbering.shape, positions, numbering[positions].astype(int) - 1)
+
+
+def iter_grids(variable, start=0, end=None, **kwargs):
+    """Yields the first timestep index and a grid by time array for consecutive blocks of timesteps"""
+    for block_start, block in variable.iter_blocks(start, end, **kwargs):
+        block = variable.mask_missing(block)
+        yield block_start, variable.hdf.get_grid_index(variable.is_river, len(block)).scatter(block)
+
+
+def to_grid(variable, time_index, **kwargs) -> np.ndarray:
+    """
+    Values of a variable on its map grid, see Variable.to_grid
+
+    :param time_index: index of a timestep for a grid, or a slice or range of them for a grid by time array
+    """
+    if not variable.is_spatial:
+        raise ValueError('{} is not a spatial variable'.format(variable.name))
+    if isinstance(time_index, (slice, range)):
+        indices = range(*slice(time_index.start, time_index.stop, time_index.step).indices(variable.size))
+        if len(indices):
+            first = min(indices[0], indices[-1])
+            last = max(indices[0], indices[-1])
+            grids = np.concatenate([grids for _, grids in iter_grids(variable, first, last + 1, **kwargs)], axis=-1)
+            return grids[..., np.asarray(indices) - first]
+        values = np.empty((len(variable.get_time(0, **kwargs)), 0))
+    else:
+        values = variable.get_time(time_index, **kwargs)
+    return variable.hdf.get_grid_index(variable.is_river, len(values)).scatter(values)
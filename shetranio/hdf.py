@@ -1,7 +1,21 @@
 import h5py
+import time
+import threading
+from datetime import timedelta
 from .dem import Dem
 import numpy as np
 import pandas as pd
+from .stats import Stats, InstrumentedDataset, instrumented
+from . import derived
+from . import balance
+from .concurrency import FileHandles, ThreadLocalDataset
+from .aio import Coalescer, AsyncVariable, get_key
+from . import grid
+from . import binary
+from . import diff
+from . import subset
+from . import shared as shared_memory
+from .events import EventStatistics
 
 
 class Constant:
@@ -40,7 +54,7 @@ class Constant:
         else:
             raise Exception('Please specify a direction from [n,e,s,w]')
 
-class Variable:
+class Variable(AsyncVariable, EventStatistics):
     def __new__(cls, hdf, variable_name):
         if variable_name in hdf.variable_names.keys():
             return super(Variable, cls).__new__(cls)
@@ -51,16 +65,19 @@ class Variable:
         self.name = variable_name
         self.hdf: Hdf = hdf
         self.variable = hdf.file_variables[hdf.variable_names[variable_name]]
-        self.values = self.variable['value']
-        self.times = self.variable['time']
-        self.time_units = self.times.attrs['units'][0].decode("utf-8")
+        if hdf.handles is not None:
+            self.values = ThreadLocalDataset(hdf.handles, self.variable['value'].name)
+            self.time_values = ThreadLocalDataset(hdf.handles, self.variable['time'].name)
+        else:
+            self.values = self.variable['value']
+            self.time_values = self.variable['time']
+        self.time_units = self.time_values.attrs['units'][0].decode("utf-8")
+        self.size = self.get_size()
+        self.times = self.get_times()
         if self.hdf.model:
-            self.times = pd.date_range(
-                start=self.hdf.model.start_date,
-                freq='{}H'.format(np.floor(self.times[1]) - np.floor(self.times[0])),
-                periods=len(self.times))
             self.time_units = ''
         self.units = self.values.attrs['units'][0].decode("utf-8")
+        self.fill_value = self.values.attrs.get('fill_value')
         self.long_name = '{} ({})'.format(variable_names[self.name], self.units)
         self.is_river = False
         self.is_spatial = True
@@ -69,6 +86,177 @@ class Variable:
         except TypeError:
             pass
 
+    def get_size(self):
+        """Number of timesteps that have been written for both times and values"""
+        return min(self.time_values.shape[0], self.values.shape[-1])
+
+    def get_times(self):
+        """Stored times of each timestep, as dates from the start of the model if there is one"""
+        self.hours = self.time_values[:self.size].astype(float)
+        if not self.hdf.model:
+            return self.time_values[:self.size]
+        return pd.DatetimeIndex(pd.Timestamp(self.hdf.model.start_date) + pd.to_timedelta(self.hours, unit='h'))
+
+    def get_hours(self, time):
+        """Hours since the start of the run of a date, or of a time since the start of the run"""
+        if isinstance(time, (pd.Timedelta, timedelta)):
+            return pd.Timedelta(time) / pd.Timedelta(hours=1)
+        if not self.hdf.model:
+            raise ValueError('Dates can only be used for variables of a Model, use a time since the start instead')
+        return (pd.Timestamp(time) - pd.Timestamp(self.hdf.model.start_date)) / pd.Timedelta(hours=1)
+
+    def get_position(self, time, side='left'):
+        """
+        Position of a date or time since the start in the stored times, found by binary search. With side='left'
+        this is the first timestep at or after time and with side='right' the first timestep after it.
+        """
+        return int(np.searchsorted(self.hours, self.get_hours(time), side=side))
+
+    def get_window(self, start=None, end=None):
+        """
+        First timestep index and index after the last of a time window
+
+        :param start: first timestep index, or the date or time since the start of the run to start from
+        :param end: index after the last timestep, or the last date or time since the start to include
+        """
+        window = start, end
+        if start is None:
+            start = 0
+        elif not isinstance(start, (int, np.integer)):
+            start = self.get_position(start)
+        elif start < 0:
+            start = max(start + self.size, 0)
+        if end is None:
+            end = self.size
+        elif not isinstance(end, (int, np.integer)):
+            end = self.get_position(end, side='right')
+        elif end < 0:
+            end = max(end + self.size, 0)
+        start, end = min(start, self.size), min(end, self.size)
+        if start > end:
+            raise ValueError('The start of the window {} to {} of {} is after its end'.format(*window, self.name))
+        return start, end
+
+    def get_window_values(self, start=None, end=None, **kwargs):
+        """Element by time array of the timesteps in a time window, see get_window"""
+        start, end = self.get_window(start, end)
+        blocks = [block for _, block in self.iter_blocks(start, end, **kwargs)]
+        if not blocks:
+            return np.empty((len(self.to_elements(self.values[..., :0], **kwargs)), 0))
+        return self.mask_missing(np.concatenate(blocks, axis=1))
+
+    def is_missing(self, values) -> np.ndarray:
+        """
+        Where stored values are missing. Files written with a fill_value attribute on the values, such as those of
+        Hdf.diff and Hdf.subset, mark missing values with it. Otherwise land variables use -1 and river variables,
+        for which -1 is a valid value, have none.
+        """
+        if self.fill_value is not None:
+            return np.isnan(values) if np.isnan(self.fill_value) else values == self.fill_value
+        if self.is_river:
+            return np.zeros(np.shape(values), dtype=bool)
+        return values == -1
+
+    def mask_missing(self, values) -> np.ndarray:
+        """Stored values as floats with NaN where they are missing, see is_missing"""
+        values = np.array(values, dtype=float)
+        values[self.is_missing(values)] = np.nan
+        return values
+
+    def get_element_index(self, element_number):
+        """Row of an element in element by time arrays of this variable"""
+        if self.is_river or not self.is_spatial:
+            return self.hdf.get_element_index(element_number)
+        index = np.searchsorted(self.hdf.land_elements, element_number)
+        if index >= len(self.hdf.land_elements) or self.hdf.land_elements[index] != element_number:
+            raise ValueError('{} is not a land element'.format(element_number))
+        return index
+
+    @instrumented
+    def get_elements(self, element_numbers, start=None, end=None, **kwargs) -> pd.DataFrame:
+        """
+        Values of several elements in a time window as columns of a DataFrame, reading only the window block by
+        block
+
+        :param element_numbers: numbers of the elements
+        :param start: first timestep index, date or time since the start to include, see get_window
+        :param end: index after the last timestep, or the last date or time since the start to include
+        :param kwargs: passed to to_elements, e.g. level for layered variables
+        """
+        rows = [self.get_element_index(n) for n in element_numbers]
+        start, end = self.get_window(start, end)
+        values = np.empty((end - start, len(rows)))
+        for block_start, block in self.iter_blocks(start, end, **kwargs):
+            values[block_start - start:block_start - start + block.shape[1]] = block[rows].T
+        return pd.DataFrame(values, index=self.times[start:end], columns=list(element_numbers))
+
+    def get_time_index(self, time_index):
+        """
+        Checks a time index against the timesteps written so far, counting negative indices from the latest. A date
+        or time since the start of the run gives the last timestep at or before it.
+        """
+        if not isinstance(time_index, (int, np.integer)):
+            time = time_index
+            time_index = self.get_position(time, side='right') - 1
+            if time_index < 0:
+                raise IndexError('{} is before the first timestep of {}'.format(time, self.name))
+        if time_index < 0:
+            time_index += self.size
+        if not 0 <= time_index < self.size:
+            raise IndexError('Time index is out of range, {} has {} timesteps'.format(self.name, self.size))
+        return time_index
+
+    def get_block_length(self):
+        """Number of timesteps to read at once, a quarter of the memory budget of the file or all of them"""
+        if self.hdf.memory_budget is None:
+            return max(self.size, 1)
+        timestep_bytes = int(np.prod(self.values.shape[:-1])) * self.values.dtype.itemsize
+        length = max(1, self.hdf.memory_budget // 4 // timestep_bytes)
+        chunk = self.values.chunks[-1] if self.values.chunks else 1
+        return max(chunk, length // chunk * chunk)
+
+    def iter_values(self, start=0, end=None):
+        """Yields the first timestep index and stored values of consecutive blocks of timesteps"""
+        end = self.size if end is None else min(end, self.size)
+        length = self.get_block_length()
+        for block_start in range(start, end, length):
+            yield block_start, self.values[..., block_start:min(block_start + length, end)]
+
+    def to_elements(self, values):
+        """Converts a block of stored values to an element by time array, -1 marks missing values"""
+        return values
+
+    def iter_blocks(self, start=0, end=None, **kwargs):
+        """Yields the first timestep index and an element by time array of consecutive blocks of timesteps"""
+        for block_start, values in self.iter_values(start, end):
+            yield block_start, self.to_elements(values, **kwargs)
+
+    def refresh(self):
+        """Picks up timesteps added since the file was opened or last refreshed, returning the number of new ones"""
+        if not self.hdf.swmr:
+            return 0
+        self.values.refresh()
+        self.time_values.refresh()
+        size = self.size
+        self.size = self.get_size()
+        if self.size != size:
+            self.times = self.get_times()
+        return self.size - size
+
+    @instrumented
+    def to_grid(self, time_index, **kwargs) -> np.ndarray:
+        """
+        Values on a map, NaN where there is no element or no value. Land variables are placed on the number.square
+        grid and river variables on the finer sv4_numbering grid, as drawn by to_geom. The indices used to place
+        them are built once per file.
+
+        :param time_index: index of a timestep for a 2-D grid, or a slice or range of them for a 3-D grid with
+            time along the last axis
+        :param kwargs: passed to get_time, e.g. level for layered variables
+        """
+        return grid.to_grid(self, time_index, **kwargs)
+
+    @instrumented
     def get_element_by_location(self, dem, x, y):
         try:
             self.get_element(self.hdf.get_element_number(dem, x, y))
@@ -81,6 +269,7 @@ class RiverVariable(Variable):
         super().__init__(hdf, variable_name)
         self.is_river = True
 
+    @instrumented
     def get_element_by_location(self, dem, x, y, direction):
         try:
             self.get_element(self.hdf.get_channel_link_number(dem, x, y, direction))
@@ -92,56 +281,136 @@ class OverlandFlow(RiverVariable):
     def __init__(self, hdf, variable_name):
         super().__init__(hdf, variable_name)
 
-    def get_element(self, element_number):
-        return pd.Series(np.abs(self.values[self.hdf.get_element_index(element_number), :, :]).max(axis=0),
-                         index=self.times)
+    @instrumented
+    def get_element(self, element_number, start=None, end=None):
+        start, end = self.get_window(start, end)
+        return pd.Series(np.abs(self.values[self.hdf.get_element_index(element_number), :, start:end]).max(axis=0),
+                         index=self.times[start:end])
+
+    @instrumented
+    def get_time(self, time_index=None, start=None, end=None):
+        if time_index is None:
+            return self.get_window_values(start, end)
+        return np.abs(self.values[:, :, self.get_time_index(time_index)]).max(axis=1)
 
-    def get_time(self, time_index):
-        return np.abs(self.values[:, :, time_index]).max(axis=1)
+    def to_elements(self, values):
+        return np.abs(values).max(axis=1)
 
 
 class SurfaceDepth(RiverVariable):
     def __init__(self, hdf, variable_name):
         super().__init__(hdf, variable_name)
 
-    def get_element(self, element_number):
-        return pd.Series(self.values[self.hdf.get_element_index(element_number), :],
-                         index=self.times)
+    @instrumented
+    def get_element(self, element_number, start=None, end=None):
+        start, end = self.get_window(start, end)
+        return pd.Series(self.values[self.hdf.get_element_index(element_number), start:end],
+                         index=self.times[start:end])
 
-    def get_time(self, time_index):
-        return np.abs(self.values[:, time_index])
+    @instrumented
+    def get_time(self, time_index=None, start=None, end=None):
+        if time_index is None:
+            return np.abs(self.get_window_values(start, end))
+        return np.abs(self.values[:, self.get_time_index(time_index)])
 
 
 class LandVariable(Variable):
     def __init__(self, hdf, variable_name):
         super().__init__(hdf, variable_name)
 
-    def get_element(self, element_number):
+    @instrumented
+    def get_element(self, element_number, start=None, end=None):
+        start, end = self.get_window(start, end)
         index = np.where(self.hdf.number.square == element_number)
-        return pd.Series(self.values[index[0][0], index[1][0]], index=self.times)
+        return pd.Series(self.values[index[0][0], index[1][0], start:end], index=self.times[start:end])
 
-    def get_time(self, time_index):
+    @instrumented
+    def get_time(self, time_index=None, start=None, end=None):
+        if time_index is None:
+            return self.get_window_values(start, end)
         numbers = self.hdf.number.square.flatten()
-        values = self.values[:, :, time_index].flatten()
-        a = values[numbers != -1][np.argsort(numbers[numbers != -1])]
-        a[a == -1] = np.nan
-        return a
+        values = self.values[:, :, self.get_time_index(time_index)].flatten()
+        return self.mask_missing(values[numbers != -1][np.argsort(numbers[numbers != -1])])
+
+    def to_elements(self, values):
+        return values[self.hdf.land_rows, self.hdf.land_cols]
 
 
 class LayeredLandVariable(LandVariable):
     def __init__(self, hdf, variable_name):
         super().__init__(hdf, variable_name)
 
-    def get_element(self, element_number, level=0):
+    @instrumented
+    def get_element(self, element_number, level=0, start=None, end=None):
+        start, end = self.get_window(start, end)
         index = np.where(self.hdf.number.square == element_number)
-        return pd.Series(self.values[index[0][0], index[1][0], level], index=self.times)
+        return pd.Series(self.values[index[0][0], index[1][0], level, start:end], index=self.times[start:end])
 
-    def get_time(self, time_index, level=0):
+    @instrumented
+    def get_time(self, time_index=None, level=0, start=None, end=None):
+        if time_index is None:
+            return self.get_window_values(start, end, level=level)
         numbers = self.hdf.number.square.flatten()
-        values = self.values[:, :, level, time_index].flatten()
-        a = values[numbers != -1][np.argsort(numbers[numbers != -1])]
-        a[a == -1] = np.nan
-        return a
+        values = self.values[:, :, level, self.get_time_index(time_index)].flatten()
+        return self.mask_missing(values[numbers != -1][np.argsort(numbers[numbers != -1])])
+
+    def to_elements(self, values, level=0):
+        return values[self.hdf.land_rows, self.hdf.land_cols, level]
+
+    def get_thicknesses(self):
+        """Thickness in metres of each layer of each land element, with layers in the order they are stored"""
+        layers = self.values.shape[2]
+        return self.hdf.vertical_thickness.square[self.hdf.land_rows, self.hdf.land_cols, :layers]
+
+    def iter_profiles(self, start=None, end=None):
+        """Yields the first timestep index and an element by layer by time array, NaN where values are missing,
+        for consecutive blocks of timesteps in a time window, see get_window"""
+        start, end = self.get_window(start, end)
+        for block_start, values in self.iter_values(start, end):
+            yield block_start, self.mask_missing(values[self.hdf.land_rows, self.hdf.land_cols])
+
+    @instrumented
+    def get_profiles(self, start=None, end=None) -> np.ndarray:
+        """Every layer of every land element in a time window as an element by layer by time array"""
+        start, end = self.get_window(start, end)
+        profiles = np.empty((len(self.hdf.land_elements), self.values.shape[2], end - start))
+        for block_start, block in self.iter_profiles(start, end):
+            profiles[:, :, block_start - start:block_start - start + block.shape[2]] = block
+        return profiles
+
+    @instrumented
+    def get_profile(self, element_number, start=None, end=None) -> pd.DataFrame:
+        """Every layer of an element in a time window in one read, with a column for each layer"""
+        start, end = self.get_window(start, end)
+        index = np.where(self.hdf.number.square == element_number)
+        values = self.mask_missing(self.values[index[0][0], index[1][0], :, start:end])
+        return pd.DataFrame(values.T, index=self.times[start:end])
+
+    def iter_depth_integrated(self, start=None, end=None):
+        """Yields the first timestep index and an element by time array of values multiplied by layer thickness
+        and summed over layers, for consecutive blocks of timesteps in a time window"""
+        thicknesses = self.get_thicknesses()[:, :, None]
+        for block_start, profiles in self.iter_profiles(start, end):
+            valid = ~np.isnan(profiles)
+            totals = np.where(valid, profiles * thicknesses, 0).sum(axis=1)
+            totals[~valid.any(axis=1)] = np.nan
+            yield block_start, totals
+
+    @instrumented
+    def get_depth_integrated(self, start=None, end=None) -> np.ndarray:
+        """
+        Values multiplied by the thickness of each layer from Hdf.vertical_thickness and summed over the layers
+        of each land element, read block by block. For soil_moisture this is the depth of water stored in each
+        column in metres. Layers are matched to thicknesses in the order they are stored, missing layers are left
+        out and elements with no values are NaN.
+
+        :return: element by time array, in the order of land_elements
+        """
+        start, end = self.get_window(start, end)
+        totals = np.empty((len(self.hdf.land_elements), end - start))
+        for block_start, block in self.iter_depth_integrated(start, end):
+            totals[:, block_start - start:block_start - start + block.shape[1]] = block
+        return totals
 
 
 class RainVariable(Variable):
@@ -151,27 +420,78 @@ class RainVariable(Variable):
 
 
 class Hdf:
-    def __init__(self, path, model=None):
+    def __init__(self, path, model=None, swmr=False, memory_budget=None, concurrent=False, shared=None):
+        """
+        :param path: path to a SHETRAN shegraph HDF5 file
+        :param model: Model the file belongs to, used to date the timesteps
+        :param swmr: read a file that SHETRAN is still writing, see refresh and follow
+        :param memory_budget: approximate number of bytes to use for reading variables. By default the whole file is
+            loaded into memory. With a budget the file is read from disk, a quarter of the budget is used for the
+            HDF5 chunk cache and whole-variable operations read blocks of timesteps of up to a quarter each.
+        :param concurrent: share this object between threads, e.g. in a web server. Constants and element indices
+            are read once and shared while variables are read through a separate file handle for each thread, so
+            threads do not share dataset state. Variables are read from disk rather than loaded into memory and the
+            memory budget applies to each thread. HDF5 itself still runs one read at a time within a process.
+        :param shared: SharedArrays from share on another Hdf of the same file, e.g. in a worker process. Constants
+            and element indices are used read-only from shared memory without reading or copying them and variables
+            are read from disk rather than loaded into memory. Raises ValueError if they were shared from a
+            different file.
+        """
         self.path = path
         self.model = model
-        self.file = h5py.File(path, 'r', driver='core')
+        self.swmr = swmr
+        self.memory_budget = memory_budget
+        self.shared = shared
+        self.stats = None
+        self.coalescer = Coalescer()
+        cache = {} if memory_budget is None else {'rdcc_nbytes': memory_budget // 4, 'rdcc_nslots': 10007}
+        self.handles = FileHandles(path, swmr, **cache) if concurrent else None
+        if swmr:
+            self.file = h5py.File(path, 'r', libver='latest', swmr=True, **cache)
+        elif memory_budget is not None or concurrent or shared is not None:
+            self.file = h5py.File(path, 'r', **cache)
+        else:
+            self.file = h5py.File(path, 'r', driver='core')
+        if shared is not None:
+            try:
+                shared.check(path, self.file)
+            except ValueError:
+                self.file.close()
+                if self.handles is not None:
+                    self.handles.close()
+                raise
         self.catchment_maps = self.file['CATCHMENT_MAPS']
-        self.sv4_elevation = self.catchment_maps['SV4_elevation'][:]
         self.palette1 = self.catchment_maps['palette1']
         self.catchment_spreadsheets = self.file['CATCHMENT_SPREADSHEETS']
-        self.sv4_numbering = self.catchment_spreadsheets['SV4_numbering'][:]
-        self.element_numbers = np.unique(self.sv4_numbering)[1:]
         self.constants = self.file['CONSTANTS']
-        self.centroid = Constant(self.constants['centroid'])
-        self.grid_dxy = self.constants['grid_dxy']
-        self.number = Constant(self.constants['number'])
-        self.land_elements = np.unique(self.number.square)[1:]
-        self.river_elements = self.element_numbers[:min(self.land_elements) - 1]
-        self.r_span = Constant(self.constants['r_span'])
-        self.soil_type = Constant(self.constants['soil_typ'])
-        self.spatial1 = Constant(self.constants['spatial1'])
-        self.surface_elevation = Constant(self.constants['surf_elv'])
-        self.vertical_thickness = Constant(self.constants['vert_thk'])
+        if shared is not None:
+            self.sv4_elevation = shared['sv4_elevation']
+            self.sv4_numbering = shared['sv4_numbering']
+            self.element_numbers = shared['element_numbers']
+            self.grid_dxy = shared['grid_dxy']
+            self.land_elements = shared['land_elements']
+            self.land_rows, self.land_cols = shared['land_rows'], shared['land_cols']
+            self.river_elements = shared['river_elements']
+            for attribute in ['centroid', 'number', 'r_span', 'soil_type', 'spatial1', 'surface_elevation',
+                              'vertical_thickness']:
+                setattr(self, attribute, Constant(shared[attribute]))
+        else:
+            self.sv4_elevation = self.catchment_maps['SV4_elevation'][:]
+            self.sv4_numbering = self.catchment_spreadsheets['SV4_numbering'][:]
+            self.element_numbers = np.unique(self.sv4_numbering)[1:]
+            self.centroid = Constant(self.constants['centroid'])
+            self.grid_dxy = self.constants['grid_dxy'][:]
+            self.number = Constant(self.constants['number'])
+            self.land_elements = np.unique(self.number.square)[1:]
+            self.land_rows, self.land_cols = np.where(self.number.square != -1)
+            order = np.argsort(self.number.square[self.land_rows, self.land_cols])
+            self.land_rows, self.land_cols = self.land_rows[order], self.land_cols[order]
+            self.river_elements = self.element_numbers[:min(self.land_elements) - 1]
+            self.r_span = Constant(self.constants['r_span'])
+            self.soil_type = Constant(self.constants['soil_typ'])
+            self.spatial1 = Constant(self.constants['spatial1'])
+            self.surface_elevation = Constant(self.constants['surf_elv'])
+            self.vertical_thickness = Constant(self.constants['vert_thk'])
 
         self.file_variables = self.file['VARIABLES']
         self.variable_names = dict([(k.split(' ')[-1], k) for k in self.file_variables.keys()])
@@ -208,7 +528,181 @@ class Hdf:
         self.contaminant_concentration_land = LayeredLandVariable(self, 'c_c_dr_squares')
         self.contaminant_concentration_rivers = OverlandFlow(self, 'c_c_dr_rivers')
         self.spatial_variables = [var for var in self.variables if var.is_spatial]
-        self.elevations = self.get_elevations()
+        self.elevations = shared['elevations'] if shared is not None else self.get_elevations()
+
+        self.grid_indices = {}
+        self.sidecar = None
+        self.sidecar_lock = threading.Lock()
+        self.derived = {}
+        self.water_table_elevation = self.register_builtin(derived.water_table_elevation, self.ph_depth)
+        self.total_evaporation = self.register_builtin(derived.total_evaporation, self.transpiration,
+                                                       self.surface_evaporation, self.evaporation_from_interception)
+        self.discharge = self.register_builtin(derived.discharge, self.overland_flow)
+
+    def get_grid_index(self, is_river, elements) -> grid.GridIndex:
+        """Cached index placing element ordered values of river or land variables on their map grid"""
+        key = (is_river, elements)
+        if key not in self.grid_indices:
+            self.grid_indices[key] = grid.get_river_index(self, elements) if is_river else grid.get_land_index(self)
+        return self.grid_indices[key]
+
+    def register(self, name, function, inputs, long_name=None, units=None, cache_blocks=16):
+        """
+        Adds a variable computed from other variables of this file, see DerivedVariable
+
+        :param name: short name of the variable, also used for it in the sidecar file
+        :param function: called with an element by time array for each input, returning an element by time array
+        :param inputs: Variables of this file, either all river or all land variables
+        :return: the DerivedVariable, also available from Hdf.derived
+        """
+        variable = derived.DerivedVariable(self, name, function, inputs, long_name, units, cache_blocks)
+        self.derived[name] = variable
+        return variable
+
+    def register_builtin(self, factory, *inputs):
+        if any(variable is None for variable in inputs):
+            return None
+        variable = factory(self)
+        self.derived[variable.name] = variable
+        return variable
+
+    def close(self):
+        """Closes the file, its sidecar file of materialised derived variables and the file handles of every thread"""
+        self.coalescer.shutdown()
+        derived.close_sidecar(self)
+        if self.handles is not None:
+            self.handles.close()
+        self.file.close()
+
+    def instrument(self, callback=None, log=False) -> Stats:
+        """
+        Starts recording the number of HDF5 reads, bytes and elements read and time taken by each method of
+        this file and its variables. Nothing is recorded until this is called.
+
+        :param callback: called with a dict of the counts after each method call
+        :param log: log each method call to the shetranio logger at debug level
+        :return: the Stats object the counts are recorded in, also available as Hdf.stats
+        """
+        self.uninstrument()
+        self.stats = Stats(callback, log)
+        for variable in self.variables:
+            variable.values = InstrumentedDataset(variable.values, variable.name, self.stats)
+            variable.time_values = InstrumentedDataset(variable.time_values, variable.name, self.stats)
+        return self.stats
+
+    def uninstrument(self):
+        """Stops recording reads, returning the Stats recorded so far"""
+        stats = self.stats
+        for variable in self.variables:
+            if isinstance(variable.values, InstrumentedDataset):
+                variable.values = variable.values.dataset
+                variable.time_values = variable.time_values.dataset
+        self.stats = None
+        return stats
+
+    def refresh(self):
+        """Updates every variable with the timesteps written since the file was opened, only applies when swmr=True"""
+        refreshed = {variable.name: variable.refresh() for variable in self.variables}
+        for variable in self.derived.values():
+            variable.refresh()
+        return refreshed
+
+    def follow(self, variable, interval=60, timeout=None):
+        """
+        Yields the time and values of each timestep of a variable as SHETRAN writes them, starting from the first
+
+        :param variable: a Variable of this file or its short name, e.g. 'ovr_flow'
+        :param interval: seconds to wait between checks for new timesteps
+        :param timeout: stop after this many seconds without a new timestep, by default keep waiting
+        """
+        if isinstance(variable, str):
+            variable = next(v for v in self.variables if v.name == variable)
+        current = 0
+        last_change = time.time()
+        while True:
+            variable.refresh()
+            if current < variable.size:
+                last_change = time.time()
+            while current < variable.size:
+                yield variable.times[current], variable.get_time(current)
+                current += 1
+            if not self.swmr or (timeout is not None and time.time() - last_change >= timeout):
+                return
+            time.sleep(interval)
+
+    @instrumented
+    def water_balance(self, freq='D', outlet=None, start=None) -> pd.DataFrame:
+        """
+        Catchment total water balance in m3 for each period, reading each variable once block by block
+
+        Rates are multiplied by the area of each land element from grid_dxy and by the time since the previous
+        timestep. Columns are left out for variables that are not in the file. canopy_storage_change is the change
+        in storage over each period, mass_balance_error is the area weighted mean error in % and residual is
+        net_rain less evaporation, outlet_discharge and canopy_storage_change.
+
+        :param freq: pandas frequency of the periods, e.g. 'D', 'M' or 'A'
+        :param outlet: element number of the outlet link, by default the link with the largest flow at the last
+            timestep
+        :param start: date of the first timestep, by default the start date of the model, if there is no model the
+            periods are time since the start
+        """
+        return balance.water_balance(self, freq, outlet, start)
+
+    @instrumented
+    def diff(self, other, variables=None, reducer=np.nanmean, path=None, **kwargs) -> dict:
+        """
+        Compares another run of the same catchment with this one, e.g. an intervention against a baseline,
+        reading both block by block
+
+        :param other: Hdf of the other run, which must have the same element numbering
+        :param variables: short names of the variables to compare, e.g. ['ph_depth', 'ovr_flow'], by default every
+            variable in both files
+        :param reducer: function reducing an element by time array of differences over axis 0 to a value per
+            timestep
+        :param path: also write the differences, other less this, to a shegraph file that Hdf can open, NaN where
+            either value is missing, or the smallest value for integer variables, as recorded in the fill_value
+            attribute of each dataset
+        :param kwargs: passed to to_elements of layered variables, e.g. level
+        :return: dict of variable name to a dict with 'series', the reduced differences for each timestep, and
+            'elements', a DataFrame of the mean of each run, the mean, largest and smallest differences and the
+            percentage change in the mean for each element
+        """
+        return diff.diff(self, other, variables, reducer, path, **kwargs)
+
+    @instrumented
+    def subset(self, path, variables=None, elements=None, start=None, end=None):
+        """
+        Writes part of this file to a new compressed shegraph file that Hdf can open, copying block by block
+
+        The catchment maps and constants are copied whole so that element numbers and locations are unchanged.
+        Values of elements that are not selected are written as NaN, or the smallest value for integer variables,
+        which compresses to almost nothing. The value is stored in the fill_value attribute of each dataset.
+
+        :param path: path of the file to create
+        :param variables: short names of the variables to include, e.g. ['ph_depth', 'ovr_flow'], by default all
+        :param elements: element numbers to keep values for, by default all
+        :param start: first timestep index, date or time since the start to include, see Variable.get_window
+        :param end: index after the last timestep, or the last date or time since the start to include
+        :return: path
+        """
+        return subset.subset(self, path, variables, elements, start, end)
+
+    def share(self, variables=(), start=None, end=None) -> shared_memory.SharedArrays:
+        """
+        Copies the constants, element indices and optionally blocks of variables to named shared memory so that
+        worker processes can use them without each reading and holding their own copy
+
+        Pass the returned handle to the workers, which open the file with Hdf(path, shared=handle) or use
+        handle.attach() and handle.get_block(name) directly. Call handle.unlink() once every worker has finished,
+        the segments otherwise remain until the machine restarts.
+
+        :param variables: short names of variables to share the values of, e.g. ['ph_depth', 'ovr_flow']
+        :param start: first timestep index, date or time since the start of the shared values, see
+            Variable.get_window
+        :param end: index after the last timestep, or the last date or time since the start of the shared values
+        :return: SharedArrays handle that can be pickled
+        """
+        return shared_memory.share(self, variables, start, end)
 
     def get_element_number(self, dem: Dem, x, y):
         x_index, y_index = dem.get_index(x, y)
@@ -283,6 +777,7 @@ class Hdf:
 
         return x_location, y_location
 
+    @instrumented
     def to_json(self):
 
         d = {}
@@ -304,6 +799,49 @@ class Hdf:
 
         return d
 
+    async def ato_geom(self, dem, srs='EPSG:27700'):
+        """
+        Awaitable to_geom, run on a pool of Hdf.coalescer.workers threads (4 by default) so that the event loop is
+        not blocked. Concurrent calls with the same arguments share one result. The aget_element and aget_time
+        methods of each variable use the same pool, see Coalescer.
+        """
+        return await self.coalescer.run(get_key('hdf', 'to_geom', dem, srs), self.to_geom, dem, srs)
+
+    @instrumented
+    def to_binary(self, directory, dem, srs='EPSG:27700', variables=None):
+        """
+        Writes the to_geom features once as geometry.json and the values of its variables as float32 frames with
+        an index of their byte offsets, so web clients can fetch single timesteps, see shetranio.binary
+
+        :param directory: folder to write to
+        :param dem: Dem of the model or the path of its file
+        :param srs: coordinate system of the DEM, formatted like EPSG:27700
+        :param variables: names of the to_geom variables to include, by default all of them
+        """
+        return binary.write(self, directory, dem, srs, variables)
+
+    def iter_geom_blocks(self, variable, start=0, absolute=False, skip_missing=True, **kwargs):
+        """
+        Reads a variable block by block as to_geom does, yielding the first timestep index, an element by time
+        array and the smallest and largest values so far, or None if there are none yet
+
+        :param absolute: take the smallest and largest of the absolute stored values
+        :param skip_missing: leave out missing values, see Variable.is_missing, from the smallest and largest values
+        """
+        lower, upper = np.inf, -np.inf
+        for block_start, values in variable.iter_values(start):
+            block = variable.to_elements(values, **kwargs)
+            if absolute:
+                values = np.abs(values)
+            elif kwargs:
+                values = block
+            if skip_missing:
+                values = values[~variable.is_missing(values)]
+            if values.size > 0:
+                lower, upper = min(lower, float(values.min())), max(upper, float(values.max()))
+            yield block_start, block, (lower if lower != np.inf else None), (upper if upper != -np.inf else None)
+
+    @instrumented
     def to_geom(self, dem, srs='EPSG:27700'):
 
         dem = Dem(dem)
@@ -312,106 +850,61 @@ class Hdf:
 
         geoms = Geometries(self, dem, srs)
 
-        for n in self.element_numbers:
-
+        def read(variable, start=0, absolute=False, skip_missing=True, **kwargs):
+            """Reads a variable block by block, returning an element by time array and its smallest and largest
+            values"""
+            array = None
+            lower, upper = None, None
+            for block_start, block, lower, upper in self.iter_geom_blocks(variable, start, absolute, skip_missing,
+                                                                          **kwargs):
+                if array is None:
+                    array = np.empty((block.shape[0], variable.size - start))
+                array[:, block_start - start:block_start - start + block.shape[1]] = block
+            if array is None:
+                array = np.empty((0, 0))
+            return array, lower, upper
 
-            properties = {}
+        variables = []
+        values = []
+        for name, long_name, attribute, start, options in geom_variables:
+            variable = getattr(self, attribute)
+            if not variable:
+                continue
+            array, lower, upper = read(variable, start, **options)
+            positions, rows = binary.get_feature_index(self, variable)
+            values.append((name, array, dict(zip(positions.tolist(), rows.tolist()))))
+            variables.append({
+                'name': name,
+                'longName': long_name,
+                'max': upper,
+                'min': lower,
+                'times': variable.times[start:].tolist()
+            })
 
-            if self.overland_flow:
-                properties['overland_flow'] = {
-                    'values':(np.absolute(self.overland_flow.values[n-1,:,:]).max(axis=0).astype(np.float64).tolist()
-                              if n-1<self.overland_flow.values.shape[0] else [])
-                         }
-            if self.ph_depth:
-                properties['ph_depth'] = {
-                    'values':self.ph_depth.values[:][self.number.square==n].flatten().tolist()
-                }
+        dem_values = {}
+        for n, value in zip(self.sv4_numbering.flatten()[::-1], self.sv4_elevation.flatten()[::-1]):
+            dem_values[n] = value
 
-            if self.surface_depth:
-                properties['surface_depth'] = {
-                    'values':(self.surface_depth.values[n-1,:].astype(np.float64).tolist()
-                              if n-1<self.overland_flow.values.shape[0] else [])
-                         }
+        for position, n in enumerate(self.element_numbers):
 
-            if self.canopy_storage:
-                properties['canopy_storage'] = {
-                    'values':self.canopy_storage.values[:][self.number.square==n].flatten().tolist()
-                }
-            if self.soil_moisture:
-                properties['theta'] = {
-                    'values': self.soil_moisture.values[:, :, 0, 1:][self.number.square == n].flatten().tolist()
+            properties = {}
+            for name, array, index in values:
+                properties[name] = {
+                    'values': array[index[position]].tolist() if position in index and len(array) else []
                 }
 
             properties['dem'] = {
-                'value': float(self.sv4_elevation[self.sv4_numbering == n][0])
+                'value': float(dem_values[n])
             }
 
             properties['number'] = int(n)
 
-
             features.append({
                 'type': 'Feature',
                 'geometry': geoms.__next__(),
                 'properties': properties
             })
 
-        # unique, inverse = np.unique(numbers, return_inverse=True)
-
-
-        variables = []
-
-        if self.ph_depth:
-            variables.append(
-                {
-                'name': 'ph_depth',
-                'longName':'Phreatic Depth (m)',
-                'max': self.ph_depth.values[:][self.ph_depth.values[:] != -1].astype(np.float64).max(),
-                'min': self.ph_depth.values[:][self.ph_depth.values[:] != -1].astype(np.float64).min(),
-                'times': self.ph_depth.times[:].tolist()
-                })
-
-        if self.overland_flow:
-            variables.append(
-                {
-                'name': 'overland_flow',
-                'longName':'Overland Flow (cumecs)',
-                'max': np.absolute(self.overland_flow.values[:].astype(np.float64)).max(),
-                'min': np.absolute(self.overland_flow.values[:].astype(np.float64)).min(),
-                'times':self.overland_flow.times[:].tolist()
-                })
-        if self.canopy_storage:
-            variables.append(
-                {
-                'name': 'canopy_storage',
-                'longName':'Canopy Storage (mm)',
-                'max': self.canopy_storage.values[:][self.canopy_storage.values[:] != -1].astype(np.float64).max(),
-                'min': self.canopy_storage.values[:][self.canopy_storage.values[:] != -1].astype(np.float64).min(),
-                'times': self.canopy_storage.times[:].tolist()
-                })
-        if self.surface_depth:
-            variables.append(
-                {
-                    'name': 'surface_depth',
-                    'longName': 'Surface Depth (m)',
-                    'max': self.surface_depth.values[:].astype(np.float64).max(),
-                    'min': self.surface_depth.values[:].astype(np.float64).min(),
-                    'times': self.surface_depth.times[:].tolist()
-                }
-            )
-        if self.soil_moisture:
-            variables.append(
-                {
-                    'name': 'theta',
-                    'longName': 'Soil Moisture (m3/m3)',
-                    'max': (self.soil_moisture.values[:, :, 0, 1:][self.soil_moisture.values[:, :, 0, 1:] != -1].astype(np.float64).max()
-                        if len(self.soil_moisture.values[:, :, 0, 1:][self.soil_moisture.values[:, :, 0, 1:] != -1]) > 0 else None),
-                    'min': (self.soil_moisture.values[:, :, 0, 1:][self.soil_moisture.values[:, :, 0, 1:] != -1].astype(np.float64).min()
-                        if len(self.soil_moisture.values[:, :, 0, 1:][self.soil_moisture.values[:, :, 0, 1:] != -1]) > 0 else None),
-                    'times': self.soil_moisture.times[1:].tolist()
-                }
-            )
-
-
         return {
             'geom':
                     {
@@ -504,6 +997,15 @@ class Geometries:
                 'coordinates': [[[x1, y1], [x1, y2], [x2, y2], [x2, y1], [x1, y1]]]
             }
 
+# Variables included in to_geom as name, long name, Hdf attribute, first timestep and options of iter_geom_blocks
+geom_variables = [
+    ('ph_depth', 'Phreatic Depth (m)', 'ph_depth', 0, {}),
+    ('overland_flow', 'Overland Flow (cumecs)', 'overland_flow', 0, {'absolute': True, 'skip_missing': False}),
+    ('canopy_storage', 'Canopy Storage (mm)', 'canopy_storage', 0, {}),
+    ('surface_depth', 'Surface Depth (m)', 'surface_depth', 0, {'skip_missing': False}),
+    ('theta', 'Soil Moisture (m3/m3)', 'soil_moisture', 1, {'level': 0}),
+]
+
 variable_names = {
     'net_rain': 'Net Rain',
     'trnsp': 'Transpiration',
@@ -0,0 +1,145 @@
+"""
+Skill scores of simulated against observed discharge
+
+Scores are computed for many simulations at once from a member by time array of simulated values and a time
+series of observed values, leaving out timesteps where either is missing.
+"""
+import numpy as np
+import pandas as pd
+
+
+def read_observed(path) -> pd.Series:
+    """Reads daily observed flows from a csv file with dates in the first column and flows in the second,
+    such as the FlowData file written by setup or WansbeckResults.csv"""
+    df = pd.read_csv(path, usecols=[0, 1])
+    dates = pd.to_datetime(df.iloc[:, 0], dayfirst='/' in str(df.iloc[0, 0]))
+    return pd.Series(df.iloc[:, 1].values.astype(float), index=pd.DatetimeIndex(dates), name='observed')
+
+
+def get_simulated(hdfs, outlet, freq='D') -> pd.DataFrame:
+    """
+    Discharge at an outlet link of each of several runs as columns of a DataFrame, averaged over each period
+
+    :param hdfs: dict of name to Hdf, or a list of Hdf named by their position, each with a Model to date timesteps
+    :param outlet: element number of the outlet link
+    :param freq: pandas frequency to average the flows to, matching the observations
+    """
+    if not isinstance(hdfs, dict):
+        hdfs = dict(enumerate(hdfs))
+    return pd.DataFrame({name: hdf.overland_flow.get_element(outlet).resample(freq).mean()
+                         for name, hdf in hdfs.items()})
+
+
+def align(observed: pd.Series, simulated: pd.DataFrame, start=None, end=None):
+    """
+    Matches simulated values to the dates of the observations
+
+    :param observed: observed flows indexed by date
+    :param simulated: simulated flows indexed by date with a column per member
+    :param start: first date to include
+    :param end: last date to include
+    :return: observed values, a member by time array of simulated values and their dates
+    """
+    index = observed.index.intersection(simulated.index)
+    index = index[get_window(index, start, end)]
+    return observed.reindex(index).values, simulated.reindex(index).values.T, index
+
+
+def get_window(index, start=None, end=None) -> np.ndarray:
+    """Boolean mask of the dates in index that are between start and end inclusive"""
+    mask = np.ones(len(index), dtype=bool)
+    if start is not None:
+        mask &= index >= pd.Timestamp(start)
+    if end is not None:
+        mask &= index <= pd.Timestamp(end)
+    return mask
+
+
+def prepare(simulated, observed, mask=None):
+    """
+    Broadcasts simulated to a member by time array and returns it with observed and a mask of the timesteps to
+    score, which leaves out missing values and timesteps outside mask
+    """
+    simulated = np.atleast_2d(np.asarray(simulated, dtype=float))
+    observed = np.broadcast_to(np.asarray(observed, dtype=float), simulated.shape)
+    valid = np.isfinite(simulated) & np.isfinite(observed)
+    if mask is not None:
+        valid &= np.asarray(mask, dtype=bool)
+    return simulated, observed, valid
+
+
+def masked_mean(values, valid):
+    return np.where(valid, values, 0).sum(axis=-1) / valid.sum(axis=-1)
+
+
+def nse(simulated, observed, mask=None) -> np.ndarray:
+    """Nash-Sutcliffe efficiency of each member"""
+    simulated, observed, valid = prepare(simulated, observed, mask)
+    mean = masked_mean(observed, valid)[:, None]
+    error = np.where(valid, (simulated - observed) ** 2, 0).sum(axis=-1)
+    variance = np.where(valid, (observed - mean) ** 2, 0).sum(axis=-1)
+    return 1 - error / variance
+
+
+def log_nse(simulated, observed, mask=None, epsilon=None) -> np.ndarray:
+    """
+    Nash-Sutcliffe efficiency of the logarithms of flows of each member, emphasising low flows
+
+    :param epsilon: added to flows before taking logarithms to allow zero flows, by default 1% of the mean
+        observed flow
+    """
+    simulated, observed, valid = prepare(simulated, observed, mask)
+    if epsilon is None:
+        epsilon = masked_mean(observed, valid)[:, None] / 100
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return nse(np.log(simulated + epsilon), np.log(observed + epsilon), valid)
+
+
+def bias(simulated, observed, mask=None) -> np.ndarray:
+    """Percentage bias of the total simulated flow of each member relative to the total observed flow"""
+    simulated, observed, valid = prepare(simulated, observed, mask)
+    return 100 * np.where(valid, simulated - observed, 0).sum(axis=-1) / np.where(valid, observed, 0).sum(axis=-1)
+
+
+def kge(simulated, observed, mask=None, components=False):
+    """
+    Kling-Gupta efficiency of each member
+
+    :param components: also return the correlation, variability ratio and bias ratio of each member
+    """
+    simulated, observed, valid = prepare(simulated, observed, mask)
+    simulated_mean = masked_mean(simulated, valid)
+    observed_mean = masked_mean(observed, valid)
+    simulated_anomaly = np.where(valid, simulated - simulated_mean[:, None], 0)
+    observed_anomaly = np.where(valid, observed - observed_mean[:, None], 0)
+    simulated_std = np.sqrt((simulated_anomaly ** 2).sum(axis=-1) / valid.sum(axis=-1))
+    observed_std = np.sqrt((observed_anomaly ** 2).sum(axis=-1) / valid.sum(axis=-1))
+    r = (simulated_anomaly * observed_anomaly).sum(axis=-1) / valid.sum(axis=-1) / (simulated_std * observed_std)
+    alpha = simulated_std / observed_std
+    beta = simulated_mean / observed_mean
+    score = 1 - np.sqrt((r - 1) ** 2 + (alpha - 1) ** 2 + (beta - 1) ** 2)
+    if components:
+        return score, r, alpha, beta
+    return score
+
+
+def score(simulated, observed, mask=None, names=None) -> pd.DataFrame:
+    """
+    NSE, KGE, bias and log NSE of every member at once
+
+    :param simulated: member by time array, or a DataFrame with a column per member aligned with observed
+    :param observed: observed values for each timestep
+    :param mask: boolean array of the timesteps to score, see get_window
+    :param names: names of the members, by default the DataFrame columns or their positions
+    """
+    if isinstance(simulated, pd.DataFrame):
+        names = simulated.columns if names is None else names
+        simulated = simulated.values.T
+    if isinstance(observed, pd.Series):
+        observed = observed.values
+    return pd.DataFrame({
+        'nse': nse(simulated, observed, mask),
+        'kge': kge(simulated, observed, mask),
+        'bias': bias(simulated, observed, mask),
+        'log_nse': log_nse(simulated, observed, mask),
+    }, index=names)
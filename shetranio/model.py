@@ -5,7 +5,7 @@ from datetime import datetime
 
 
 class Model:
-    def __init__(self, library_file_path, name=None):
+    def __init__(self, library_file_path, name=None, swmr=False):
         self.library = library_file_path
         self.name = name
         with open(library_file_path) as f:
@@ -48,7 +48,7 @@ class Model:
 
         self.dem = dem.Dem(self.get_path('DEMMeanFileName'))
         self.hdf = hdf.Hdf(self.path('output_{}_shegraph.h5'.format(self.catchment_name)),
-                           model=self)
+                           model=self, swmr=swmr)
 
     def get(self, name):
         value = self.tree.find(name.lower())
@@ -0,0 +1,81 @@
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from .run import Run
+from . import setup as setup_module
+
+
+class Result:
+    def __init__(self, run: Run, error: str = None, duration: float = None):
+        self.run = run
+        self.error = error
+        self.duration = duration
+
+    @property
+    def succeeded(self):
+        return self.error is None
+
+    def __repr__(self):
+        return '<Result {} {}>'.format(self.run.gauge_id, 'succeeded' if self.succeeded else 'failed')
+
+
+def get_shared_inputs(runs) -> list:
+    """National input rasters used by any of the runs"""
+    paths = []
+    for run in runs:
+        inputs = [run.inputs.dem, run.inputs.min_dem, run.inputs.soil, run.inputs.veg, run.inputs.lakes,
+                  run.inputs.pe]
+        if setup_module.rainfall_source != 'GEAR':
+            inputs.append(run.inputs.rain)
+        for path in inputs:
+            if path not in paths and os.path.exists(path):
+                paths.append(path)
+    return paths
+
+
+def initialise(paths):
+    for path in paths:
+        setup_module.open_dataset(path)
+
+
+def process(run: Run, catchment: bool) -> Result:
+    start = time.time()
+    try:
+        if catchment:
+            setup_module.setup_catchment(run)
+        else:
+            setup_module.setup(run)
+    except Exception:
+        return Result(run, traceback.format_exc(), time.time() - start)
+    return Result(run, duration=time.time() - start)
+
+
+def setup_many(runs, workers: int = None, catchment: bool = False) -> list:
+    """
+    Sets up many runs in a pool of processes. Each worker opens the national input rasters once and reuses
+    them for every run it is given. A failing run does not stop the others, check Result.error.
+
+    :param runs: Run objects, each must have its own path
+    :param workers: number of processes, defaults to the number of CPUs
+    :param catchment: use setup_catchment, which also fetches observed flows and zips the outputs
+    :return: a Result for each run, in the same order as runs
+    """
+    runs = list(runs)
+    paths = [os.path.abspath(run.path) for run in runs]
+    assert len(set(paths)) == len(paths), 'Each run must have a separate output directory'
+
+    if workers == 1:
+        initialise(get_shared_inputs(runs))
+        return [process(run, catchment) for run in runs]
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=initialise,
+                             initargs=(get_shared_inputs(runs),)) as executor:
+        futures = [executor.submit(process, run, catchment) for run in runs]
+        results = []
+        for run, future in zip(runs, futures):
+            try:
+                results.append(future.result())
+            except Exception:
+                results.append(Result(run, traceback.format_exc()))
+        return results
@@ -3,28 +3,28 @@ import os
 import zipfile
 import math
 import numpy as np
+from . import raster
 
-def create(outline: str, resolution: int, output_path: str) -> None:
-    """
-    Converts a vector catchment outline to a gridded mask at specified resolution
-    Mask output is aligned to coordinates 0 0
-    Any grid cells intersected by the geometry are designated as within the domain
+no_data = -9999
 
-    :param outline: path to a zipped shapefile, must contain one feature
-    :param resolution: resolution of the output mask in metres
-    :param output_path: location to save the created tiff file
-    """
+
+def open_outline(outline: str):
+    """Opens a zipped shapefile from memory, returning the data source and its first layer"""
     zipped_file = zipfile.ZipFile(outline, 'r')
     shp = [f.filename for f in zipped_file.infolist() if f.filename.endswith('shp')][0]
     for f in zipped_file.infolist():
         gdal.FileFromMemBuffer(os.path.join('/vsimem', f.filename), bytes(zipped_file.read(f.filename)))
 
     upload = ogr.Open(os.path.join('/vsimem', shp))
+    return upload, upload.GetLayer()
 
-    layer = upload.GetLayer()
 
-    feature = layer.GetNextFeature()
-    geom = feature.GetGeometryRef()
+def rasterize(geom, resolution: int) -> tuple:
+    """
+    Burns a geometry into an in-memory byte grid aligned to coordinates 0 0
+
+    :return: array of 1 inside and no_data outside the geometry, and the header of the grid
+    """
     minX, maxX, minY, maxY = geom.GetEnvelope()
 
     minX = math.floor(minX / resolution) * resolution
@@ -35,65 +35,80 @@ def create(outline: str, resolution: int, output_path: str) -> None:
     width = int((maxX - minX) / resolution)
     height = int((maxY - minY) / resolution)
 
-    driver = gdal.GetDriverByName('GTiff')
-    target_ds = driver.Create(output_path+'.tif', width, height, 1, gdal.GDT_Float32)
-    target_ds.SetGeoTransform((minX, resolution, 0, maxY, 0, -1*resolution))
+    target_ds = gdal.GetDriverByName('MEM').Create('', width, height, 1, gdal.GDT_Byte)
+    target_ds.SetGeoTransform((minX, resolution, 0, maxY, 0, -1 * resolution))
 
-    no_data = -9999
-    band = target_ds.GetRasterBand(1)
-    band.WriteArray(np.full([height, width], no_data))
-    band.FlushCache()
-    band.SetNoDataValue(no_data)
-    del target_ds
+    source_ds = ogr.GetDriverByName('Memory').CreateDataSource('')
+    source_layer = source_ds.CreateLayer('outline', geom_type=geom.GetGeometryType())
+    feature = ogr.Feature(source_layer.GetLayerDefn())
+    feature.SetGeometry(geom)
+    source_layer.CreateFeature(feature)
 
-    target_ds = gdal.Open(output_path + '.tif', gdal.GA_Update)
-    gdal.RasterizeLayer(target_ds, [1], layer, burn_values=[1], options=['ALL_TOUCHED=TRUE'])
-    target_ds.FlushCache()
+    gdal.RasterizeLayer(target_ds, [1], source_layer, burn_values=[1], options=['ALL_TOUCHED=TRUE'])
+    values = np.where(target_ds.ReadAsArray() == 1, 1, no_data).astype(np.int16)
 
-    # Convert to ASCII grid
-    driver = gdal.GetDriverByName("AAIGrid")
-    driver.CreateCopy(output_path, target_ds, 0)
+    return values, raster.Header(width, height, minX, minY, resolution, no_data)
 
-def extract(mask_path: str, input_path: str, output_path: str, resolution: int) -> None:
+
+def create(outline: str, resolution: int, output_path: str) -> None:
     """
-    Input data and mask must aligned to the same coordinate grid
+    Converts a vector catchment outline to a gridded mask at specified resolution
+    Mask output is aligned to coordinates 0 0
+    Any grid cells intersected by the geometry are designated as within the domain
 
-    :param mask_path: path to mask file in GDAL recognised format
-    :param input_path: path to input data in GDAL recognised format
-    :param output_path: path to output data in GDAL recognised format
-    :param resolution: resolution of
+    :param outline: path to a zipped shapefile, must contain one feature
+    :param resolution: resolution of the output mask in metres
+    :param output_path: location to save the created ASCII grid
     """
-    mask_file = open(mask_path, "r")
+    upload, layer = open_outline(outline)
 
-    n_cols_line = mask_file.readline()
-    n_cols_list = n_cols_line.rstrip().split()
-    n_cols = float(n_cols_list[1])
+    feature = layer.GetNextFeature()
+    values, header = rasterize(feature.GetGeometryRef(), resolution)
+    raster.write_ascii(output_path, values, header)
 
-    n_rows_line = mask_file.readline()
-    n_rows_list = n_rows_line.rstrip().split()
-    n_rows = float(n_rows_list[1])
 
-    bx_line = mask_file.readline()
-    bx_list = bx_line.rstrip().split()
-    x_lower_left_corner = float(bx_list[1])
+def create_many(outline: str, resolution: int, output_directory: str, id_field: str) -> list:
+    """
+    Converts every feature of a vector layer to its own gridded mask, as create does for a single outline
+    Masks are named after the value of id_field for each feature, e.g. 44006.txt
+
+    :param outline: path to a zipped shapefile, may contain many features
+    :param resolution: resolution of the output masks in metres
+    :param output_directory: folder to save the created ASCII grids in
+    :param id_field: name of the attribute that identifies each catchment
+    :return: paths of the created masks
+    """
+    upload, layer = open_outline(outline)
 
-    by_line = mask_file.readline()
-    by_list = by_line.rstrip().split()
-    y_lower_left_corner = float(by_list[1])
+    if not os.path.exists(output_directory):
+        os.makedirs(output_directory)
 
-    mask_file.close()
-    ds = gdal.Open(input_path)
+    paths = []
+    for feature in layer:
+        geom = feature.GetGeometryRef()
+        if geom is None:
+            continue
+        catchment_id = feature.GetField(id_field)
+        if isinstance(catchment_id, float) and catchment_id.is_integer():
+            catchment_id = int(catchment_id)
+        values, header = rasterize(geom, resolution)
+        path = os.path.join(output_directory, '{}.txt'.format(catchment_id))
+        raster.write_ascii(path, values, header)
+        paths.append(path)
+
+    return paths
 
-    start_line_number = ds.RasterYSize - y_lower_left_corner / resolution - n_rows
-    start_index_number = x_lower_left_corner / resolution
-
-    gdal.Translate(output_path,
-                   ds,
-                   srcWin=
-                   [
-                       start_index_number,
-                       start_line_number,
-                       n_cols,
-                       n_rows
-                   ],
-                   format='AAIGrid')
+
+def extract(mask_path: str, input_path: str, output_path: str, resolution: int) -> None:
+    """
+    Input data and mask must aligned to the same coordinate grid
+
+    :param mask_path: path to mask file in GDAL recognised format
+    :param input_path: path to input data in GDAL recognised format
+    :param output_path: path to write the output ASCII grid to
+    :param resolution: resolution of the input data and mask in metres
+    """
+    header = raster.read_header(mask_path)
+    ds = gdal.Open(input_path)
+    assert np.isclose(ds.GetGeoTransform()[1], resolution), 'Input data must have a resolution of {}'.format(resolution)
+    raster.write_ascii(output_path, raster.read_window(ds, header), header, ds.GetRasterBand(1).GetNoDataValue())
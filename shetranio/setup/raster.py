@@ -0,0 +1,90 @@
+import numpy as np
+
+
+class Header:
+    def __init__(self, ncols, nrows, xllcorner, yllcorner, cellsize, nodata=None):
+        self.ncols = int(ncols)
+        self.nrows = int(nrows)
+        self.xllcorner = float(xllcorner)
+        self.yllcorner = float(yllcorner)
+        self.cellsize = float(cellsize)
+        self.nodata = nodata
+
+    @property
+    def yulcorner(self):
+        return self.yllcorner + self.nrows * self.cellsize
+
+    def get_window(self, ds) -> tuple:
+        """
+        Returns the column and row offsets and size of this grid within a larger dataset on the same grid
+
+        :param ds: GDAL dataset covering the extent of this grid
+        """
+        x_min, x_res, _, y_max, _, y_res = ds.GetGeoTransform()
+        assert np.isclose(x_res, self.cellsize), 'Input data and mask must have the same resolution'
+        return (int(round((self.xllcorner - x_min) / x_res)),
+                int(round((y_max - self.yulcorner) / -y_res)),
+                self.ncols,
+                self.nrows)
+
+
+def read_header(path: str) -> Header:
+    """Parses the header of an ESRI ASCII grid without reading its values"""
+    values = {}
+    with open(path) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) != 2 or parts[0][0].isdigit() or parts[0][0] == '-':
+                break
+            values[parts[0].lower()] = parts[1]
+    nodata = values.get('nodata_value')
+    return Header(values['ncols'], values['nrows'], values['xllcorner'], values['yllcorner'], values['cellsize'],
+                  float(nodata) if nodata is not None else None)
+
+
+def read_ascii(path: str) -> tuple:
+    """Reads the values and header of an ESRI ASCII grid"""
+    header = read_header(path)
+    skip = 6 if header.nodata is not None else 5
+    return np.loadtxt(path, skiprows=skip, ndmin=2), header
+
+
+def read_window(ds, header: Header) -> np.ndarray:
+    """
+    Reads the part of the first band of a GDAL dataset covered by a grid with the given header. Cells of the grid
+    outside the dataset are filled with the nodata value of the band, or -9999 if it has none.
+    """
+    band = ds.GetRasterBand(1)
+    x, y, ncols, nrows = header.get_window(ds)
+    x_start, y_start = max(x, 0), max(y, 0)
+    x_end, y_end = min(x + ncols, ds.RasterXSize), min(y + nrows, ds.RasterYSize)
+    nodata = band.GetNoDataValue()
+    if x_end <= x_start or y_end <= y_start:
+        return np.full((nrows, ncols), -9999 if nodata is None else nodata)
+    inside = band.ReadAsArray(x_start, y_start, x_end - x_start, y_end - y_start)
+    if (x_start, y_start, x_end, y_end) == (x, y, x + ncols, y + nrows):
+        return inside
+    values = np.full((nrows, ncols), -9999 if nodata is None else nodata, dtype=inside.dtype)
+    values[y_start - y:y_end - y, x_start - x:x_end - x] = inside
+    return values
+
+
+def write_ascii(path: str, values: np.ndarray, header: Header, nodata=None) -> None:
+    """Writes an array as an ESRI ASCII grid with the location and cell size of header"""
+    nrows, ncols = values.shape
+    nodata = header.nodata if nodata is None else nodata
+    with open(path, 'w') as f:
+        f.write('ncols        {}\n'.format(ncols))
+        f.write('nrows        {}\n'.format(nrows))
+        f.write('xllcorner    {!r}\n'.format(header.xllcorner))
+        f.write('yllcorner    {!r}\n'.format(header.yllcorner))
+        f.write('cellsize     {!r}\n'.format(header.cellsize))
+        if np.issubdtype(values.dtype, np.integer):
+            fmt = '%d'
+            if nodata is not None:
+                f.write('NODATA_value  {}\n'.format(int(nodata)))
+        else:
+            fmt = '%.10g'
+            if nodata is not None:
+                f.write('NODATA_value  {:.10g}\n'.format(nodata))
+        np.savetxt(f, values, fmt=fmt, delimiter=' ')
@@ -46,22 +46,22 @@ class Run:
             gauge_id=None,
             boundary=None,
             path=None,
-            overwrite=True
+            overwrite=False
     ):
-        """start and end dates must be formatted YYYY-MM-DD and resolution is either '1km', '500m' or '100m'"""
+        """start and end dates must be formatted YYYY-MM-DD and resolution is either '1km', '500m' or '100m'
+        An existing path is only deleted if overwrite is True, otherwise setup updates the stages that have changed"""
         self.gauge_id = gauge_id
         self.resolution = resolution
-        self.resolution.f = 3
         self.start_date = start_date
         self.end_date = end_date
         self.path = os.path.join('outputs', str(self.gauge_id)) if path is None else path
-
+        self.directory = self.path
 
         if os.path.exists(self.path) and overwrite:
             shutil.rmtree(self.path)
             
-        if not os.path.exists(path):
-            os.mkdir(path)
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
             
         self.boundary = boundary
         self.outputs = Outputs(self)
@@ -0,0 +1,152 @@
+import os
+import json
+import time
+import subprocess
+
+queued = 'queued'
+running = 'running'
+finished = 'finished'
+failed = 'failed'
+
+
+def get_cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+class Job:
+    def __init__(self, directory, args, status=queued, exit_code=None, wall_time=None, started=None, log=None,
+                 error=None):
+        self.directory = directory
+        self.args = list(args)
+        self.status = status
+        self.exit_code = exit_code
+        self.wall_time = wall_time
+        self.started = started
+        self.log = os.path.join(directory, 'shetran.log') if log is None else log
+        self.error = error
+        self.process = None
+        self.log_file = None
+
+    def to_json(self):
+        return {key: getattr(self, key) for key in ['directory', 'args', 'status', 'exit_code', 'wall_time',
+                                                    'started', 'log', 'error']}
+
+    def __repr__(self):
+        return '<Job {} {}>'.format(self.directory, self.status)
+
+
+class Scheduler:
+    def __init__(self, executable='sv4.4.2asnow.exe', state_path='schedule.json', workers=None, interval=1.0):
+        """
+        Runs SHETRAN in many prepared directories, at most workers at a time. Progress is saved to state_path after
+        every change so that calling run again after an interruption only runs the jobs that had not finished.
+
+        :param executable: path to the SHETRAN executable, or any program taking the same arguments
+        :param state_path: JSON file recording the status, exit code, wall time, log and any error starting each job
+        :param workers: maximum number of simultaneous runs, defaults to the number of available cores
+        :param interval: seconds to wait between checks on running jobs
+        """
+        self.executable = executable
+        self.state_path = state_path
+        self.workers = get_cores() if workers is None else workers
+        self.interval = interval
+        self.jobs = []
+        if os.path.exists(state_path):
+            with open(state_path) as f:
+                self.jobs = [Job(**job) for job in json.load(f)]
+
+    def save(self):
+        with open(self.state_path + '.tmp', 'w') as f:
+            json.dump([job.to_json() for job in self.jobs], f, indent=1)
+        os.replace(self.state_path + '.tmp', self.state_path)
+
+    def add(self, directory, args=None) -> Job:
+        """
+        Queues a run directory unless it is already in the schedule
+
+        :param directory: prepared run directory, the executable is started in this directory
+        :param args: arguments to the executable, defaults to -f rundata_<directory name>.txt
+        """
+        directory = os.path.abspath(directory)
+        for job in self.jobs:
+            if job.directory == directory:
+                return job
+        if args is None:
+            args = ['-f', 'rundata_{}.txt'.format(os.path.basename(directory))]
+        job = Job(directory, args)
+        self.jobs.append(job)
+        self.save()
+        return job
+
+    def start(self, job: Job) -> bool:
+        """Starts a job, marking it failed with the error if the executable cannot be started"""
+        job.started = time.time()
+        job.error = None
+        try:
+            job.log_file = open(job.log, 'w')
+            job.process = subprocess.Popen([self.executable] + job.args, cwd=job.directory,
+                                           stdout=job.log_file, stderr=subprocess.STDOUT)
+        except OSError as e:
+            if job.log_file is not None:
+                job.log_file.close()
+                job.log_file = None
+            job.error = str(e)
+            job.wall_time = time.time() - job.started
+            job.status = failed
+            self.save()
+            return False
+        job.status = running
+        self.save()
+        return True
+
+    def check(self, job: Job) -> bool:
+        exit_code = job.process.poll()
+        if exit_code is None:
+            return False
+        job.log_file.close()
+        job.log_file = None
+        job.exit_code = exit_code
+        job.wall_time = time.time() - job.started
+        job.status = finished if exit_code == 0 else failed
+        job.process = None
+        self.save()
+        return True
+
+    def run(self, retry_failed=False) -> list:
+        """
+        Runs every queued job, including jobs left running by an interrupted batch
+
+        :param retry_failed: also rerun jobs that exited with an error
+        :return: all jobs in the schedule
+        """
+        for job in self.jobs:
+            if job.status == running or (retry_failed and job.status == failed):
+                job.status = queued
+        self.save()
+
+        pending = [job for job in self.jobs if job.status == queued]
+        active = []
+        try:
+            while pending or active:
+                while pending and len(active) < self.workers:
+                    job = pending.pop(0)
+                    if self.start(job):
+                        active.append(job)
+                done = [job for job in active if self.check(job)]
+                active = [job for job in active if job not in done]
+                if active and not done:
+                    time.sleep(self.interval)
+        finally:
+            for job in active:
+                job.process.kill()
+                job.process.wait()
+                job.log_file.close()
+                job.log_file = None
+                job.process = None
+                job.status = queued
+            self.save()
+
+        return self.jobs
@@ -0,0 +1,158 @@
+import os
+import re
+import json
+from datetime import datetime
+from itertools import islice
+import numpy as np
+
+ncols = 180
+
+
+def get_coordinates(time_series_id: int) -> tuple:
+    """
+    Returns the x and y coordinates used to name the UKCP09 file of a 5km grid square id
+
+    :param time_series_id: id of the grid square, numbered row by row from 1 in rows of 180
+    """
+    time_series_id = int(time_series_id)
+    return (time_series_id - 1) % ncols + 1, (time_series_id - 1) // ncols + 1
+
+
+def get_id(x: int, y: int) -> int:
+    return (int(y) - 1) * ncols + int(x)
+
+
+def get_days(start_date: str, end_date: str) -> int:
+    """Number of days between two dates formatted YYYY-MM-DD, this doesn't count the end date"""
+    return (datetime.strptime(end_date, "%Y-%m-%d") - datetime.strptime(start_date, "%Y-%m-%d")).days
+
+
+def get_lines(f):
+    """Values of a series file, one per line, skipping blank lines"""
+    return (line.strip() for line in f if line.strip())
+
+
+def format_value(value) -> str:
+    """Shortest text that reads back as the same float64, e.g. 1.4 or 12"""
+    return np.format_float_positional(value, trim='-')
+
+
+def read_text(directory: str, name: str, ids, origin: str, start_date: str, end_date: str) -> np.ndarray:
+    """
+    Reads a date range from the text file of each grid square, one value per line starting at origin
+
+    :param directory: folder containing files named like [x][y]<name>TimeSeries.txt
+    :param name: name of the series in the file names, e.g. PEBetter, Rainfall, MaxTemp
+    :param ids: grid square ids to read
+    :param origin: date of the first line in each file formatted YYYY-MM-DD
+    :param start_date: first date to read formatted YYYY-MM-DD
+    :param end_date: date after the last date to read formatted YYYY-MM-DD
+    :return: array of shape (days, squares)
+    """
+    lines_to_skip = get_days(origin, start_date)
+    lines_to_read = get_days(start_date, end_date)
+    values = np.full((lines_to_read, len(ids)), np.nan)
+    for i, time_series_id in enumerate(ids):
+        x, y = get_coordinates(time_series_id)
+        with open(os.path.join(directory, '[{}][{}]{}TimeSeries.txt'.format(x, y, name))) as f:
+            lines = list(islice(get_lines(f), lines_to_skip, lines_to_skip + lines_to_read))
+        values[:len(lines), i] = np.array(lines, dtype=float)
+    return values
+
+
+def ingest(directory: str, name: str, origin: str, output_path: str) -> 'Store':
+    """
+    Packs the per-square text files of a UKCP09 series into a memory-mapped float64 store that can be read
+    for any date range and set of squares without scanning the text files. Only needs doing once per series.
+
+    :param directory: folder containing files named like [x][y]<name>TimeSeries.txt
+    :param name: name of the series in the file names, e.g. PEBetter, Rainfall, MaxTemp
+    :param origin: date of the first line in each file formatted YYYY-MM-DD
+    :param output_path: folder to create the store in
+    """
+    pattern = re.compile(r'^\[(\d+)\]\[(\d+)\]' + re.escape(name) + r'TimeSeries\.txt$')
+    files = {}
+    for filename in os.listdir(directory):
+        match = pattern.match(filename)
+        if match:
+            files[get_id(*match.groups())] = os.path.join(directory, filename)
+    assert files, 'No {}TimeSeries.txt files found in {}'.format(name, directory)
+
+    ids = np.array(sorted(files), dtype=np.int32)
+
+    days = 0
+    for time_series_id in ids:
+        with open(files[time_series_id]) as f:
+            days = max(days, sum(1 for _ in get_lines(f)))
+
+    if not os.path.exists(output_path):
+        os.makedirs(output_path)
+
+    values = np.lib.format.open_memmap(os.path.join(output_path, 'values.npy'), mode='w+',
+                                       dtype=np.float64, shape=(len(ids), days))
+    for row, time_series_id in enumerate(ids):
+        with open(files[time_series_id]) as f:
+            series = np.array(list(get_lines(f)), dtype=np.float64)
+        values[row, :len(series)] = series
+        values[row, len(series):] = np.nan
+    values.flush()
+    del values
+
+    np.save(os.path.join(output_path, 'ids.npy'), ids)
+    with open(os.path.join(output_path, 'index.json'), 'w') as f:
+        json.dump({'name': name, 'origin': origin, 'days': days}, f)
+
+    return Store(output_path)
+
+
+class Store:
+    """Square x day array of a UKCP09 series created by ingest"""
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'index.json')) as f:
+            index = json.load(f)
+        self.name = index['name']
+        self.origin = index['origin']
+        self.days = index['days']
+        self.ids = np.load(os.path.join(path, 'ids.npy'))
+        self.values = np.load(os.path.join(path, 'values.npy'), mmap_mode='r')
+
+    def get_rows(self, ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        rows = np.searchsorted(self.ids, ids)
+        missing = (rows >= len(self.ids)) | (self.ids[np.minimum(rows, len(self.ids) - 1)] != ids)
+        if missing.any():
+            raise KeyError('Grid squares {} are not in the {} store'.format(ids[missing].tolist(), self.name))
+        return rows
+
+    def read(self, ids, start_date: str, end_date: str) -> np.ndarray:
+        """
+        :param ids: grid square ids to read
+        :param start_date: first date to read formatted YYYY-MM-DD
+        :param end_date: date after the last date to read formatted YYYY-MM-DD
+        :return: array of shape (days, squares)
+        """
+        start = get_days(self.origin, start_date)
+        end = start + get_days(start_date, end_date)
+        assert 0 <= start and end <= self.days, \
+            'Dates are outside of the {} store which covers {} days from {}'.format(self.name, self.days, self.origin)
+        return np.ascontiguousarray(self.values[self.get_rows(ids), start:end].T)
+
+
+def read(directory: str, name: str, ids, origin: str, start_date: str, end_date: str) -> np.ndarray:
+    """Reads from the store ingested next to directory if there is one, otherwise from the text files"""
+    store_path = get_store_path(directory)
+    if os.path.exists(os.path.join(store_path, 'index.json')):
+        return Store(store_path).read(ids, start_date, end_date)
+    return read_text(directory, name, ids, origin, start_date, end_date)
+
+
+def get_store_path(directory: str) -> str:
+    return os.path.normpath(directory) + '.store'
+
+
+def write(f, ids, values: np.ndarray, start_date: str, end_date: str) -> None:
+    """Writes series in the SHETRAN csv layout, one column per grid square id"""
+    f.write(','.join(str(int(i)) for i in ids) + ',' + start_date + ' to ' + end_date + '\n')
+    for row in values:
+        f.write(','.join(format_value(value) for value in row) + '\n')
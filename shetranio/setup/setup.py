@@ -6,258 +6,174 @@ from .run import Run
 import numpy as np
 import gdal
 from . import gear
+from . import series
+from . import stages
 
 from . import mask
+from . import raster
 from .library import make_lib_file
 
 rainfall_source = 'GEAR'
 
+# Daily CEH-GEAR rainfall files, CEH_GEAR_daily_GB_<year>.nc, as downloaded by gear.download_ceh_gear
+gear_directory = '../Inputs/CEH_GEAR'
 
-def get_temp(pe_id_list, start_date, end_date, temp_time_series_file, max_or_min):
-    # calculate start and end line numbers
-    start_line_delta = datetime.strptime(start_date, "%Y-%m-%d") - datetime.strptime("01/01/1960", "%d/%m/%Y")
-    lines_to_skip = start_line_delta.days
-    lines_to_read_delta = datetime.strptime(end_date, "%Y-%m-%d") - datetime.strptime(start_date, "%Y-%m-%d")
-    lines_to_read = lines_to_read_delta.days  # this doesn't count the end date... i think this is what SHETRAN wants
-    # get time series for each id
-    all_grid_squares_time_series_list = []
-    for i in range(len(pe_id_list)):
-        one_grid_square_time_series_list = [str(pe_id_list[i])]
-        time_series_id = int(pe_id_list[i])
-        # get numbers of the equivalent file
-        if time_series_id == -9999:
-            pass
-        else:
-            if time_series_id % 180 == 0:
-                x_coord = 180
-                y_coord = int(round(time_series_id / 180, 0))
-            else:
-                x_coord = time_series_id % 180
-                y_coord = int(round(time_series_id / 180, 0)) + 1
-
-            assert isinstance(max_or_min, str)
-            temp_file = open("../UKCP09" + max_or_min + "TempTimeSeries/[" + str(x_coord) + "][" + str(
-                y_coord) + "]" + max_or_min + "TempTimeSeries.txt", "r")
-
-            for a in range(lines_to_skip):
-                temp_file.readline()
-            for b in range(lines_to_read):
-                temp_val = temp_file.readline().rstrip()
-                one_grid_square_time_series_list.append(temp_val)
-
-            temp_file.close()
-            all_grid_squares_time_series_list.append(one_grid_square_time_series_list)
+datasets = {}
 
-    print("writing temp time series data to file")
-    for c in range(len(all_grid_squares_time_series_list[0])):
-        line_list = []
-        for d in range(len(all_grid_squares_time_series_list)):
-            line_list.append(str(all_grid_squares_time_series_list[d][c]))
-        line = ",".join(line_list)
-        if c == 0:
-            temp_time_series_file.write(line + "," + start_date + " to " + end_date + "\n")
-        else:
-            temp_time_series_file.write(line + "\n")
 
+def open_dataset(path):
+    """Opens a national input raster, reusing the dataset if this process has already opened it"""
+    if path not in datasets:
+        datasets[path] = gdal.Open(path)
+        assert datasets[path] is not None, 'Could not open {}'.format(path)
+    return datasets[path]
 
-def setup(run: Run):
 
-    directory = "outputs/{}".format(run.gauge_id)
-    print("Creating directory...")
-    if not os.path.exists(directory):
-        os.makedirs(directory)
+def get_temp(pe_id_list, start_date, end_date, temp_time_series_file, max_or_min):
+    assert isinstance(max_or_min, str)
+    ids = [int(i) for i in pe_id_list if int(i) != -9999]
+    values = series.read("../UKCP09" + max_or_min + "TempTimeSeries", max_or_min + "Temp", ids,
+                         "1960-01-01", start_date, end_date)
+
+    print("writing temp time series data to file")
+    series.write(temp_time_series_file, ids, values, start_date, end_date)
+
 
+def make_mask(run: Run):
     if run.boundary is not None:
-        mask.create(run.outline, run.resolution, out)
+        mask.create(run.boundary, run.resolution_in_metres, run.outputs.mask)
     else:
         shutil.copy2(run.inputs.mask, run.outputs.mask)
 
-    mask_file = open(run.outputs.mask, "r")
-
-    n_cols_line = mask_file.readline()
-    n_cols_list = n_cols_line.rstrip().split()
-    n_cols = float(n_cols_list[1])
 
-    n_rows_line = mask_file.readline()
-    n_rows_list = n_rows_line.rstrip().split()
-    n_rows = float(n_rows_list[1])
+def get_rasters(run: Run) -> list:
+    rasters = [(run.inputs.dem, run.outputs.dem),
+               (run.inputs.min_dem, run.outputs.min_dem),
+               (run.inputs.soil, run.outputs.soil),
+               (run.inputs.veg, run.outputs.veg),
+               (run.inputs.lakes, run.outputs.lakes),
+               (run.inputs.pe, run.outputs.pe)]
+    if rainfall_source != 'GEAR':
+        rasters.append((run.inputs.rain, run.outputs.rain))
+    return rasters
 
-    bx_line = mask_file.readline()
-    bx_list = bx_line.rstrip().split()
-    x_lower_left_corner = float(bx_list[1])
 
-    by_line = mask_file.readline()
-    by_list = by_line.rstrip().split()
-    y_lower_left_corner = float(by_list[1])
+def extract_rasters(run: Run):
+    header = raster.read_header(run.outputs.mask)
 
-    mask_file.close()
+    for in_file, out_file in get_rasters(run):
+        ds = open_dataset(in_file)
+        values = raster.read_window(ds, header)
+        raster.write_ascii(out_file, values, header, ds.GetRasterBand(1).GetNoDataValue())
 
-    def extract(in_file, out_file):
-        ds = gdal.Open(in_file)
 
-        start_line_number = ds.RasterYSize - y_lower_left_corner / run.resolution_in_metres - n_rows
-        start_index_number = x_lower_left_corner / run.resolution_in_metres
+def get_ids(path) -> np.ndarray:
+    """Sorted unique time series ids in an extracted grid"""
+    values, header = raster.read_ascii(path)
+    ids = np.unique(values)
+    return ids[ids != -9999].astype(int)
 
-        gdal.Translate(out_file, ds, srcWin=[
-                start_index_number,
-                start_line_number,
-                n_cols,
-                n_rows],
-                       format='AAIGrid')
-        del ds
-        ds = gdal.Open(out_file)
-        unique_values = np.unique(ds.ReadAsArray())
-        del ds
-        return unique_values
 
-    extract(run.inputs.dem, run.outputs.dem)
-    extract(run.inputs.min_dem, run.outputs.min_dem)
-    extract(run.inputs.soil, run.outputs.soil)
-    extract(run.inputs.veg, run.outputs.veg)
-    extract(run.inputs.lakes, run.outputs.lakes)
+def get_series_sources() -> list:
+    """National series the forcing stage reads, including the GEAR rainfall when that is the rainfall source"""
+    directories = ["../UKCP09PEBetterTimeSeries", "../UKCP09MaxTempTimeSeries", "../UKCP09MinTempTimeSeries"]
+    if rainfall_source != 'GEAR':
+        directories.append("../Inputs/UKCP09RainfallTimeSeries")
+    sources = []
+    for directory in directories:
+        store_path = series.get_store_path(directory)
+        sources.append(store_path if os.path.exists(store_path) else directory)
+    if rainfall_source == 'GEAR':
+        sources.append(gear_directory)
+    return sources
 
-    pe_output = extract(run.inputs.pe, run.outputs.pe)
 
+def make_forcing(run: Run):
     if rainfall_source == 'GEAR':
         gear.extract(run)
     else:
-        rain_output = extract(run.inputs.rain, run.outputs.rain)
-
-        unique_rain_ids_list = list(np.sort(rain_output[rain_output != -9999]).astype(str))
-
-        # calculate start and end line numbers
-        start_line_delta = datetime.strptime(run.start_date, "%Y-%m-%d") - datetime.strptime("01/01/1958", "%d/%m/%Y")
-        lines_to_skip = start_line_delta.days
-        lines_to_read_delta = datetime.strptime(run.end_date, "%Y-%m-%d") - datetime.strptime(run.start_date, "%Y-%m-%d")
-        lines_to_read = lines_to_read_delta.days  # this doesn't count the end date... i think this is what SHETRAN wants
-        # get time series for each id
-        all_grid_squares_time_series_list = []
+        unique_rain_ids_list = get_ids(run.outputs.rain)
         print(unique_rain_ids_list)
-        for i in range(len(unique_rain_ids_list)):
-            one_grid_square_time_series_list = [str(unique_rain_ids_list[i])]
-            time_series_id = int(unique_rain_ids_list[i])
-            # get numbers of the equivalent file
-            if time_series_id % 180 == 0:
-                x_coord = 180
-                y_coord = time_series_id / 180
-            else:
-                x_coord = time_series_id % 180
-                y_coord = int((time_series_id / 180) + 1)
-
-            rain_file = open(
-                "../Inputs/UKCP09RainfallTimeSeries/[" + str(x_coord) + "][" + str(y_coord) + "]RainfallTimeSeries.txt",
-                "r")
-
-            for a in range(lines_to_skip):
-                rain_file.readline()
-            for b in range(lines_to_read):
-                rain_val = rain_file.readline().rstrip()
-                one_grid_square_time_series_list.append(rain_val)
-
-            rain_file.close()
-            all_grid_squares_time_series_list.append(one_grid_square_time_series_list)
+        values = series.read("../Inputs/UKCP09RainfallTimeSeries", "Rainfall", unique_rain_ids_list,
+                             "1958-01-01", run.start_date, run.end_date)
 
         print("writing Rain time series data to file")
         with open(run.outputs.rain_timeseries, 'w') as f:
-            for c in range(len(all_grid_squares_time_series_list[0])):
-                line_list = []
-                for d in range(len(all_grid_squares_time_series_list)):
-                    line_list.append(str(all_grid_squares_time_series_list[d][c]))
-                line = ",".join(line_list)
-                if c == 0:
-                    f.write(line + "," + run.start_date + " to " + run.end_date + "\n")
-                else:
-                    f.write(line + "\n")
-
-    unique_p_e_ids_list = np.sort(pe_output[pe_output != -9999]).astype(str)
-
-    new_p_e_time_series = open(run.outputs.pe_timeseries, 'w')
-
-    # calculate start and end line numbers
-    start_line_delta = datetime.strptime(run.start_date, "%Y-%m-%d") - datetime.strptime("01/01/1960", "%d/%m/%Y")
-    lines_to_skip = start_line_delta.days
-    lines_to_read_delta = datetime.strptime(run.end_date, "%Y-%m-%d") - datetime.strptime(run.start_date, "%Y-%m-%d")
-    lines_to_read = lines_to_read_delta.days  # this doesn't count the end date... i think this is what SHETRAN wants
-    # get time series for each id
-    all_grid_squares_time_series_list = []
-    for i in range(len(unique_p_e_ids_list)):
-        one_grid_square_time_series_list = [str(unique_p_e_ids_list[i])]
-        time_series_id = int(unique_p_e_ids_list[i])
-        # get numbers of the equivalent file
-        if time_series_id % 180 == 0:
-            x_coord = 180
-            y_coord = time_series_id / 180
-        else:
-            x_coord = time_series_id % 180
-            y_coord = int((time_series_id / 180) + 1)
-
-        pe_file = open(
-            "../UKCP09PEBetterTimeSeries/[" + str(x_coord) + "][" + str(y_coord) + "]PEBetterTimeSeries.txt",
-            "r")
+            series.write(f, unique_rain_ids_list, values, run.start_date, run.end_date)
 
-        for a in range(lines_to_skip):
-            pe_file.readline()
-        for b in range(lines_to_read):
-            pe_val = pe_file.readline().rstrip()
-            one_grid_square_time_series_list.append(pe_val)
+    unique_p_e_ids_list = get_ids(run.outputs.pe)
 
-        pe_file.close()
-        all_grid_squares_time_series_list.append(one_grid_square_time_series_list)
+    values = series.read("../UKCP09PEBetterTimeSeries", "PEBetter", unique_p_e_ids_list,
+                         "1960-01-01", run.start_date, run.end_date)
 
-        # write to file
     print("writing PE time series data to file")
-    for c in range(len(all_grid_squares_time_series_list[0])):
-        line_list = []
-        for d in range(len(all_grid_squares_time_series_list)):
-            line_list.append(str(all_grid_squares_time_series_list[d][c]))
-        line = ",".join(line_list)
-        if c == 0:
-            new_p_e_time_series.write(line + "," + run.start_date + " to " + run.end_date + "\n")
-        else:
-            new_p_e_time_series.write(line + "\n")
+    with open(run.outputs.pe_timeseries, 'w') as f:
+        series.write(f, unique_p_e_ids_list, values, run.start_date, run.end_date)
 
-    new_p_e_time_series.close()
+    with open(run.outputs.max_temp_timeseries, 'w') as f:
+        get_temp(unique_p_e_ids_list, run.start_date, run.end_date, f, "Max")
+    with open(run.outputs.min_temp_timeseries, 'w') as f:
+        get_temp(unique_p_e_ids_list, run.start_date, run.end_date, f, "Min")
 
-    get_temp(unique_p_e_ids_list, run.start_date, run.end_date,
-             open(run.outputs.max_temp_timeseries, 'w'),
-             "Max")
-    get_temp(unique_p_e_ids_list, run.start_date, run.end_date,
-             open(run.outputs.min_temp_timeseries, "w"),
-             "Min")
-    # write time series data to file
 
-    # write library file
+program_files = ["../program", "../prepare-liz2.2.4a.exe", "../rdf.csv"]
 
-    make_lib_file(run)
-
-    # copy SHETRAN files over
 
+def copy_program(run: Run):
     print("Copying SHETRAN files over")
-    if not os.path.exists(directory + "/program"):
-        shutil.copytree("../program", directory + "/program")
-    if not os.path.exists(directory+"/prepare-liz2.2.4a.exe"):
-        shutil.copy("../prepare-liz2.2.4a.exe", directory + "/")
-    if not os.path.exists(directory+"/rdf.csv"):
-        shutil.copy("../rdf.csv", directory + "/")
-
-    # time.sleep(10)
-
-    # run SHETRAN prepare
-    # catch = raw_input(enter catch again)
-
-    # directory = os.getcwd()
-    # dirList = directory.split("\\")
-    # directory2 = "\\".join(dirList)
-    # print(catch)
-    # print(os.getcwd())
-    #
-    # new_directory = directory2 + "\\outputs\\" + catch
-    # if not os.path.exists(new_directory):
-    #     os.mkdir(new_directory)
-    # os.chdir(new_directory)
-    # print(os.getcwd())
-    # libFile = catch + "LibraryFile.xml"
-    # subprocess.call(["prepare-liz2.2.4a.exe", libFile])
+    for path in program_files:
+        destination = os.path.join(run.path, os.path.basename(path))
+        if os.path.isdir(path):
+            if os.path.exists(destination):
+                shutil.rmtree(destination)
+            shutil.copytree(path, destination)
+        else:
+            shutil.copy(path, destination)
+
+
+def get_stages(run: Run) -> list:
+    forcing = [run.outputs.pe_timeseries, run.outputs.max_temp_timeseries, run.outputs.min_temp_timeseries]
+    if rainfall_source != 'GEAR':
+        forcing.append(run.outputs.rain_timeseries)
+
+    return [
+        stages.Stage('mask', lambda: make_mask(run),
+                     inputs=[run.boundary if run.boundary is not None else run.inputs.mask],
+                     parameters=[run.resolution],
+                     outputs=[run.outputs.mask]),
+        stages.Stage('rasters', lambda: extract_rasters(run),
+                     inputs=[run.outputs.mask],
+                     parameters=[rainfall_source],
+                     sources=[in_file for in_file, _ in get_rasters(run)],
+                     outputs=[out_file for _, out_file in get_rasters(run)]),
+        stages.Stage('forcing', lambda: make_forcing(run),
+                     inputs=[run.outputs.mask, run.outputs.pe, run.outputs.rain],
+                     parameters=[run.start_date, run.end_date, rainfall_source],
+                     sources=get_series_sources(),
+                     outputs=forcing),
+        stages.Stage('library', lambda: make_lib_file(run),
+                     inputs=["code_key_uk_soil_four_layers.txt"],
+                     parameters=[run.gauge_id, run.start_date, run.end_date],
+                     outputs=[os.path.join(run.directory, "LibraryFile.xml")]),
+        stages.Stage('program', lambda: copy_program(run),
+                     inputs=program_files,
+                     outputs=[os.path.join(run.path, os.path.basename(path)) for path in program_files]),
+    ]
+
+
+def setup(run: Run) -> list:
+    """
+    Prepares the inputs for a run in run.path. Stages whose inputs and parameters are unchanged since the
+    directory was last set up are skipped, so create the Run with overwrite=False to update an existing setup.
+
+    :return: names of the stages that were run
+    """
+    directory = run.path
+    print("Creating directory...")
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+
+    return stages.run(get_stages(run), directory)
 
 
 def run_shetran(catch):
@@ -327,15 +243,19 @@ def get_observed_flows(run):
 
 
 def setup_catchment(run):
+    """
+    Sets up a run, fetches its observed flows and zips its directory to run.path with a .zip extension, e.g.
+    outputs/39001.zip, so that runs set up at the same time do not overwrite each other's zip file
+    """
     setup(run)
-    directory = "outputs/" + str(run.gauge_id)
-    if run.upload is None:
+    directory = run.path
+    if getattr(run, 'upload', None) is None:
         get_observed_flows(run)
     import zipfile
     print('writing zip file')
-    zf = zipfile.ZipFile('output.zip', 'w', zipfile.ZIP_DEFLATED)
-    print(os.path.exists('outputs/' + str(run.gauge_id)))
-    for root, dirs, files in os.walk('outputs/' + str(run.gauge_id)):
+    zf = zipfile.ZipFile(os.path.normpath(directory) + '.zip', 'w', zipfile.ZIP_DEFLATED)
+    print(os.path.exists(directory))
+    for root, dirs, files in os.walk(directory):
         for file in files:
             print(file)
             zf.write(os.path.join(root, file))
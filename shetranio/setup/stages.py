@@ -0,0 +1,128 @@
+import os
+import json
+import hashlib
+
+manifest_name = '.stages.json'
+
+
+class Manifest:
+    """Record of the input hashes each stage of a run was last completed with, kept in the run directory"""
+    def __init__(self, directory):
+        self.path = os.path.join(directory, manifest_name)
+        self.stages = {}
+        self.files = {}
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                manifest = json.load(f)
+            self.stages = manifest.get('stages', {})
+            self.files = manifest.get('files', {})
+
+    def save(self):
+        with open(self.path, 'w') as f:
+            json.dump({'stages': self.stages, 'files': self.files}, f, indent=1, sort_keys=True)
+
+    def get_file_digest(self, path: str) -> str:
+        """
+        Hashes the contents of a file, or of every file in a directory. The hash is remembered against the size
+        and modification time of the file so that large inputs are only read again when they change.
+        """
+        if path is None or not os.path.exists(path):
+            return None
+        if os.path.isdir(path):
+            digest = hashlib.sha1()
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    file_path = os.path.join(root, name)
+                    digest.update(os.path.relpath(file_path, path).encode())
+                    digest.update(self.get_file_digest(file_path).encode())
+            return digest.hexdigest()
+
+        key = os.path.abspath(path)
+        stat = os.stat(path)
+        signature = [stat.st_size, stat.st_mtime_ns]
+        if key in self.files and self.files[key][:2] == signature:
+            return self.files[key][2]
+
+        digest = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        self.files[key] = signature + [digest.hexdigest()]
+        return digest.hexdigest()
+
+    @staticmethod
+    def get_signature(path: str) -> str:
+        """
+        Hashes the path, size and modification time of a file, or of every file in a directory, without reading
+        them, for large inputs such as the national datasets that are shared between runs
+        """
+        if path is None or not os.path.exists(path):
+            return None
+        digest = hashlib.sha1()
+        paths = [path]
+        if os.path.isdir(path):
+            paths = []
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                paths.extend(os.path.join(root, name) for name in sorted(files))
+        for file_path in paths:
+            stat = os.stat(file_path)
+            digest.update('{}:{}:{}'.format(os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns).encode())
+        return digest.hexdigest()
+
+
+class Stage:
+    def __init__(self, name, function, inputs=(), parameters=(), outputs=(), sources=()):
+        """
+        :param name: name the stage is recorded under in the manifest
+        :param function: called with no arguments to carry out the stage
+        :param inputs: paths to files or directories the stage reads, compared by their contents
+        :param parameters: any other JSON serialisable values the outputs depend on
+        :param outputs: paths the stage creates, the stage is repeated if any are missing
+        :param sources: paths to large files or directories the stage reads that are shared between runs, e.g.
+            national datasets, compared by their path, size and modification time so they are never read to decide
+            whether to skip the stage
+        """
+        self.name = name
+        self.function = function
+        self.inputs = list(inputs)
+        self.parameters = list(parameters)
+        self.outputs = list(outputs)
+        self.sources = list(sources)
+
+    def get_digest(self, manifest: Manifest) -> str:
+        digest = hashlib.sha1()
+        digest.update(json.dumps(self.parameters, sort_keys=True, default=str).encode())
+        for path in self.inputs:
+            digest.update(str(manifest.get_file_digest(path)).encode())
+        for path in self.sources:
+            digest.update(str(manifest.get_signature(path)).encode())
+        return digest.hexdigest()
+
+    def is_current(self, manifest: Manifest, digest: str) -> bool:
+        return manifest.stages.get(self.name) == digest and all(os.path.exists(path) for path in self.outputs)
+
+
+def run(stages, directory) -> list:
+    """
+    Runs stages in order, skipping those whose inputs and parameters have not changed since they last completed.
+    Because the outputs of earlier stages are inputs to later ones, a stage that reruns only causes later stages
+    to rerun if its outputs actually change.
+
+    :return: names of the stages that were run
+    """
+    manifest = Manifest(directory)
+    completed = []
+    for stage in stages:
+        digest = stage.get_digest(manifest)
+        if stage.is_current(manifest, digest):
+            print('Skipping {}, nothing has changed'.format(stage.name))
+            continue
+        manifest.stages.pop(stage.name, None)
+        manifest.save()
+        stage.function()
+        manifest.stages[stage.name] = digest
+        manifest.save()
+        completed.append(stage.name)
+    return completed
@@ -0,0 +1,137 @@
+import os
+import secrets
+import numpy as np
+from multiprocessing import shared_memory
+
+# Arrays of Hdf that are shared, as the attribute they are read into and the dataset they are read from
+constants = {
+    'sv4_elevation': 'CATCHMENT_MAPS/SV4_elevation',
+    'sv4_numbering': 'CATCHMENT_SPREADSHEETS/SV4_numbering',
+    'centroid': 'CONSTANTS/centroid',
+    'grid_dxy': 'CONSTANTS/grid_dxy',
+    'number': 'CONSTANTS/number',
+    'r_span': 'CONSTANTS/r_span',
+    'soil_type': 'CONSTANTS/soil_typ',
+    'spatial1': 'CONSTANTS/spatial1',
+    'surface_elevation': 'CONSTANTS/surf_elv',
+    'vertical_thickness': 'CONSTANTS/vert_thk',
+}
+
+indices = ['element_numbers', 'land_elements', 'land_rows', 'land_cols', 'river_elements', 'elevations']
+
+
+def open_segment(name) -> shared_memory.SharedMemory:
+    """Attaches to an existing segment without making this process responsible for removing it"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+class SharedArrays:
+    """
+    Handle on arrays of an Hdf copied into named shared memory segments, see Hdf.share
+
+    The handle is small and can be passed to worker processes, which get the arrays without copying them with
+    attach, or open the file with Hdf(path, shared=handle). The process that created the segments should call
+    unlink once every worker has finished.
+    """
+    def __init__(self, path, specs, windows):
+        """
+        :param path: absolute path of the shegraph file the arrays were read from
+        :param specs: dict of array name to its segment name, shape and dtype, including the constants of the file
+        :param windows: dict of shared variable name to the index of its first and after its last timestep
+        """
+        self.path = path
+        self.specs = specs
+        self.windows = windows
+        self.segments = {}
+
+    @classmethod
+    def create(cls, path, arrays, windows):
+        """Copies a dict of arrays into new segments"""
+        prefix = 'shetranio_' + secrets.token_hex(6)
+        shared = cls(path, {}, windows)
+        try:
+            for i, (name, array) in enumerate(arrays.items()):
+                array = np.ascontiguousarray(array)
+                segment = shared_memory.SharedMemory(name='{}_{}'.format(prefix, i), create=True,
+                                                     size=max(array.nbytes, 1))
+                np.ndarray(array.shape, array.dtype, buffer=segment.buf)[...] = array
+                shared.specs[name] = (segment.name, array.shape, array.dtype.str)
+                shared.segments[name] = segment
+        except Exception:
+            shared.unlink()
+            raise
+        return shared
+
+    def __getstate__(self):
+        return {'path': self.path, 'specs': self.specs, 'windows': self.windows}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.segments = {}
+
+    def __getitem__(self, name) -> np.ndarray:
+        """A read-only array, attaching to its segment on first use"""
+        segment_name, shape, dtype = self.specs[name]
+        if name not in self.segments:
+            self.segments[name] = open_segment(segment_name)
+        array = np.ndarray(shape, np.dtype(dtype), buffer=self.segments[name].buf)
+        array.flags.writeable = False
+        return array
+
+    def __contains__(self, name):
+        return name in self.specs
+
+    def check(self, path, f):
+        """
+        Raises ValueError unless the arrays were shared from the file at path, open as the h5py File f, checking
+        its path and the shapes of its constants
+        """
+        if os.path.realpath(path) != os.path.realpath(self.path):
+            raise ValueError('The shared arrays are from {}, not {}'.format(self.path, path))
+        for name, dataset in constants.items():
+            if f[dataset].shape != tuple(self.specs[name][1]):
+                raise ValueError('The shared {} of {} has shape {}, but {} has shape {}'.format(
+                    name, self.path, tuple(self.specs[name][1]), path, f[dataset].shape))
+
+    def attach(self) -> dict:
+        """Every array, without copying"""
+        return {name: self[name] for name in self.specs}
+
+    def get_block(self, name):
+        """The index of the first timestep and the shared values of a variable, e.g. 'ph_depth'"""
+        return self.windows[name][0], self['variables/' + name]
+
+    def close(self):
+        """Detaches this process from the segments, arrays from them must no longer be used"""
+        for segment in self.segments.values():
+            segment.close()
+        self.segments = {}
+
+    def unlink(self):
+        """Removes the segments, to be called by the process that shared them when the workers have finished"""
+        for name, (segment_name, _, _) in self.specs.items():
+            segment = self.segments.pop(name, None) or open_segment(segment_name)
+            segment.close()
+            try:
+                segment.unlink()
+            except FileNotFoundError:
+                pass
+        self.close()
+
+
+def share(hdf, variables=(), start=None, end=None) -> SharedArrays:
+    """Copies the constants, element indices and optionally blocks of variables of hdf to shared memory"""
+    arrays = {name: hdf.file[dataset][:] for name, dataset in constants.items()}
+    for name in indices:
+        arrays[name] = getattr(hdf, name)
+    windows = {}
+    by_name = {variable.name: variable for variable in hdf.variables}
+    for name in variables:
+        variable = by_name[name]
+        window_start, window_end = variable.get_window(start, end)
+        arrays['variables/' + name] = variable.values[..., window_start:window_end]
+        windows[name] = (window_start, window_end)
+    return SharedArrays.create(os.path.abspath(hdf.path), arrays, windows)
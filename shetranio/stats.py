@@ -0,0 +1,157 @@
+import time
+import logging
+import threading
+import functools
+import pandas as pd
+
+logger = logging.getLogger('shetranio')
+
+
+class Record:
+    def __init__(self, variable, method):
+        self.variable = variable
+        self.method = method
+        self.calls = 0
+        self.reads = 0
+        self.bytes = 0
+        self.elements = 0
+        self.seconds = 0.0
+        self.cumulative_reads = 0
+        self.cumulative_bytes = 0
+        self.cumulative_elements = 0
+
+    def to_dict(self):
+        return {'variable': self.variable, 'method': self.method, 'calls': self.calls, 'reads': self.reads,
+                'bytes': self.bytes, 'elements': self.elements, 'seconds': self.seconds,
+                'cumulative_reads': self.cumulative_reads, 'cumulative_bytes': self.cumulative_bytes,
+                'cumulative_elements': self.cumulative_elements}
+
+
+class Stats:
+    """
+    Counts of HDF5 reads, bytes and elements read and wall time, per public method and variable
+
+    Each read is counted once, against the variable of the dataset read and the innermost method being called, so
+    reads, bytes and elements can be summed over any grouping. A read made by to_grid through get_time is counted
+    under get_time only. The cumulative columns count every read made while a method was running, including those
+    of the methods it called, and so should not be summed. Reads made directly through Variable.values rather than
+    a method are recorded with an empty method name.
+    """
+    def __init__(self, callback=None, log=False):
+        """
+        :param callback: called with a dict of the counts for each completed method call
+        :param log: also log each completed method call to the shetranio logger at debug level
+        """
+        self.callback = callback
+        self.log = log
+        self.records = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def get_record(self, variable, method) -> Record:
+        key = (variable, method)
+        if key not in self.records:
+            with self.lock:
+                self.records.setdefault(key, Record(variable, method))
+        return self.records[key]
+
+    @property
+    def stack(self) -> list:
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+        return self.local.stack
+
+    def start(self, variable, method):
+        call = Record(variable, method)
+        call.calls = 1
+        call.start = time.perf_counter()
+        self.stack.append(call)
+
+    def stop(self):
+        call = self.stack.pop()
+        call.seconds = time.perf_counter() - call.start
+        record = self.get_record(call.variable, call.method)
+        with self.lock:
+            record.calls += 1
+            record.seconds += call.seconds
+            record.cumulative_reads += call.cumulative_reads
+            record.cumulative_bytes += call.cumulative_bytes
+            record.cumulative_elements += call.cumulative_elements
+        if self.callback is not None:
+            self.callback(call.to_dict())
+        if self.log:
+            logger.debug('%s.%s took %.6f s reading %d bytes in %d reads', call.variable, call.method,
+                         call.seconds, call.cumulative_bytes, call.cumulative_reads)
+
+    def add_read(self, variable, array, seconds):
+        size = getattr(array, 'size', 1)
+        nbytes = getattr(array, 'nbytes', 0)
+        stack = self.stack
+        record = self.get_record(variable, stack[-1].method if stack else '')
+        with self.lock:
+            record.reads += 1
+            record.bytes += nbytes
+            record.elements += size
+            if not stack:
+                record.seconds += seconds
+        if stack:
+            stack[-1].reads += 1
+            stack[-1].bytes += nbytes
+            stack[-1].elements += size
+        for call in stack:
+            call.cumulative_reads += 1
+            call.cumulative_bytes += nbytes
+            call.cumulative_elements += size
+
+    def reset(self):
+        with self.lock:
+            self.records = {}
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """Counts with a row per variable and method"""
+        columns = ['variable', 'method', 'calls', 'reads', 'bytes', 'elements', 'seconds', 'cumulative_reads',
+                   'cumulative_bytes', 'cumulative_elements']
+        return pd.DataFrame([record.to_dict() for record in self.records.values()], columns=columns)
+
+    def by_variable(self) -> pd.DataFrame:
+        """Counts summed for each variable, without the cumulative columns which would count reads twice"""
+        return self.to_dataframe().groupby('variable')[['calls', 'reads', 'bytes', 'elements', 'seconds']].sum()
+
+    def by_method(self) -> pd.DataFrame:
+        """Counts summed for each method, without the cumulative columns which would count reads twice"""
+        return self.to_dataframe().groupby('method')[['calls', 'reads', 'bytes', 'elements', 'seconds']].sum()
+
+
+class InstrumentedDataset:
+    """Wraps an h5py dataset to record every read in stats"""
+    def __init__(self, dataset, variable, stats: Stats):
+        self.dataset = dataset
+        self.variable = variable
+        self.stats = stats
+
+    def __getitem__(self, item):
+        start = time.perf_counter()
+        array = self.dataset[item]
+        self.stats.add_read(self.variable, array, time.perf_counter() - start)
+        return array
+
+    def __getattr__(self, name):
+        return getattr(self.dataset, name)
+
+    def __len__(self):
+        return len(self.dataset)
+
+
+def instrumented(method):
+    """Records calls to a method of Variable or Hdf when the Hdf they belong to has stats enabled"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        hdf = getattr(self, 'hdf', self)
+        if hdf.stats is None:
+            return method(self, *args, **kwargs)
+        hdf.stats.start(getattr(self, 'name', 'hdf'), method.__name__)
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            hdf.stats.stop()
+    return wrapper
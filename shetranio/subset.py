@@ -0,0 +1,41 @@
+import h5py
+import numpy as np
+from .diff import copy_structure, create_like, get_fill_value
+
+
+def get_masks(hdf, elements):
+    """Boolean masks of the selected river links and land squares, as rows of river variables and on the grid"""
+    elements = np.asarray(elements)
+    rows = hdf.overland_flow.values.shape[0] if hdf.overland_flow is not None else len(hdf.river_elements)
+    rivers = np.isin(np.arange(1, rows + 1), elements)
+    land = np.isin(hdf.number.square, elements)
+    return rivers, land
+
+
+def subset(hdf, path, variables=None, elements=None, start=None, end=None):
+    """
+    Writes part of a shegraph file to a new file, see Hdf.subset
+    """
+    names = {variable.name: variable for variable in hdf.variables}
+    if variables is not None:
+        missing = set(variables) - set(names)
+        if missing:
+            raise KeyError('{} are not variables of {}'.format(', '.join(sorted(missing)), hdf.path))
+        names = {name: variable for name, variable in names.items() if name in variables}
+    if elements is not None:
+        rivers, land = get_masks(hdf, elements)
+
+    with h5py.File(path, 'w') as f:
+        group = copy_structure(hdf, f)
+        for variable in names.values():
+            window_start, window_end = variable.get_window(start, end)
+            masked = elements is not None and variable.is_spatial
+            fill = get_fill_value(variable.values.dtype) if masked else None
+            values = create_like(group, variable, window_start, window_end, fill)
+            for block_start, block in variable.iter_values(window_start, window_end):
+                if masked:
+                    mask = rivers if variable.is_river else land
+                    mask = mask.reshape(mask.shape + (1,) * (block.ndim - mask.ndim))
+                    block = np.where(mask, block, fill)
+                values[..., block_start - window_start:block_start - window_start + block.shape[-1]] = block
+    return path
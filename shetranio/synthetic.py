@@ -0,0 +1,312 @@
+"""
+Generates structurally valid SHETRAN outputs and setup inputs of any size for testing and benchmarking.
+Values are random but respect the layout, numbering and no data conventions of real files.
+"""
+import os
+from datetime import datetime, timedelta
+import numpy as np
+import h5py
+
+land_variables = ['pot_evap', 'trnsp', 'srf_evap', 'int_evap', 'drainage', 'can_stor', 'v_flow', 'snow_dep',
+                  'ph_depth', 'psi', 'bal_err']
+
+units = {
+    'net_rain': 'mm/hour', 'pot_evap': 'mm/hour', 'trnsp': 'mm/hour', 'srf_evap': 'mm/hour', 'int_evap': 'mm/hour',
+    'drainage': 'mm/hour', 'can_stor': 'mm', 'v_flow': 'm/s', 'snow_dep': 'm', 'ph_depth': 'm', 'psi': 'm',
+    'bal_err': '%', 'ovr_flow': 'm3/s', 'srf_dep': 'm', 'theta': 'm3/m3'
+}
+
+
+class Layout:
+    """Element numbering of a rectangular catchment with river links along the east faces of its squares"""
+    def __init__(self, rows, cols, links, magnification=4):
+        assert links <= rows * cols, 'There can be at most one link per grid square'
+        self.rows = rows
+        self.cols = cols
+        self.links = links
+        self.magnification = magnification
+        self.shape = (rows + 2, cols + 2)
+
+        self.number = np.full(self.shape + (9,), -1, dtype=np.int32)
+
+        # Squares are numbered row by row from the bottom after the links, as SHETRAN does
+        squares = np.arange(rows * cols, dtype=np.int32).reshape(rows, cols)[::-1] + links + 1
+        self.number[1:-1, 1:-1, 0] = squares
+
+        # Link k runs along the east face of the kth square, shared with the west face of its neighbour
+        self.link_rows, self.link_cols = np.unravel_index(np.arange(links), (rows, cols))
+        self.link_rows = self.link_rows + 1
+        self.link_cols = self.link_cols + 1
+        self.number[self.link_rows, self.link_cols, 6] = np.arange(1, links + 1)
+        self.number[self.link_rows, self.link_cols + 1, 8] = np.arange(1, links + 1)
+
+    @property
+    def land(self):
+        return self.number[:, :, 0] != -1
+
+    def get_sv4_numbering(self):
+        m = self.magnification
+        numbering = np.repeat(np.repeat(np.maximum(self.number[:, :, 0], 0), m, axis=0), m, axis=1)
+        width = max(1, m // 4)
+        for k, (row, col) in enumerate(zip(self.link_rows, self.link_cols)):
+            numbering[row * m:(row + 1) * m, (col + 1) * m - width:(col + 1) * m] = k + 1
+        return numbering
+
+
+def set_units(dataset, value):
+    dataset.attrs['units'] = np.array([value.encode()], dtype='S8')
+
+
+def write_variable(group, index, name, shape, dtype, times, generate, scope=None, block=256):
+    """Creates a variable with one chunk per timestep, like SHETRAN, and fills it block by block along time"""
+    variable = group.create_group('{:>3} {}'.format(index, name))
+    values = variable.create_dataset('value', shape=shape + (len(times),), dtype=dtype,
+                                     chunks=shape + (1,), compression='gzip')
+    set_units(values, units.get(name, '-'))
+    if scope is not None:
+        values.attrs['scope'] = np.array([scope.encode()], dtype='S7')
+    for start in range(0, len(times), block):
+        end = min(start + block, len(times))
+        values[..., start:end] = generate(end - start)
+    time = variable.create_dataset('time', data=times.astype(np.float32), chunks=(1,), compression='gzip')
+    set_units(time, 'hours')
+
+
+def write_shegraph(path, rows=20, cols=30, links=100, layers=5, timesteps=365, land_timesteps=None,
+                   interval=24, magnification=4, cell_size=1000, x_lower_left=0, y_lower_left=0,
+                   variables=None, contaminants=False, seed=0):
+    """
+    Writes a shegraph HDF5 file with the groups, constants and variables that Hdf reads
+
+    :param path: file to create
+    :param rows: number of rows of grid squares in the catchment
+    :param cols: number of columns of grid squares in the catchment
+    :param links: number of river links, numbered before the squares
+    :param layers: number of soil layers for theta and the layered constants
+    :param timesteps: number of timesteps of the river and rain variables
+    :param land_timesteps: number of timesteps of the land variables, defaults to timesteps
+    :param interval: hours between timesteps, land variables cover the same period as river variables
+    :param magnification: size in SV4_numbering cells of each grid square
+    :param variables: short names of the land variables to include, defaults to all of them
+    :param contaminants: also write land and river contaminant concentrations
+    :return: the Layout of the catchment
+    """
+    random = np.random.default_rng(seed)
+    layout = Layout(rows, cols, links, magnification)
+    land = layout.land
+    land_timesteps = timesteps if land_timesteps is None else land_timesteps
+    river_times = np.arange(timesteps) * float(interval)
+    land_times = np.linspace(0, river_times[-1] if timesteps else 0, land_timesteps)
+    variables = land_variables if variables is None else variables
+
+    elevation = np.full(layout.shape + (9,), -1, dtype=np.float32)
+    elevation[:, :, 0][land] = 100 + 400 * random.random(land.sum())
+    elevation[layout.link_rows, layout.link_cols, 6] = elevation[layout.link_rows, layout.link_cols, 0] - 2
+    elevation[layout.link_rows, layout.link_cols + 1, 8] = elevation[layout.link_rows, layout.link_cols, 0] - 2
+
+    def by_element(value, extra=(), dtype=np.float32):
+        array = np.full(layout.shape + (9,) + extra, -1, dtype=dtype)
+        array[layout.number != -1] = value
+        return array
+
+    def on_land(generate):
+        def land_block(n):
+            block = np.full(layout.shape + (n,), -1, dtype=np.float32)
+            block[land] = generate((land.sum(), n))
+            return block
+        return land_block
+
+    with h5py.File(path, 'w') as f:
+        sv4_numbering = layout.get_sv4_numbering()
+        maps = f.create_group('CATCHMENT_MAPS')
+        sv4_elevation = np.repeat(np.repeat(np.maximum(elevation[:, :, 0], 0), magnification, axis=0),
+                                  magnification, axis=1).astype(np.int32)
+        maps.create_dataset('SV4_elevation', data=sv4_elevation)
+        maps.create_dataset('palette1', data=np.zeros((256, 3), dtype=np.uint8))
+        f.create_group('CATCHMENT_SPREADSHEETS').create_dataset('SV4_numbering', data=sv4_numbering,
+                                                               compression='gzip')
+
+        constants = f.create_group('CONSTANTS')
+        centroid = np.full(layout.shape + (9, 2), -1, dtype=np.float32)
+        y, x = np.indices(layout.shape)
+        centroid[:, :, 0, 0] = x_lower_left + (x - 0.5) * cell_size
+        centroid[:, :, 0, 1] = y_lower_left + (rows - y + 0.5) * cell_size
+        constants.create_dataset('centroid', data=centroid, compression='gzip')
+        grid_dxy = np.full(layout.shape + (2,), -1, dtype=np.float32)
+        grid_dxy[land] = cell_size
+        constants.create_dataset('grid_dxy', data=grid_dxy, compression='gzip')
+        constants.create_dataset('number', data=layout.number, compression='gzip')
+        constants.create_dataset('r_span', data=by_element(cell_size, (4,)), compression='gzip')
+        soil_type = np.full(layout.shape + (9, 35), -1, dtype=np.int32)
+        soil_type[:, :, 0, :layers][land] = 1
+        constants.create_dataset('soil_typ', data=soil_type, compression='gzip')
+        constants.create_dataset('spatial1', data=by_element(1), compression='gzip')
+        constants.create_dataset('surf_elv', data=elevation, compression='gzip')
+        vertical_thickness = np.full(layout.shape + (9, 35), -1, dtype=np.float32)
+        vertical_thickness[:, :, 0, :layers][land] = np.geomspace(0.05, 2, layers)
+        constants.create_dataset('vert_thk', data=vertical_thickness, compression='gzip')
+
+        group = f.create_group('VARIABLES')
+        index = 1
+        write_variable(group, index, 'net_rain', (1,), np.float32, river_times,
+                       lambda n: random.exponential(0.1, (1, n)) * (random.random((1, n)) > 0.6))
+        index += 1
+        if 'ph_depth' in variables:
+            write_variable(group, index, 'ph_depth', layout.shape, np.float32, land_times,
+                           on_land(lambda shape: random.random(shape) * 3), scope='squares')
+            index += 1
+        write_variable(group, index, 'theta', layout.shape + (layers,), np.float32, land_times,
+                       lambda n: np.where(land[:, :, None, None],
+                                          0.2 + 0.3 * random.random(layout.shape + (layers, n)), -1),
+                       scope='squares')
+        index += 1
+        write_variable(group, index, 'ovr_flow', (links, 4), np.float32, river_times,
+                       lambda n: random.normal(0, 5, (links, 4, n)), scope='rivers')
+        index += 1
+        write_variable(group, index, 'srf_dep', (links,), np.float32, river_times,
+                       lambda n: random.random((links, n)), scope='rivers')
+        index += 1
+        for name in variables:
+            if name == 'ph_depth':
+                continue
+            write_variable(group, index, name, layout.shape, np.float32, land_times,
+                           on_land(lambda shape: random.random(shape)), scope='squares')
+            index += 1
+        if contaminants:
+            write_variable(group, index, 'c_c_dr', layout.shape + (layers,), np.float32, land_times,
+                           lambda n: np.where(land[:, :, None, None],
+                                              random.random(layout.shape + (layers, n)), -1),
+                           scope='squares')
+            index += 1
+            write_variable(group, index, 'c_c_dr', (links, 4), np.float32, river_times,
+                           lambda n: random.random((links, 4, n)), scope='rivers')
+
+    return layout
+
+
+def write_dem(path, layout: Layout, cell_size=1000, x_lower_left=0, y_lower_left=0, elevation=None):
+    """Writes the DEM of a catchment as an ASCII grid, without the border SHETRAN adds"""
+    from .setup.raster import Header, write_ascii
+    if elevation is None:
+        elevation = np.full((layout.rows, layout.cols), 100.0)
+    write_ascii(path, elevation, Header(layout.cols, layout.rows, x_lower_left, y_lower_left, cell_size, -9999))
+
+
+def write_library(path, name, start_date=datetime(2000, 1, 1), end_date=None):
+    end_date = start_date + timedelta(days=365) if end_date is None else end_date
+    with open(path, 'w') as f:
+        f.write('<?xml version="1.0"?><ShetranInput>\n')
+        f.write('<ProjectFile>{}ProjectFile</ProjectFile>\n'.format(name))
+        f.write('<CatchmentName>{}</CatchmentName>\n'.format(name))
+        f.write('<DEMMeanFileName>{}_Dem.txt</DEMMeanFileName>\n'.format(name))
+        f.write('<MaskFileName>{}_Mask.txt</MaskFileName>\n'.format(name))
+        for prefix, date in [('Start', start_date), ('End', end_date)]:
+            f.write('<{0}Day>{1:02d}</{0}Day>\n'.format(prefix, date.day))
+            f.write('<{0}Month>{1:02d}</{0}Month>\n'.format(prefix, date.month))
+            f.write('<{0}Year>{1}</{0}Year>\n'.format(prefix, date.year))
+        f.write('</ShetranInput>\n')
+
+
+def write_catchment(directory, name='synthetic', rows=20, cols=30, links=100, layers=5, timesteps=365,
+                    land_timesteps=None, interval=24, cell_size=1000, x_lower_left=0, y_lower_left=0,
+                    start_date=datetime(2000, 1, 1), **kwargs) -> str:
+    """
+    Writes a shegraph file with a matching DEM and library file that can be opened with Model
+
+    Further keyword arguments are passed to write_shegraph
+    :return: path to the library file
+    """
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    layout = write_shegraph(os.path.join(directory, 'output_{}_shegraph.h5'.format(name)), rows, cols, links,
+                            layers, timesteps, land_timesteps, interval, cell_size=cell_size,
+                            x_lower_left=x_lower_left, y_lower_left=y_lower_left, **kwargs)
+    with h5py.File(os.path.join(directory, 'output_{}_shegraph.h5'.format(name)), 'r') as f:
+        elevation = f['CONSTANTS']['surf_elv'][1:-1, 1:-1, 0]
+    write_dem(os.path.join(directory, '{}_Dem.txt'.format(name)), layout, cell_size, x_lower_left, y_lower_left,
+              elevation)
+    library = os.path.join(directory, '{}_Library_File.xml'.format(name))
+    write_library(library, name, start_date, start_date + timedelta(hours=interval * max(timesteps - 1, 1)))
+    return library
+
+
+def write_grid(path, rows, cols, cell_size, generate, x_lower_left=0, y_lower_left=0, no_data=-9999, block=1000):
+    """
+    Writes a large ASCII grid block by block without holding it in memory
+
+    :param generate: called with the first row and number of rows of a block, returns the values of that block
+    """
+    with open(path, 'w') as f:
+        f.write('ncols        {}\n'.format(cols))
+        f.write('nrows        {}\n'.format(rows))
+        f.write('xllcorner    {!r}\n'.format(float(x_lower_left)))
+        f.write('yllcorner    {!r}\n'.format(float(y_lower_left)))
+        f.write('cellsize     {!r}\n'.format(float(cell_size)))
+        f.write('NODATA_value  {}\n'.format(no_data))
+        for start in range(0, rows, block):
+            values = generate(start, min(block, rows - start))
+            np.savetxt(f, values, fmt='%d' if np.issubdtype(values.dtype, np.integer) else '%.6g')
+
+
+def write_national_inputs(directory, resolution='1km', rows=1300, cols=700, gauges=(1,), mask_size=20, seed=0):
+    """
+    Writes the national grids and masks that Run expects to find under directory, named as Inputs names them
+
+    :param directory: folder standing in for ../Inputs
+    :param resolution: one of '1km', '500m' or '100m'
+    :param rows: rows of the national grids
+    :param cols: columns of the national grids
+    :param gauges: gauge ids to write square masks for
+    :param mask_size: width and height of each mask in cells
+    """
+    cell_size = {'1km': 1000, '500m': 500, '100m': 100}[resolution]
+    random = np.random.default_rng(seed)
+    maps = os.path.join(directory, '{}BngMaps'.format(resolution))
+    masks = os.path.join(directory, '{}BngMasks'.format(resolution))
+    for folder in [maps, masks, os.path.join(directory, '1kmBngMaps')]:
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+
+    def uniform(low, high, dtype=float):
+        return lambda start, n: (low + (high - low) * random.random((n, cols))).astype(dtype)
+
+    def ukcp09_ids(start, n):
+        y, x = np.indices((n, cols))
+        y = rows - 1 - (y + start)
+        return ((y * cell_size // 5000) * 180 + (x * cell_size // 5000) + 1).astype(int)
+
+    grids = {'DtmBng': uniform(0, 900), 'MinDtmBng': uniform(0, 800), 'SoilBng': uniform(1, 30, int),
+             'LcmBng': uniform(1, 8, int), 'PeRainBng': ukcp09_ids}
+    for suffix, generate in grids.items():
+        write_grid(os.path.join(maps, '{}{}.txt'.format(resolution, suffix)), rows, cols, cell_size, generate)
+    write_grid(os.path.join(directory, '1kmBngMaps', 'lakes1kmBNG.txt'), rows * cell_size // 1000,
+               cols * cell_size // 1000, 1000, lambda start, n: np.zeros((n, cols * cell_size // 1000), dtype=int))
+
+    from .setup.raster import Header, write_ascii
+    for i, gauge in enumerate(gauges):
+        row = (i * mask_size) % max(rows - mask_size, 1)
+        values = np.where(random.random((mask_size, mask_size)) > 0.2, 1, -9999)
+        write_ascii(os.path.join(masks, '{}.txt'.format(gauge)), values,
+                    Header(mask_size, mask_size, (i * mask_size) % max(cols - mask_size, 1) * cell_size,
+                           row * cell_size, cell_size, -9999))
+
+
+def write_forcing(path, variable='rainfall_amount', x_min=0, y_min=0, cols=700, rows=1300, cell_size=1000,
+                  start_date=datetime(2000, 1, 1), days=365, seed=0):
+    """Writes a daily gridded netCDF file laid out like CEH GEAR rainfall or CHESS PET, which needs netCDF4"""
+    import netCDF4 as nc
+    random = np.random.default_rng(seed)
+    with nc.Dataset(path, 'w') as ds:
+        ds.createDimension('time', days)
+        ds.createDimension('y', rows)
+        ds.createDimension('x', cols)
+        time = ds.createVariable('time', 'f8', ('time',))
+        time.units = 'days since {:%Y-%m-%d}'.format(start_date)
+        time.calendar = 'gregorian'
+        time[:] = np.arange(days)
+        ds.createVariable('x', 'f8', ('x',))[:] = x_min + np.arange(cols) * cell_size
+        ds.createVariable('y', 'f8', ('y',))[:] = y_min + np.arange(rows)[::-1] * cell_size
+        values = ds.createVariable(variable, 'f4', ('time', 'y', 'x'), zlib=True, chunksizes=(1, rows, cols),
+                                   fill_value=-99999.)
+        for day in range(days):
+            values[day] = random.exponential(2, (rows, cols))
@@ -0,0 +1,62 @@
+from shetranio.hdf import Hdf
+from shetranio.aio import Coalescer
+import numpy as np
+import threading
+import asyncio
+import unittest
+import os
+
+sample_data = os.path.join(os.path.dirname(__file__), 'sample_data')
+
+
+def path(s):
+    return os.path.join(sample_data, s)
+
+
+class TestAio(unittest.TestCase):
+
+    def test_coalesce(self):
+        hdf = Hdf(path('output_Wansbeck_at_Mitford_shegraph.h5'))
+        stats = hdf.instrument()
+
+        async def main():
+            return await asyncio.gather(*[hdf.overland_flow.aget_time(-1) for _ in range(10)],
+                                        hdf.overland_flow.aget_element(3),
+                                        hdf.water_table_elevation.aget_time(2))
+
+        results = asyncio.run(main())
+        hdf.uninstrument()
+        for result in results[:10]:
+            np.testing.assert_array_equal(result, hdf.overland_flow.get_time(-1))
+        np.testing.assert_array_equal(results[10].values, hdf.overland_flow.get_element(3).values)
+        np.testing.assert_array_equal(results[11], hdf.water_table_elevation.get_time(2))
+        table = stats.to_dataframe().set_index(['variable', 'method'])
+        self.assertEqual(table.loc[('ovr_flow', 'get_time'), 'calls'], 1)
+        self.assertEqual(hdf.coalescer.pending, {})
+        hdf.close()
+
+    def test_cancel(self):
+        coalescer = Coalescer(workers=1)
+        release = threading.Event()
+
+        async def main():
+            blocking = asyncio.ensure_future(coalescer.run(('block',), release.wait))
+            shared = [asyncio.ensure_future(coalescer.run(('value',), lambda: 'value')) for _ in range(2)]
+            queued = asyncio.ensure_future(coalescer.run(('queued',), lambda: 'queued'))
+            await asyncio.sleep(0.05)
+            self.assertEqual(len(coalescer.pending), 3)
+
+            queued.cancel()
+            shared[0].cancel()
+            await asyncio.sleep(0.05)
+            self.assertNotIn((id(asyncio.get_running_loop()), 'queued'), coalescer.pending)
+            release.set()
+            self.assertEqual(await shared[1], 'value')
+            self.assertTrue(await blocking)
+            for task in [queued, shared[0]]:
+                with self.assertRaises(asyncio.CancelledError):
+                    await task
+
+        asyncio.run(main())
+        self.assertEqual(coalescer.pending, {})
+        coalescer.shutdown()
@@ -0,0 +1,57 @@
+from unittest import mock
+import multiprocessing
+import unittest
+import tempfile
+import zipfile
+import os
+
+try:
+    from shetranio.setup import batch
+    from shetranio.setup.run import Run
+except ImportError:
+    batch = None
+
+
+def fail_on_second(run):
+    if run.gauge_id == 2:
+        raise ValueError('no mask for gauge 2')
+    with open(run.outputs.mask, 'w') as f:
+        f.write(str(run.gauge_id))
+
+
+@unittest.skipIf(batch is None, 'gdal or netCDF4 is not installed')
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.runs = [Run('1km', '2000-01-01', '2000-12-31', gauge_id=i, path=os.path.join(self.directory.name, str(i)))
+                     for i in range(1, 5)]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def check(self, results):
+        self.assertEqual([result.run.gauge_id for result in results], [1, 2, 3, 4])
+        self.assertEqual([result.succeeded for result in results], [True, False, True, True])
+        self.assertIn('no mask for gauge 2', results[1].error)
+        for run in [self.runs[0]] + self.runs[2:]:
+            with open(run.outputs.mask) as f:
+                self.assertEqual(f.read(), str(run.gauge_id))
+
+    def test_failure_isolated(self):
+        with mock.patch.object(batch.setup_module, 'setup', fail_on_second):
+            self.check(batch.setup_many(self.runs, workers=1))
+
+    @unittest.skipIf(multiprocessing.get_start_method() != 'fork', 'workers do not inherit the patched setup')
+    def test_failure_isolated_in_pool(self):
+        with mock.patch.object(batch.setup_module, 'setup', fail_on_second):
+            self.check(batch.setup_many(self.runs, workers=2))
+
+    def test_catchment_zip(self):
+        with mock.patch.object(batch.setup_module, 'setup', fail_on_second):
+            results = batch.setup_many(self.runs, workers=1, catchment=True)
+        self.assertFalse(results[1].succeeded)
+        for run in [self.runs[0]] + self.runs[2:]:
+            with zipfile.ZipFile(run.path + '.zip') as f:
+                self.assertIn(run.outputs.mask.lstrip(os.sep), f.namelist())
+        self.assertFalse(os.path.exists(self.runs[1].path + '.zip'))
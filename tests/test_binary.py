@@ -0,0 +1,40 @@
+from shetranio.hdf import Hdf
+from shetranio import binary
+import numpy as np
+import unittest
+import io
+import os
+
+sample_data = os.path.join(os.path.dirname(__file__), 'sample_data')
+
+
+def path(s):
+    return os.path.join(sample_data, s)
+
+
+class TestBinary(unittest.TestCase):
+
+    def test_write_values(self):
+        hdf = Hdf(path('output_Wansbeck_at_Mitford_shegraph.h5'), memory_budget=100000)
+        f = io.BytesIO()
+        index = binary.write_values(hdf, f)
+        data = f.getvalue()
+        features = len(hdf.element_numbers)
+
+        self.assertEqual([v['name'] for v in index], ['ph_depth', 'overland_flow', 'canopy_storage',
+                                                       'surface_depth', 'theta'])
+        ph_depth, overland_flow = index[0], index[1]
+        self.assertEqual(len(ph_depth['offsets']), hdf.ph_depth.size)
+        self.assertEqual(len(data), index[-1]['offsets'][-1] + features * 4)
+
+        def frame(offset):
+            return np.frombuffer(data[offset:offset + features * 4], dtype='<f4')
+
+        values = frame(overland_flow['offsets'][5])
+        np.testing.assert_array_equal(values[:len(hdf.overland_flow.get_time(5))], hdf.overland_flow.get_time(5))
+        self.assertTrue(np.isnan(values[len(hdf.overland_flow.get_time(5)):]).all())
+
+        values = frame(ph_depth['offsets'][3])
+        land = np.isin(hdf.element_numbers, hdf.land_elements)
+        np.testing.assert_array_equal(values[land], hdf.ph_depth.get_time(3).astype('f4'))
+        self.assertAlmostEqual(ph_depth['max'], np.nanmax(hdf.ph_depth.to_grid(slice(None))), 5)
@@ -0,0 +1,47 @@
+from shetranio.hdf import Hdf
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import unittest
+import os
+
+sample_data = os.path.join(os.path.dirname(__file__), 'sample_data')
+
+
+def path(s):
+    return os.path.join(sample_data, s)
+
+
+class TestConcurrency(unittest.TestCase):
+
+    def test_stress(self):
+        expected = Hdf(path('output_Wansbeck_at_Mitford_shegraph.h5'))
+        hdf = Hdf(path('output_Wansbeck_at_Mitford_shegraph.h5'), concurrent=True, memory_budget=100000)
+        stats = hdf.instrument()
+
+        names = ['overland_flow', 'surface_depth', 'ph_depth', 'canopy_storage', 'soil_moisture',
+                 'water_table_elevation']
+        tasks = []
+        for i in range(400):
+            name = names[i % len(names)]
+            variable = getattr(expected, name)
+            if i % 2:
+                elements = expected.river_elements if variable.is_river else expected.land_elements
+                tasks.append((name, 'get_element', int(elements[i % len(elements)])))
+            else:
+                tasks.append((name, 'get_time', i % variable.size))
+
+        def read(task):
+            name, method, argument = task
+            result = getattr(getattr(hdf, name), method)(argument)
+            return np.asarray(result, dtype=float)
+
+        with ThreadPoolExecutor(16) as executor:
+            results = list(executor.map(read, tasks))
+
+        for (name, method, argument), result in zip(tasks, results):
+            np.testing.assert_array_equal(result, np.asarray(getattr(getattr(expected, name), method)(argument),
+                                                             dtype=float), err_msg=name)
+
+        self.assertGreater(len(hdf.handles.files), 1)
+        self.assertEqual(stats.to_dataframe().calls.sum(), len(tasks))
+        hdf.close()
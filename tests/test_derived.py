@@ -0,0 +1,96 @@
+from shetranio.hdf import Hdf
+from shetranio.derived import get_sidecar_path
+import numpy as np
+import pandas as pd
+import asyncio
+import unittest
+import tempfile
+import shutil
+import os
+
+sample_data = os.path.join(os.path.dirname(__file__), 'sample_data')
+
+
+def path(s):
+    return os.path.join(sample_data, s)
+
+
+class TestDerived(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.hdf = Hdf(path('output_Wansbeck_at_Mitford_shegraph.h5'))
+
+    def test_water_table_elevation(self):
+        hdf = self.hdf
+        element = hdf.land_elements[20]
+        row, col = np.argwhere(hdf.number.square == element)[0]
+        ph_depth = hdf.ph_depth.get_element(element).values
+        expected = np.where(ph_depth == -1, np.nan, hdf.surface_elevation.square[row, col] - ph_depth)
+        np.testing.assert_allclose(hdf.water_table_elevation.get_element(element).values, expected)
+        np.testing.assert_allclose(hdf.water_table_elevation.get_time(5)[20], expected[5])
+
+    def test_total_evaporation(self):
+        hdf = self.hdf
+        expected = np.nansum([hdf.transpiration.get_time(3), hdf.surface_evaporation.get_time(3),
+                              hdf.evaporation_from_interception.get_time(3)], axis=0)
+        np.testing.assert_allclose(hdf.total_evaporation.get_time(3), expected)
+
+    def test_windows(self):
+        hdf = self.hdf
+        window = hdf.water_table_elevation.get_time(start=2, end=6)
+        self.assertEqual(window.shape, (len(hdf.land_elements), 4))
+        np.testing.assert_allclose(window[:, 1], hdf.water_table_elevation.get_time(3))
+        hours = hdf.ph_depth.time_values[:]
+        np.testing.assert_allclose(hdf.water_table_elevation.get_time(start=pd.Timedelta(hours=hours[2]),
+                                                                      end=pd.Timedelta(hours=hours[5])), window)
+        np.testing.assert_array_equal(hdf.discharge.get_time(start=0, end=3),
+                                      hdf.overland_flow.get_time(start=0, end=3))
+        self.assertEqual(hdf.total_evaporation.get_time(start=4, end=4).shape, (len(hdf.land_elements), 0))
+        self.assertEqual(asyncio.run(hdf.water_table_elevation.aget_time()).shape,
+                         (len(hdf.land_elements), hdf.water_table_elevation.size))
+
+        elements = hdf.water_table_elevation.get_elements(hdf.land_elements[:3], start=2, end=6)
+        self.assertEqual(list(elements.columns), list(hdf.land_elements[:3]))
+        for element in hdf.land_elements[:3]:
+            np.testing.assert_allclose(elements[element].values,
+                                       hdf.water_table_elevation.get_element(element, start=2, end=6).values)
+
+        shorter = hdf.register('shorter', lambda ph_depth: ph_depth, [hdf.ph_depth])
+        shorter.size -= 5
+        self.assertEqual(shorter.get_window(-3, -1), (shorter.size - 3, shorter.size - 1))
+        self.assertEqual(shorter.get_window(), (0, shorter.size))
+        with self.assertRaises(ValueError):
+            shorter.get_window(6, 2)
+
+    def test_cache(self):
+        hdf = Hdf(path('output_Wansbeck_at_Mitford_shegraph.h5'), memory_budget=100000)
+        discharge = hdf.register('discharge_small_cache', lambda flow: flow, [hdf.overland_flow], cache_blocks=2)
+        self.assertGreater(discharge.size, 2 * discharge.block_length)
+        np.testing.assert_array_equal(discharge.get_element(3).values, hdf.overland_flow.get_element(3).values)
+        self.assertEqual(len(discharge.cache), 2)
+        np.testing.assert_array_equal(discharge.get_time(-1), hdf.overland_flow.get_time(-1))
+        with self.assertRaises(ValueError):
+            hdf.register('mixed', lambda a, b: a, [hdf.overland_flow, hdf.ph_depth])
+
+    def test_materialise(self):
+        with tempfile.TemporaryDirectory() as directory:
+            copy = shutil.copy(path('output_Wansbeck_at_Mitford_shegraph.h5'), directory)
+            hdf = Hdf(copy)
+            expected = hdf.water_table_elevation.get_time(10)
+            hdf.water_table_elevation.materialise()
+            self.assertTrue(os.path.exists(get_sidecar_path(copy)))
+
+            reopened = Hdf(copy)
+            self.assertIsNotNone(reopened.water_table_elevation.materialised)
+            self.assertIsNone(reopened.total_evaporation.materialised)
+            np.testing.assert_allclose(reopened.water_table_elevation.get_time(10), expected, rtol=1e-6)
+            self.assertEqual(reopened.water_table_elevation.materialised.file, reopened.sidecar)
+
+            hdf.close()
+            reopened.total_evaporation.materialise()
+            self.assertIsNotNone(reopened.water_table_elevation.materialised)
+            self.assertEqual(reopened.total_evaporation.materialised.file, reopened.sidecar)
+            reopened.close()
+            self.assertIsNone(reopened.sidecar)
+            self.assertIsNone(reopened.water_table_elevation.materialised)
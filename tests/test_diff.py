@@ -0,0 +1,56 @@
+from shetranio.hdf import Hdf
+import numpy as np
+import unittest
+import tempfile
+import shutil
+import h5py
+import os
+
+sample_data = os.path.join(os.path.dirname(__file__), 'sample_data')
+
+
+def path(s):
+    return os.path.join(sample_data, s)
+
+
+class TestDiff(unittest.TestCase):
+
+    def test_diff(self):
+        with tempfile.TemporaryDirectory() as directory:
+            scenario = shutil.copy(path('output_Wansbeck_at_Mitford_shegraph.h5'),
+                                   os.path.join(directory, 'scenario.h5'))
+            baseline = Hdf(path('output_Wansbeck_at_Mitford_shegraph.h5'), memory_budget=50000)
+            element = baseline.land_elements[30]
+            row, col = np.argwhere(baseline.number.square == element)[0]
+            lowered = baseline.land_elements[31]
+            lowered_row, lowered_col = np.argwhere(baseline.number.square == lowered)[0]
+            with h5py.File(scenario, 'r+') as f:
+                values = f['VARIABLES/  2 ph_depth/value']
+                values[...] = np.where(values[...] == -1, -1, values[...] + 0.5)
+                values[row, col, 3] = -1
+                values[lowered_row, lowered_col, 4] -= 1.5
+
+            output = os.path.join(directory, 'diff.h5')
+            results = baseline.diff(Hdf(scenario, memory_budget=50000), path=output)
+
+            ph_depth = results['ph_depth']
+            np.testing.assert_allclose(np.delete(ph_depth['series'].values, 4), 0.5, rtol=1e-5)
+            self.assertEqual(len(ph_depth['elements']), len(baseline.land_elements))
+            np.testing.assert_allclose(ph_depth['elements'].max_difference.dropna(), 0.5, rtol=1e-5)
+            np.testing.assert_array_equal(results['ovr_flow']['elements'].max_difference, 0)
+
+            difference = Hdf(output)
+            values = difference.ph_depth.get_element(element).values
+            self.assertTrue(np.isnan(values[3]))
+            np.testing.assert_allclose(np.delete(values, 3), 0.5, rtol=1e-5)
+            self.assertTrue(np.isnan(difference.ph_depth.values.attrs['fill_value']))
+            read_back = difference.ph_depth.get_time(start=3, end=5)
+            self.assertTrue(np.isnan(read_back[30, 0]))
+            np.testing.assert_allclose(read_back[31, 1], -1, rtol=1e-5)
+            self.assertTrue(np.isnan(difference.ph_depth.get_time(3)[30]))
+            self.assertAlmostEqual(difference.ph_depth.get_time(4)[31], -1, places=5)
+            self.assertEqual(difference.overland_flow.size, baseline.overland_flow.size)
+            difference.close()
+
+            with self.assertRaises(ValueError):
+                baseline.diff(Hdf(path('76008.h5')))
@@ -0,0 +1,36 @@
+from shetranio.hdf import Hdf
+import numpy as np
+import unittest
+import os
+
+sample_data = os.path.join(os.path.dirname(__file__), 'sample_data')
+
+
+def path(s):
+    return os.path.join(sample_data, s)
+
+
+class TestEvents(unittest.TestCase):
+
+    def test_event_statistics(self):
+        hdf = Hdf(path('output_Wansbeck_at_Mitford_shegraph.h5'), memory_budget=20000)
+        statistics = hdf.surface_depth.get_event_statistics([0.01, 0.1])
+        hours = np.diff(hdf.surface_depth.time_values[:], prepend=0)
+        for element in [1, 5, 40]:
+            values = hdf.surface_depth.get_element(element).values
+            row = statistics.loc[element]
+            self.assertEqual(row['max'], values.max())
+            self.assertEqual(row.time_of_max, hdf.surface_depth.times[values.argmax()])
+            self.assertAlmostEqual(row['hours_above_0.1'], hours[values > 0.1].sum(), 3)
+            self.assertAlmostEqual(statistics.loc[element, 'hours_above_0.01'], hours[values > 0.01].sum(), 3)
+
+        ph_depth = hdf.ph_depth.get_event_statistics()
+        element = hdf.land_elements[12]
+        values = hdf.ph_depth.get_element(element).values
+        self.assertEqual(ph_depth.loc[element, 'min'], values[values != -1].min())
+
+        stats = hdf.instrument()
+        cached = hdf.surface_depth.get_event_statistics([0.01, 0.1])
+        self.assertEqual(len(stats.records), 0)
+        self.assertTrue(cached.equals(statistics))
+        self.assertIn('hours_above_100', hdf.water_table_elevation.get_event_statistics(100))
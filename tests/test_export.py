@@ -0,0 +1,75 @@
+from shetranio.hdf import Hdf
+from shetranio.dem import Dem
+from shetranio import export
+import numpy as np
+import unittest
+import tempfile
+import os
+
+sample_data = os.path.join(os.path.dirname(__file__), 'sample_data')
+
+
+def path(s):
+    return os.path.join(sample_data, s)
+
+
+try:
+    import matplotlib
+except ImportError:
+    matplotlib = None
+
+try:
+    from osgeo import gdal
+except ImportError:
+    gdal = None
+
+
+class TestExport(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.hdf = Hdf(path('output_Wansbeck_at_Mitford_shegraph.h5'))
+        cls.dem = Dem(path('Wansbeck_at_Mitford_Dem.txt'))
+
+    def test_geotransform(self):
+        self.assertEqual(export.get_geotransform(self.hdf, self.dem, self.hdf.number.square.shape),
+                         (390000, 1000, 0, 599000, 0, -1000))
+        x_min, cell_size, _, y_max, _, _ = export.get_geotransform(self.hdf, self.dem, self.hdf.sv4_numbering.shape)
+        self.assertEqual((x_min, cell_size, y_max), (390000, 50, 599000))
+        x, y = self.hdf.get_element_location(path('Wansbeck_at_Mitford_Dem.txt'), self.hdf.land_elements[0])
+        row, col = np.argwhere(self.hdf.number.square == self.hdf.land_elements[0])[0]
+        self.assertEqual((x, y), (x_min + (col + 0.5) * 1000, y_max - (row + 0.5) * 1000))
+
+    def test_range(self):
+        grids = self.hdf.ph_depth.to_grid(slice(None))
+        self.assertEqual(export.get_range(self.hdf.ph_depth, 0, None), (np.nanmin(grids), np.nanmax(grids)))
+
+    def test_empty_geotiff(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with self.assertRaises(ValueError):
+                export.write_geotiff(self.hdf.ph_depth, os.path.join(directory, 'empty.tif'), self.dem, 5, 5)
+            with self.assertRaises(ValueError):
+                export.write_geotiff(self.hdf.ph_depth, os.path.join(directory, 'empty.tif'), self.dem,
+                                     self.hdf.ph_depth.size)
+            self.assertEqual(os.listdir(directory), [])
+
+    @unittest.skipIf(gdal is None, 'gdal is not installed')
+    def test_geotiff(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = export.write_geotiff(self.hdf.ph_depth, os.path.join(directory, 'ph_depth.tif'), self.dem, 2, 6)
+            ds = gdal.Open(output)
+            self.assertEqual(ds.RasterCount, 4)
+            self.assertEqual(ds.GetGeoTransform(), export.get_geotransform(self.hdf, self.dem,
+                                                                           self.hdf.number.square.shape))
+            np.testing.assert_array_equal(ds.GetRasterBand(2).ReadAsArray(),
+                                          self.hdf.ph_depth.to_grid(3).astype(np.float32))
+            self.assertEqual(ds.GetRasterBand(1).GetDescription(), str(self.hdf.ph_depth.times[2]))
+            ds = None
+
+    @unittest.skipIf(matplotlib is None, 'matplotlib is not installed')
+    def test_pngs(self):
+        with tempfile.TemporaryDirectory() as directory:
+            paths = export.write_pngs(self.hdf.ph_depth, directory, self.dem, 2, 8, workers=2, frames_per_task=4)
+            self.assertEqual([os.path.basename(p) for p in paths], ['ph_depth_{:06d}.png'.format(i)
+                                                                     for i in range(2, 8)])
+            self.assertTrue(os.path.exists(os.path.join(directory, 'ph_depth_000007.pgw')))
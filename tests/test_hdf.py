@@ -0,0 +1,224 @@
+from shetranio.hdf import Hdf
+import numpy as np
+import unittest
+import subprocess
+import tempfile
+import sys
+import os
+
+sample_data = os.path.join(os.path.dirname(__file__), 'sample_data')
+
+
+def path(s):
+    return os.path.join(sample_data, s)
+
+
+writer = '''
+import h5py, sys, time
+source = h5py.File(sys.argv[1], 'r')
+f = h5py.File(sys.argv[2], 'w', libver='latest')
+for group in ['CATCHMENT_MAPS', 'CATCHMENT_SPREADSHEETS', 'CONSTANTS']:
+    source.copy(group, f)
+name = '  4 ovr_flow'
+values = source['VARIABLES'][name]['value']
+times = source['VARIABLES'][name]['time']
+group = f.create_group('VARIABLES').create_group(name)
+value = group.create_dataset('value', data=values[:, :, :2], maxshape=values.shape[:2] + (None,), chunks=True)
+time_ = group.create_dataset('time', data=times[:2], maxshape=(None,), chunks=True)
+value.attrs['units'] = values.attrs['units']
+time_.attrs['units'] = times.attrs['units']
+f.swmr_mode = True
+print('ready', flush=True)
+sys.stdin.readline()
+for i in range(2, int(sys.argv[3])):
+    value.resize(i + 1, axis=2)
+    value[:, :, i] = values[:, :, i]
+    value.flush()
+    time_.resize(i + 1, axis=0)
+    time_[i] = times[i]
+    time_.flush()
+    time.sleep(0.02)
+f.close()
+'''
+
+
+class TestHdf(unittest.TestCase):
+
+    def test_swmr(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'live.h5')
+            process = subprocess.Popen(
+                [sys.executable, '-c', writer, path('output_Wansbeck_at_Mitford_shegraph.h5'), output, '10'],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+            try:
+                process.stdout.readline()
+                hdf = Hdf(output, swmr=True)
+                self.assertEqual(hdf.overland_flow.size, 2)
+                self.assertEqual(len(hdf.overland_flow.get_element(1)), 2)
+                with self.assertRaises(IndexError):
+                    hdf.overland_flow.get_time(2)
+
+                process.stdin.write('\n')
+                process.stdin.flush()
+                timesteps = list(hdf.follow('ovr_flow', interval=0.02, timeout=0.5))
+            finally:
+                process.wait()
+
+            self.assertEqual(len(timesteps), 10)
+            expected = Hdf(path('output_Wansbeck_at_Mitford_shegraph.h5')).overland_flow
+            np.testing.assert_array_equal(timesteps[9][1], expected.get_time(9))
+            np.testing.assert_array_equal(hdf.overland_flow.get_element(5).values,
+                                          expected.get_element(5).values[:10])
+            hdf.file.close()
+
+    def test_instrument(self):
+        hdf = Hdf(path('output_Wansbeck_at_Mitford_shegraph.h5'))
+        calls = []
+        stats = hdf.instrument(callback=calls.append)
+        hdf.overland_flow.get_element(1)
+        hdf.overland_flow.get_time(3)
+        hdf.ph_depth.get_time(2)
+        hdf.ph_depth.values[0, 0, :]
+
+        table = stats.to_dataframe().set_index(['variable', 'method'])
+        self.assertEqual(table.loc[('ovr_flow', 'get_element'), 'calls'], 1)
+        self.assertEqual(table.loc[('ovr_flow', 'get_element'), 'elements'], 4 * hdf.overland_flow.size)
+        self.assertEqual(table.loc[('ph_depth', ''), 'bytes'], 4 * hdf.ph_depth.size)
+        self.assertEqual(stats.by_variable().loc['ovr_flow', 'reads'], 2)
+        self.assertEqual([call['method'] for call in calls], ['get_element', 'get_time', 'get_time'])
+
+        self.assertIs(hdf.uninstrument(), stats)
+        hdf.overland_flow.get_element(1)
+        self.assertEqual(stats.by_variable().loc['ovr_flow', 'reads'], 2)
+
+    def test_instrument_nested(self):
+        hdf = Hdf(path('output_Wansbeck_at_Mitford_shegraph.h5'))
+        nbytes = hdf.ph_depth.values[..., 0].nbytes
+        stats = hdf.instrument()
+        hdf.ph_depth.to_grid(0)
+
+        table = stats.to_dataframe().set_index(['variable', 'method'])
+        self.assertEqual(table.loc[('ph_depth', 'get_time'), 'reads'], 1)
+        self.assertEqual(table.loc[('ph_depth', 'to_grid'), 'reads'], 0)
+        self.assertEqual(table.loc[('ph_depth', 'to_grid'), 'cumulative_reads'], 1)
+        self.assertEqual(table.loc[('ph_depth', 'to_grid'), 'cumulative_bytes'], nbytes)
+        self.assertEqual(stats.by_variable().loc['ph_depth', 'reads'], 1)
+        self.assertEqual(stats.by_variable().loc['ph_depth', 'bytes'], nbytes)
+        self.assertEqual(stats.by_method().loc['to_grid', 'calls'], 1)
+
+        stats.reset()
+        hdf.water_table_elevation.get_time(0)
+        self.assertEqual(stats.by_variable().loc['ph_depth', 'reads'], 1)
+        hdf.uninstrument()
+
+    def test_memory_budget(self):
+        hdf = Hdf(path('output_Wansbeck_at_Mitford_shegraph.h5'))
+        budgeted = Hdf(path('output_Wansbeck_at_Mitford_shegraph.h5'), memory_budget=100000)
+        self.assertEqual(hdf.ph_depth.get_block_length(), hdf.ph_depth.size)
+        self.assertLess(budgeted.ph_depth.get_block_length(), budgeted.ph_depth.size)
+
+        blocks = list(budgeted.ph_depth.iter_blocks())
+        self.assertGreater(len(blocks), 1)
+        values = np.concatenate([block for _, block in blocks], axis=1)
+        self.assertEqual(values.shape, (len(hdf.land_elements), hdf.ph_depth.size))
+        element = hdf.land_elements[10]
+        np.testing.assert_array_equal(values[10], hdf.ph_depth.get_element(element).values)
+        np.testing.assert_array_equal(budgeted.overland_flow.get_element(3).values,
+                                      hdf.overland_flow.get_element(3).values)
+
+    def test_water_balance(self):
+        hdf = Hdf(path('output_Wansbeck_at_Mitford_shegraph.h5'))
+        balance = hdf.water_balance('30D')
+        budgeted = Hdf(path('output_Wansbeck_at_Mitford_shegraph.h5'), memory_budget=50000).water_balance('30D')
+        np.testing.assert_allclose(balance.values, budgeted.values)
+
+        area = (hdf.grid_dxy[:, :, 0] * hdf.grid_dxy[:, :, 1])[hdf.number.square != -1].sum()
+        rain = hdf.net_rain.values[0, :]
+        hours = np.diff(hdf.net_rain.time_values[:], prepend=0)
+        self.assertAlmostEqual(balance.net_rain.sum() / (rain * hours * area / 1000).sum(), 1)
+
+        flow = hdf.overland_flow.get_element(1).values
+        hours = np.diff(hdf.overland_flow.time_values[:], prepend=0)
+        self.assertAlmostEqual(hdf.water_balance('30D', outlet=1).outlet_discharge.sum() /
+                               (flow * hours * 3600).sum(), 1)
+        land_area = (hdf.grid_dxy[:, :, 0] * hdf.grid_dxy[:, :, 1])[hdf.land_rows, hdf.land_cols]
+        change = np.nan_to_num(hdf.canopy_storage.get_time(-1) - hdf.canopy_storage.get_time(0))
+        self.assertAlmostEqual(balance.canopy_storage_change.sum() / (change * land_area / 1000).sum(), 1)
+
+    def test_to_grid(self):
+        hdf = Hdf(path('output_Wansbeck_at_Mitford_shegraph.h5'))
+        grid = hdf.ph_depth.to_grid(4)
+        values = hdf.ph_depth.values[:, :, 4]
+        land = (hdf.number.square != -1) & (values != -1)
+        np.testing.assert_array_equal(grid[land], values[land])
+        self.assertTrue(np.isnan(grid[~land]).all())
+
+        grids = hdf.ph_depth.to_grid(slice(2, 6))
+        self.assertEqual(grids.shape, values.shape + (4,))
+        np.testing.assert_array_equal(grids[:, :, 2], grid)
+        reversed_grids = hdf.ph_depth.to_grid(slice(5, 1, -1))
+        np.testing.assert_array_equal(reversed_grids, grids[..., ::-1])
+        np.testing.assert_array_equal(hdf.ph_depth.to_grid(slice(None, None, -3)),
+                                      hdf.ph_depth.to_grid(slice(None))[..., ::-3])
+
+        rivers = hdf.overland_flow.to_grid(range(0, 20, 5))
+        flows = hdf.overland_flow.get_time(15)
+        row, col = np.argwhere(hdf.sv4_numbering == 7)[0]
+        self.assertEqual(rivers[row, col, 3], flows[6])
+        self.assertTrue(np.isnan(rivers[hdf.sv4_numbering > len(flows)]).all())
+        self.assertEqual(len(hdf.grid_indices), 2)
+        hdf.overland_flow.to_grid(1)
+        self.assertEqual(len(hdf.grid_indices), 2)
+
+    def test_time_window(self):
+        from shetranio import Model
+        import pandas as pd
+        hdf = Model(path('Wansbeck_at_Mitford_Library_File.xml')).hdf
+        flow = hdf.overland_flow
+        hours = flow.time_values[:]
+        np.testing.assert_array_equal(flow.times, pd.Timestamp(2003, 1, 1) + pd.to_timedelta(hours, unit='h'))
+
+        stats = hdf.instrument()
+        week = flow.get_element(5, start='2003-03-01', end='2003-03-07 23:59')
+        self.assertEqual(len(week), 7)
+        self.assertTrue((week.index >= '2003-03-01').all() and (week.index <= '2003-03-08').all())
+        self.assertEqual(stats.to_dataframe().elements.sum(), 4 * 7)
+        hdf.uninstrument()
+        np.testing.assert_array_equal(week.values, flow.get_element(5).loc[week.index].values)
+
+        index = flow.get_time_index(pd.Timestamp('2003-03-01 12:00'))
+        self.assertTrue(flow.times[index] <= pd.Timestamp('2003-03-01 12:00') < flow.times[index + 1])
+        self.assertEqual(flow.get_time_index(pd.Timedelta(hours=hours[10] + 0.01)), 10)
+        with self.assertRaisesRegex(IndexError, '2002-12-31 is before'):
+            flow.get_time_index('2002-12-31')
+        with self.assertRaisesRegex(ValueError, 'after its end'):
+            flow.get_element(5, start='2003-03-07', end='2003-03-01')
+        with self.assertRaises(ValueError):
+            hdf.water_table_elevation.get_element(hdf.land_elements[0], start='2003-03-07', end='2003-03-01')
+
+        window = flow.get_time(start=10, end=20)
+        self.assertEqual(window.shape, (len(flow.get_time(0)), 10))
+        np.testing.assert_array_equal(window[:, 3], flow.get_time(13))
+
+        elements = hdf.ph_depth.get_elements(hdf.land_elements[:3], start='2003-06-01')
+        self.assertEqual(list(elements.columns), list(hdf.land_elements[:3]))
+        np.testing.assert_array_equal(elements[hdf.land_elements[2]].values,
+                                      hdf.ph_depth.get_element(hdf.land_elements[2], start='2003-06-01').values)
+        self.assertEqual(len(hdf.discharge.get_element(5, start=10, end=-10)), flow.size - 20)
+
+    def test_profiles(self):
+        hdf = Hdf(path('76008.h5'), memory_budget=200000)
+        theta = hdf.soil_moisture
+        element = hdf.land_elements[7]
+        profile = theta.get_profile(element, start=2, end=6)
+        self.assertEqual(profile.shape, (4, theta.values.shape[2]))
+        np.testing.assert_array_equal(profile[3].values, theta.get_element(element, level=3, start=2, end=6).values)
+
+        profiles = theta.get_profiles()
+        np.testing.assert_array_equal(profiles[7, :, 2:6].T, profile.values)
+
+        storage = theta.get_depth_integrated()
+        self.assertEqual(storage.shape, (len(hdf.land_elements), theta.size))
+        row, col = np.argwhere(hdf.number.square == element)[0]
+        thickness = hdf.vertical_thickness.square[row, col, :theta.values.shape[2]]
+        self.assertAlmostEqual(storage[7, 4], np.nansum(profile.values[2] * thickness))
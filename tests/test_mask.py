@@ -0,0 +1,65 @@
+from shetranio.setup import raster
+import numpy as np
+import unittest
+import tempfile
+import zipfile
+import os
+
+try:
+    from osgeo import ogr
+    from shetranio.setup import mask
+except ImportError:
+    mask = None
+
+outlines = {
+    101: 'POLYGON ((1000 2000, 1300 2000, 1300 2200, 1000 2200, 1000 2000))',
+    102: 'POLYGON ((5000 5000, 5300 5000, 5000 5300, 5000 5000))',
+}
+
+
+@unittest.skipIf(mask is None, 'osgeo is not installed')
+class TestMask(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        shapefile = os.path.join(self.directory.name, 'outlines.shp')
+        source = ogr.GetDriverByName('ESRI Shapefile').CreateDataSource(shapefile)
+        layer = source.CreateLayer('outlines', geom_type=ogr.wkbPolygon)
+        layer.CreateField(ogr.FieldDefn('gauge', ogr.OFTInteger))
+        for gauge, wkt in outlines.items():
+            feature = ogr.Feature(layer.GetLayerDefn())
+            feature.SetField('gauge', gauge)
+            feature.SetGeometry(ogr.CreateGeometryFromWkt(wkt))
+            layer.CreateFeature(feature)
+        source = None
+
+        self.outline = os.path.join(self.directory.name, 'outlines.zip')
+        with zipfile.ZipFile(self.outline, 'w') as f:
+            for name in os.listdir(self.directory.name):
+                if name.startswith('outlines.') and not name.endswith('.zip'):
+                    f.write(os.path.join(self.directory.name, name), name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_create_many(self):
+        output = os.path.join(self.directory.name, 'masks')
+        paths = mask.create_many(self.outline, 100, output, 'gauge')
+        self.assertEqual(sorted(os.path.basename(path) for path in paths), ['101.txt', '102.txt'])
+        self.assertEqual(sorted(os.listdir(output)), ['101.txt', '102.txt'])
+
+        values, header = raster.read_ascii(os.path.join(output, '101.txt'))
+        self.assertEqual((header.ncols, header.nrows), (3, 2))
+        self.assertEqual((header.xllcorner, header.yllcorner, header.cellsize), (1000, 2000, 100))
+        self.assertEqual(header.nodata, mask.no_data)
+        self.assertTrue((values == 1).all())
+
+        path = os.path.join(output, '102.txt')
+        values, header = raster.read_ascii(path)
+        self.assertEqual((header.ncols, header.nrows, header.xllcorner, header.yllcorner), (3, 3, 5000, 5000))
+        self.assertEqual(values[2, 0], 1)
+        self.assertEqual(values[0, 0], 1)
+        self.assertEqual(values[0, 2], mask.no_data)
+        with open(path) as f:
+            rows = f.read().splitlines()[6:]
+        self.assertFalse(any('.' in row for row in rows))
@@ -0,0 +1,53 @@
+from shetranio import metrics
+import pandas as pd
+import numpy as np
+import unittest
+import os
+
+sample_data = os.path.join(os.path.dirname(__file__), 'sample_data')
+
+
+def path(s):
+    return os.path.join(sample_data, s)
+
+
+def loop_nse(simulated, observed):
+    return 1 - sum((s - o) ** 2 for s, o in zip(simulated, observed)) / \
+        sum((o - np.mean(observed)) ** 2 for o in observed)
+
+
+class TestMetrics(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.observed = metrics.read_observed(path('WansbeckResults.csv'))
+        cls.simulated = pd.read_csv(path('WansbeckResults.csv')).iloc[:, 2].values
+
+    def test_read_observed(self):
+        self.assertEqual(self.observed.index[1], pd.Timestamp(2012, 1, 2))
+        self.assertEqual(self.observed.iloc[0], 6.41)
+
+    def test_ensemble(self):
+        observed = self.observed.values
+        members = np.array([self.simulated, observed, self.simulated * 1.1])
+        scores = metrics.score(members, observed)
+        self.assertAlmostEqual(scores.nse[0], loop_nse(self.simulated, observed))
+        np.testing.assert_allclose(scores.loc[1].values, [1, 1, 0, 1])
+        self.assertAlmostEqual(scores.bias[2], 1.1 * (scores.bias[0] + 100) - 100)
+        np.testing.assert_allclose(scores.nse.values, [metrics.nse(m, observed)[0] for m in members])
+
+        score, r, alpha, beta = metrics.kge(members, observed, components=True)
+        self.assertAlmostEqual(r[0], np.corrcoef(self.simulated, observed)[0, 1])
+        self.assertAlmostEqual(beta[2], 1.1 * beta[0])
+
+    def test_window(self):
+        simulated = pd.DataFrame({'run': self.simulated}, index=self.observed.index)
+        observed, members, index = metrics.align(self.observed, simulated, '2012-02-01', '2012-02-29')
+        self.assertEqual(len(index), 29)
+        mask = metrics.get_window(self.observed.index, '2012-02-01', '2012-02-29')
+        np.testing.assert_allclose(metrics.nse(members, observed), metrics.nse(self.simulated, self.observed, mask))
+
+        with_gaps = self.observed.copy()
+        with_gaps[with_gaps.index < '2012-02-01'] = np.nan
+        self.assertAlmostEqual(metrics.kge(self.simulated, with_gaps)[0],
+                               metrics.kge(self.simulated[31:], self.observed.values[31:])[0])
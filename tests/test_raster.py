@@ -0,0 +1,64 @@
+from shetranio.setup import raster
+import numpy as np
+import unittest
+import tempfile
+import os
+
+sample_data = os.path.join(os.path.dirname(__file__), 'sample_data')
+
+
+class TestRaster(unittest.TestCase):
+
+    def test_read_header(self):
+        header = raster.read_header(os.path.join(sample_data, 'mask.txt'))
+        self.assertEqual((header.ncols, header.nrows), (41, 45))
+        self.assertEqual((header.xllcorner, header.yllcorner, header.cellsize), (360800, 99500, 100))
+        self.assertEqual(header.nodata, -9999)
+        self.assertEqual(header.yulcorner, 99500 + 45 * 100)
+
+    def test_write_ascii(self):
+        header = raster.read_header(os.path.join(sample_data, 'mask.txt'))
+        values = np.arange(header.nrows * header.ncols).reshape(header.nrows, header.ncols)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'grid.txt')
+            raster.write_ascii(path, values, header)
+            written = raster.read_header(path)
+            self.assertEqual(vars(written), vars(header))
+            np.testing.assert_array_equal(np.loadtxt(path, skiprows=6), values)
+
+    def test_read_window_overhang(self):
+        values = np.arange(1, 13, dtype=np.int16).reshape(3, 4)
+        dataset = Dataset(values, (1000, 100, 0, 2300, 0, -100), -9999)
+        inside = raster.Header(2, 2, 1100, 2000, 100)
+        np.testing.assert_array_equal(raster.read_window(dataset, inside), [[6, 7], [10, 11]])
+
+        overhang = raster.Header(3, 3, 1200, 1900, 100)
+        window = raster.read_window(dataset, overhang)
+        self.assertEqual(window.dtype, np.int16)
+        np.testing.assert_array_equal(window, [[7, 8, -9999], [11, 12, -9999], [-9999, -9999, -9999]])
+
+        outside = raster.Header(2, 2, 5000, 5000, 100)
+        np.testing.assert_array_equal(raster.read_window(dataset, outside), -9999)
+
+
+class Dataset:
+    """The parts of a single band GDAL dataset that read_window uses"""
+    def __init__(self, values, geotransform, nodata):
+        self.values = values
+        self.geotransform = geotransform
+        self.nodata = nodata
+        self.RasterYSize, self.RasterXSize = values.shape
+
+    def GetGeoTransform(self):
+        return self.geotransform
+
+    def GetRasterBand(self, index):
+        return self
+
+    def GetNoDataValue(self):
+        return self.nodata
+
+    def ReadAsArray(self, x, y, ncols, nrows):
+        if x < 0 or y < 0 or x + ncols > self.RasterXSize or y + nrows > self.RasterYSize:
+            return None
+        return self.values[y:y + nrows, x:x + ncols].copy()
@@ -0,0 +1,65 @@
+from shetranio.setup.scheduler import Scheduler, finished, failed, running
+import unittest
+import tempfile
+import json
+import sys
+import os
+
+stub = 'import sys; print(" ".join(sys.argv[1:])); sys.exit(int(sys.argv[-1]))'
+
+
+class TestScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.state = os.path.join(self.directory.name, 'schedule.json')
+        self.runs = []
+        for i in range(5):
+            path = os.path.join(self.directory.name, 'run{}'.format(i))
+            os.mkdir(path)
+            self.runs.append(path)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_run(self):
+        scheduler = Scheduler(sys.executable, self.state, workers=2, interval=0.01)
+        for i, path in enumerate(self.runs):
+            scheduler.add(path, ['-c', stub, 'run', str(int(i == 3))])
+        jobs = scheduler.run()
+        self.assertEqual([job.status for job in jobs], [finished, finished, finished, failed, finished])
+        self.assertEqual(jobs[3].exit_code, 1)
+        self.assertTrue(all(job.wall_time > 0 for job in jobs))
+        with open(jobs[0].log) as f:
+            self.assertEqual(f.read().strip(), 'run 0')
+
+    def test_resume(self):
+        scheduler = Scheduler(sys.executable, self.state, workers=2, interval=0.01)
+        for path in self.runs:
+            scheduler.add(path, ['-c', stub, '0'])
+        scheduler.jobs[0].status = finished
+        scheduler.jobs[1].status = running
+        scheduler.save()
+
+        jobs = Scheduler(sys.executable, self.state, interval=0.01).run()
+        self.assertTrue(all(job.status == finished for job in jobs))
+        self.assertIsNone(jobs[0].exit_code)
+        self.assertEqual(jobs[1].exit_code, 0)
+        with open(self.state) as f:
+            self.assertEqual([job['status'] for job in json.load(f)], [finished] * 5)
+
+    def test_missing_executable(self):
+        scheduler = Scheduler(os.path.join(self.directory.name, 'missing.exe'), self.state, workers=1, interval=0.01)
+        for path in self.runs[:2]:
+            scheduler.add(path, ['-c', 'pass'])
+        jobs = scheduler.run()
+        self.assertEqual([job.status for job in jobs], [failed, failed])
+        self.assertTrue(all(job.error and job.log_file is None and job.process is None for job in jobs))
+        with open(self.state) as f:
+            self.assertIn('missing.exe', json.load(f)[0]['error'])
+
+        jobs[0].directory = os.path.join(self.directory.name, 'missing')
+        scheduler.executable = sys.executable
+        jobs = scheduler.run(retry_failed=True)
+        self.assertEqual([job.status for job in jobs], [failed, finished])
+        self.assertIsNone(jobs[1].error)
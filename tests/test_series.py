@@ -0,0 +1,58 @@
+from shetranio.setup import series
+import numpy as np
+import io
+import unittest
+import tempfile
+import os
+
+
+class TestSeries(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.text = os.path.join(self.directory.name, 'UKCP09PEBetterTimeSeries')
+        os.mkdir(self.text)
+        self.ids = [1, 180, 181, 365]
+        for time_series_id in self.ids:
+            x, y = series.get_coordinates(time_series_id)
+            with open(os.path.join(self.text, '[{}][{}]PEBetterTimeSeries.txt'.format(x, y)), 'w') as f:
+                f.write('\n'.join(str(time_series_id + day / 10) for day in range(40)))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_get_coordinates(self):
+        self.assertEqual(series.get_coordinates(180), (180, 1))
+        self.assertEqual(series.get_coordinates(181), (1, 2))
+        self.assertEqual(series.get_id(*series.get_coordinates(365)), 365)
+
+    def test_store_matches_text(self):
+        store = series.ingest(self.text, 'PEBetter', '1960-01-01', series.get_store_path(self.text))
+        self.assertEqual(store.values.shape, (4, 40))
+        ids = [365, 1]
+        expected = series.read_text(self.text, 'PEBetter', ids, '1960-01-01', '1960-01-05', '1960-01-15')
+        np.testing.assert_array_equal(store.read(ids, '1960-01-05', '1960-01-15'), expected)
+        np.testing.assert_array_equal(
+            series.read(self.text, 'PEBetter', ids, '1960-01-01', '1960-01-05', '1960-01-15'), expected)
+        self.assertAlmostEqual(expected[0, 1], 1.4, places=5)
+
+    def test_store_missing_square(self):
+        store = series.ingest(self.text, 'PEBetter', '1960-01-01', series.get_store_path(self.text))
+        with self.assertRaises(KeyError):
+            store.read([2], '1960-01-01', '1960-01-02')
+
+    def test_write_round_trips(self):
+        x, y = series.get_coordinates(2)
+        lines = ['0.1234567890123', '', '12', '3.5', '', '-0.25']
+        with open(os.path.join(self.text, '[{}][{}]PEBetterTimeSeries.txt'.format(x, y)), 'w') as f:
+            f.write('\n'.join(lines) + '\n\n')
+        store = series.ingest(self.text, 'PEBetter', '1960-01-01', series.get_store_path(self.text))
+        text = series.read_text(self.text, 'PEBetter', [2], '1960-01-01', '1960-01-02', '1960-01-05')
+        np.testing.assert_array_equal(store.read([2], '1960-01-02', '1960-01-05'), text)
+
+        output = io.StringIO()
+        series.write(output, [2], text, '1960-01-02', '1960-01-05')
+        self.assertEqual(output.getvalue().splitlines()[1:], ['12', '3.5', '-0.25'])
+        output = io.StringIO()
+        series.write(output, [2], store.read([2], '1960-01-01', '1960-01-02'), '1960-01-01', '1960-01-02')
+        self.assertEqual(output.getvalue().splitlines()[1:], ['0.1234567890123'])
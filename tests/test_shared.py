@@ -0,0 +1,72 @@
+from shetranio.hdf import Hdf
+from shetranio import Model
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pickle
+import unittest
+import os
+
+sample_data = os.path.join(os.path.dirname(__file__), 'sample_data')
+
+
+def path(s):
+    return os.path.join(sample_data, s)
+
+
+def read_element(shared, element):
+    hdf = Hdf(shared.path, shared=shared)
+    start, values = shared.get_block('ovr_flow')
+    result = hdf.overland_flow.get_element(element).values, start, values[element - 1].copy(), \
+        hdf.land_elements.copy()
+    hdf.close()
+    shared.close()
+    return result
+
+
+class TestShared(unittest.TestCase):
+
+    def test_share(self):
+        hdf = Model(path('Wansbeck_at_Mitford_Library_File.xml')).hdf
+        shared = hdf.share(['ovr_flow'], start='2003-01-15', end='2003-03-15')
+        try:
+            self.assertLess(len(pickle.dumps(shared)), 4096)
+            arrays = shared.attach()
+            np.testing.assert_array_equal(arrays['land_elements'], hdf.land_elements)
+            np.testing.assert_array_equal(arrays['elevations'], hdf.elevations)
+            np.testing.assert_array_equal(arrays['vertical_thickness'], hdf.constants['vert_thk'][:])
+            with self.assertRaises(ValueError):
+                arrays['land_elements'][0] = 0
+
+            other = Hdf(hdf.path, shared=shared)
+            np.testing.assert_array_equal(other.number.square, hdf.number.square)
+            np.testing.assert_array_equal(other.land_rows, hdf.land_rows)
+            element = hdf.land_elements[5]
+            np.testing.assert_array_equal(other.ph_depth.get_element(element).values,
+                                          hdf.ph_depth.get_element(element).values)
+            other.close()
+
+            start, end = hdf.overland_flow.get_window('2003-01-15', '2003-03-15')
+            with ProcessPoolExecutor(1) as executor:
+                values, block_start, block, land_elements = executor.submit(read_element, shared, 4).result()
+            np.testing.assert_array_equal(values, hdf.overland_flow.get_element(4).values)
+            self.assertEqual(block_start, start)
+            np.testing.assert_array_equal(block, hdf.overland_flow.values[3, ..., start:end])
+            np.testing.assert_array_equal(land_elements, hdf.land_elements)
+        finally:
+            shared.unlink()
+
+    def test_mismatch(self):
+        hdf = Hdf(path('output_Wansbeck_at_Mitford_shegraph.h5'))
+        shared = hdf.share()
+        try:
+            with self.assertRaises(ValueError):
+                Hdf(path('76008.h5'), shared=shared)
+
+            reshaped = pickle.loads(pickle.dumps(shared))
+            segment_name, shape, dtype = reshaped.specs['number']
+            reshaped.specs['number'] = segment_name, (shape[0] + 1,) + tuple(shape[1:]), dtype
+            with self.assertRaises(ValueError):
+                Hdf(hdf.path, shared=reshaped)
+        finally:
+            shared.unlink()
+            hdf.close()
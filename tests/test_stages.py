@@ -0,0 +1,56 @@
+from shetranio.setup import stages
+import unittest
+import tempfile
+import os
+
+
+class TestStages(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.source = self.path('source.txt')
+        self.grid = self.path('grid.txt')
+        self.series = self.path('series.csv')
+        with open(self.source, 'w') as f:
+            f.write('1 2 3')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def copy(self, source, destination, suffix=''):
+        with open(source) as f, open(destination, 'w') as g:
+            g.write(f.read() + suffix)
+
+    def get_stages(self, start_date):
+        return [
+            stages.Stage('rasters', lambda: self.copy(self.source, self.grid),
+                         inputs=[self.source], outputs=[self.grid]),
+            stages.Stage('forcing', lambda: self.copy(self.grid, self.series, start_date),
+                         inputs=[self.grid], parameters=[start_date], outputs=[self.series]),
+        ]
+
+    def test_skips_unchanged(self):
+        self.assertEqual(stages.run(self.get_stages('2000-01-01'), self.directory.name), ['rasters', 'forcing'])
+        self.assertEqual(stages.run(self.get_stages('2000-01-01'), self.directory.name), [])
+        self.assertEqual(stages.run(self.get_stages('2001-01-01'), self.directory.name), ['forcing'])
+
+    def test_reruns_changed_inputs(self):
+        stages.run(self.get_stages('2000-01-01'), self.directory.name)
+        with open(self.source, 'w') as f:
+            f.write('4 5 6')
+        self.assertEqual(stages.run(self.get_stages('2000-01-01'), self.directory.name), ['rasters', 'forcing'])
+        os.remove(self.series)
+        self.assertEqual(stages.run(self.get_stages('2000-01-01'), self.directory.name), ['forcing'])
+
+    def test_sources_not_read(self):
+        rasters = [stages.Stage('rasters', lambda: self.copy(self.source, self.grid),
+                                sources=[self.source], outputs=[self.grid])]
+        self.assertEqual(stages.run(rasters, self.directory.name), ['rasters'])
+        self.assertEqual(stages.Manifest(self.directory.name).files, {})
+        self.assertEqual(stages.run(rasters, self.directory.name), [])
+        stat = os.stat(self.source)
+        os.utime(self.source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertEqual(stages.run(rasters, self.directory.name), ['rasters'])
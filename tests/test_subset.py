@@ -0,0 +1,42 @@
+from shetranio.hdf import Hdf
+from shetranio import Model
+import numpy as np
+import unittest
+import tempfile
+import os
+
+sample_data = os.path.join(os.path.dirname(__file__), 'sample_data')
+
+
+def path(s):
+    return os.path.join(sample_data, s)
+
+
+class TestSubset(unittest.TestCase):
+
+    def test_subset(self):
+        hdf = Model(path('Wansbeck_at_Mitford_Library_File.xml')).hdf
+        elements = [3, 4, 5] + list(hdf.land_elements[10:20])
+        with tempfile.TemporaryDirectory() as directory:
+            output = hdf.subset(os.path.join(directory, 'subset.h5'), variables=['ovr_flow', 'ph_depth', 'theta'],
+                                elements=elements, start='2003-01-15', end='2003-03-15')
+            subset = Hdf(output)
+            self.assertEqual([v.name for v in subset.variables], ['ph_depth', 'ovr_flow', 'theta'])
+            np.testing.assert_array_equal(subset.element_numbers, hdf.element_numbers)
+
+            start, end = hdf.overland_flow.get_window('2003-01-15', '2003-03-15')
+            self.assertEqual(subset.overland_flow.size, end - start)
+            np.testing.assert_array_equal(subset.overland_flow.time_values[:], hdf.overland_flow.hours[start:end])
+            np.testing.assert_array_equal(subset.overland_flow.get_element(4).values,
+                                          hdf.overland_flow.get_element(4, start=start, end=end).values)
+            self.assertTrue(np.isnan(subset.overland_flow.get_element(6).values).all())
+            self.assertTrue(np.isnan(subset.overland_flow.values.attrs['fill_value']))
+
+            element = hdf.land_elements[12]
+            np.testing.assert_array_equal(subset.soil_moisture.get_element(element).values,
+                                          hdf.soil_moisture.get_element(element, start='2003-01-15',
+                                                                        end='2003-03-15').values)
+            self.assertEqual(subset.ph_depth.size, 2)
+            self.assertTrue(np.isnan(subset.ph_depth.get_element(hdf.land_elements[0]).values).all())
+            subset.close()
+            self.assertLess(os.path.getsize(output), os.path.getsize(hdf.path))
@@ -0,0 +1,32 @@
+from shetranio import Model, synthetic
+from shetranio.setup import raster
+import numpy as np
+import unittest
+import tempfile
+import os
+
+
+class TestSynthetic(unittest.TestCase):
+
+    def test_catchment(self):
+        with tempfile.TemporaryDirectory() as directory:
+            library = synthetic.write_catchment(directory, rows=8, cols=9, links=20, layers=3, timesteps=30,
+                                                land_timesteps=6, contaminants=True)
+            model = Model(library)
+            hdf = model.hdf
+            np.testing.assert_array_equal(hdf.river_elements, np.arange(1, 21))
+            np.testing.assert_array_equal(hdf.land_elements, np.arange(21, 21 + 72))
+            self.assertEqual(hdf.overland_flow.get_element(20).shape, (30,))
+            self.assertEqual(hdf.ph_depth.get_time(5).shape, (72,))
+            self.assertEqual(hdf.soil_moisture.get_element(21, level=2).shape, (6,))
+            self.assertEqual(hdf.contaminant_concentration_rivers.get_time(0).shape, (20,))
+            self.assertEqual(model.dem.number_of_columns, 9)
+            hdf.file.close()
+
+    def test_national_inputs(self):
+        with tempfile.TemporaryDirectory() as directory:
+            synthetic.write_national_inputs(directory, rows=60, cols=40, gauges=[7])
+            values, header = raster.read_ascii(os.path.join(directory, '1kmBngMaps', '1kmPeRainBng.txt'))
+            self.assertEqual(values.shape, (60, 40))
+            self.assertEqual(values[-1, 0], 1)
+            self.assertEqual(raster.read_header(os.path.join(directory, '1kmBngMasks', '7.txt')).ncols, 20)